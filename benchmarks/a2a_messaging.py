@@ -0,0 +1,126 @@
+"""
+Messages per second between two local A2A agents.
+
+Agent A sends STATUS_UPDATE messages to agent B, which counts what it
+receives. Two transports are compared:
+
+  per-message  the original path: a new TCP connection per message with an
+               unframed JSON body (B still accepts this from older agents)
+  pooled       A2AAgent._send_message over PeerConnectionManager: one
+               long-lived connection carrying length-prefixed frames
+
+--transport asyncio runs both agents on the asyncio transport instead
+(AsyncTransport: queued, batched writes on one event loop).
+
+    python benchmarks/a2a_messaging.py --messages 20000 --transport asyncio
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from a2a_mcp.agents.a2a_agent import A2AAgent  # noqa: E402
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+class Receiver:
+    """Agent B listening without a speaker thread, counting received messages"""
+
+    def __init__(self, transport: str):
+        self.agent = A2AAgent('bench-b', '127.0.0.1', free_port(), transport=transport)
+        self.received = 0
+        self.done = threading.Event()
+        self.expected = 0
+        self._lock = threading.Lock()
+        self.agent.handle_message = self._count
+        self.agent.running = True
+        if transport == 'asyncio':
+            self.agent.connections.start()
+        else:
+            threading.Thread(target=self.agent.start_server, daemon=True).start()
+            time.sleep(0.2)
+
+    def _count(self, message):
+        with self._lock:
+            self.received += 1
+            if self.received >= self.expected:
+                self.done.set()
+
+    def expect(self, count: int):
+        with self._lock:
+            self.received = 0
+            self.expected = count
+            self.done.clear()
+
+    def settle(self, count: int):
+        """Lower the expected count to the messages that were actually sent"""
+        with self._lock:
+            self.expected = count
+            if self.received >= count:
+                self.done.set()
+
+def legacy_send(address, message) -> bool:
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.settimeout(1.0)
+            sock.connect(address)
+            sock.sendall(json.dumps(message).encode('utf-8'))
+        return True
+    except OSError:
+        return False  # The original agent would now drop B from its peers
+
+def run(receiver: Receiver, messages: int, pooled: bool, transport: str = 'threads'):
+    """Returns delivered messages per second and the number of failed sends"""
+    sender = A2AAgent('bench-a', '127.0.0.1', free_port(), transport=transport)
+    if transport == 'asyncio':
+        sender.connections.start()
+    payload = {'status': 'Agent bench-a is feeling fine'}
+    receiver.expect(messages)
+    sent = 0
+    started = time.perf_counter()
+    for _ in range(messages):
+        if pooled:
+            sent += sender._send_message(receiver.agent.address, 'STATUS_UPDATE', payload)
+        else:
+            sent += legacy_send(receiver.agent.address, {
+                'type': 'STATUS_UPDATE',
+                'sender_id': sender.agent_id,
+                'sender_address': sender.address,
+                'timestamp': time.time(),
+                'payload': payload
+            })
+    receiver.settle(sent)
+    if not receiver.done.wait(30):
+        print(f"  only {receiver.received} of {sent} messages arrived", file=sys.stderr)
+    elapsed = time.perf_counter() - started
+    if transport == 'asyncio':
+        sender.connections.stop()
+    else:
+        sender.connections.close_all()
+    return receiver.received / elapsed, messages - sent
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=20_000)
+    parser.add_argument('--legacy-messages', type=int, default=200,
+                        help='messages for the per-message path (slow: listen(5) drops SYNs)')
+    parser.add_argument('--transport', choices=['threads', 'asyncio'], default='threads')
+    args = parser.parse_args()
+
+    receiver = Receiver(args.transport)
+    legacy, legacy_failed = run(receiver, args.legacy_messages, pooled=False)
+    pooled, pooled_failed = run(receiver, args.messages, pooled=True, transport=args.transport)
+    print(f"per-message connections:  {legacy:>9,.0f} msgs/sec, {legacy_failed} of {args.legacy_messages} sends failed")
+    print(f"pooled framed connection: {pooled:>9,.0f} msgs/sec, {pooled_failed} of {args.messages} sends failed")
+    print(f"speedup: {pooled / legacy:.1f}x")
+
+if __name__ == '__main__':
+    main()
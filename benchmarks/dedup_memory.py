@@ -0,0 +1,106 @@
+"""
+Memory and accuracy of A2A flood deduplication over a long run.
+
+Simulates a node receiving --messages distinct broadcasts at --rate per
+second (on a simulated clock), each of which arrives a second time --lag
+messages later through another peer, as flooding does. Compared:
+
+  set     the original known_messages: a set of f"{agent_id}-{time.time()}"
+          strings that is never pruned (run for --set-messages and
+          extrapolated linearly, since 10M entries need gigabytes)
+  filter  MessageFilter with 16-byte binary IDs: two rotating Bloom
+          filter generations
+
+Reports memory (tracemalloc; the filters are measured once, since they
+never grow), false positives (new messages dropped as duplicates) and
+missed duplicates (messages that would be delivered twice).
+
+    python benchmarks/dedup_memory.py --messages 10000000
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from a2a_mcp.agents.dedup import MessageFilter, MessageIds  # noqa: E402
+
+class Clock:
+    now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def run_set(messages: int, lag: int) -> int:
+    """Bytes held by the original unbounded set after `messages` broadcasts"""
+    tracemalloc.start()
+    known = set()
+    pending = deque()
+    for i in range(messages):
+        message_id = f"agent-{i % 200}-{1700000000 + i / 1000}"
+        if message_id not in known:
+            known.add(message_id)
+        pending.append(message_id)
+        if len(pending) > lag:
+            known.add(pending.popleft())
+    pending.clear()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size
+
+def run_filter(messages: int, rate: float, lag: int, capacity: int, error_rate: float, ttl: float):
+    clock = Clock()
+    ids = [MessageIds(f"agent-{i}") for i in range(200)]
+    tracemalloc.start()
+    known = MessageFilter(capacity, error_rate, ttl, clock=clock)
+    filter_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()  # Tracing would slow the run ~10x; the filters never grow
+    pending = deque()
+    false_positives = missed = 0
+    started = time.perf_counter()
+    for i in range(messages):
+        clock.now = i / rate
+        message_id = ids[i % 200].next()
+        if not known.check_and_add(message_id):
+            false_positives += 1
+        pending.append(message_id)
+        if len(pending) > lag and known.check_and_add(pending.popleft()):
+            missed += 1
+    elapsed = time.perf_counter() - started
+    return {
+        'filter_bytes': filter_bytes,
+        'final_bytes': known.memory_bytes,
+        'false_positives': false_positives,
+        'missed': missed,
+        'rotations': known.rotations,
+        'seconds': elapsed
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=10_000_000)
+    parser.add_argument('--set-messages', type=int, default=1_000_000)
+    parser.add_argument('--rate', type=float, default=1000.0, help='distinct messages per simulated second')
+    parser.add_argument('--lag', type=int, default=50, help='messages between a broadcast and its duplicate')
+    parser.add_argument('--capacity', type=int, default=100_000)
+    parser.add_argument('--error-rate', type=float, default=0.001)
+    parser.add_argument('--ttl', type=float, default=300.0)
+    args = parser.parse_args()
+
+    set_bytes = run_set(args.set_messages, args.lag)
+    per_entry = set_bytes / args.set_messages
+    print(f"set:    {set_bytes / 2**20:8.1f} MiB after {args.set_messages:,} messages "
+          f"({per_entry:.0f} B/entry, ~{per_entry * args.messages / 2**30:.1f} GiB at {args.messages:,})")
+
+    r = run_filter(args.messages, args.rate, args.lag, args.capacity, args.error_rate, args.ttl)
+    print(f"filter: {r['filter_bytes'] / 2**10:8.1f} KiB of filters, {r['final_bytes'] / 2**10:.1f} KiB of bit arrays at the end, "
+          f"{r['rotations']} rotations, {args.messages / r['seconds']:,.0f} msgs/sec")
+    print(f"        false positives {r['false_positives']:,} of {args.messages:,} "
+          f"({r['false_positives'] / args.messages:.4%}, bound ~{2 * args.error_rate:.2%}), "
+          f"missed duplicates {r['missed']:,}")
+
+if __name__ == '__main__':
+    main()
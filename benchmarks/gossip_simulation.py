@@ -0,0 +1,142 @@
+"""
+Broadcast cost of flooding versus push-pull gossip in an A2A mesh.
+
+Builds --nodes A2AAgent instances on a random mesh (about --degree peers
+each) connected by an in-memory network instead of sockets, so the real
+process_message / forward_message / IHAVE / IWANT code runs unchanged and
+every frame is counted. Each of --broadcasts broadcasts starts at a random
+node and runs until no frames are in flight; gossip then gets one pull
+round (every node sends an IHAVE digest to one random peer).
+
+Per broadcast it reports the delivery ratio (nodes that delivered it), the
+duplicate ratio (broadcast frames received for an already-seen message) and
+bytes sent.
+
+    python benchmarks/gossip_simulation.py --nodes 200 --degree 20 --fanout 3
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from a2a_mcp.agents import framing  # noqa: E402
+from a2a_mcp.agents.a2a_agent import A2AAgent  # noqa: E402
+from a2a_mcp.agents.dissemination import create_strategy  # noqa: E402
+
+class SimNetwork:
+    def __init__(self):
+        self.agents = {}
+        self.in_flight = deque()
+        self.bytes = 0
+        self.broadcast_frames = 0
+
+    def run(self):
+        while self.in_flight:
+            address, frame = self.in_flight.popleft()
+            message = framing.decode(frame)
+            if 'type' not in message:
+                self.broadcast_frames += 1
+            self.agents[address].handle_message(message)
+
+class SimConnections:
+    """Stands in for PeerConnectionManager, queueing frames on the SimNetwork"""
+
+    def __init__(self, network: SimNetwork):
+        self.network = network
+
+    def send_frame(self, address, frame: bytes):
+        self.network.bytes += len(frame)
+        self.network.in_flight.append((tuple(address), frame))
+
+    def send(self, address, message):
+        self.send_frame(tuple(address), framing.encode(message))
+
+    def close(self, address):
+        pass
+
+    def close_all(self):
+        pass
+
+    def prune_idle(self):
+        pass
+
+def build(nodes: int, degree: int, strategy: str, fanout: int, max_hops, seed: int):
+    rng = random.Random(seed)
+    network = SimNetwork()
+    agents = []
+    for i in range(nodes):
+        agent = A2AAgent(f"node-{i}", '127.0.0.1', 20000 + i, dissemination=strategy,
+                         fanout=fanout, max_hops=max_hops)
+        agent.dissemination = create_strategy(strategy, fanout, max_hops)
+        if hasattr(agent.dissemination, 'random'):
+            agent.dissemination.random = random.Random(rng.random())
+        agent.connections = SimConnections(network)
+        agent.delivered = 0
+        agent.deliver = lambda message, agent=agent: setattr(agent, 'delivered', agent.delivered + 1)
+        network.agents[agent.address] = agent
+        agents.append(agent)
+    for agent in agents:
+        for peer in rng.sample(agents, degree // 2):
+            agent.add_peer(peer.address)
+            peer.add_peer(agent.address)
+    return network, agents, rng
+
+def simulate(nodes: int, degree: int, broadcasts: int, strategy: str, fanout: int, max_hops, seed: int):
+    with contextlib.redirect_stdout(io.StringIO()):
+        network, agents, rng = build(nodes, degree, strategy, fanout, max_hops, seed)
+        push_delivered = pull_delivered = 0
+        push_bytes = pull_bytes = 0
+        frames = 0
+        for n in range(broadcasts):
+            before = sum(agent.delivered for agent in agents)
+            bytes_before, frames_before = network.bytes, network.broadcast_frames
+            rng.choice(agents).broadcast_message(f"broadcast {n}")
+            network.run()
+            push_delivered += sum(agent.delivered for agent in agents) - before
+            push_bytes += network.bytes - bytes_before
+            if agents[0].dissemination.pull:
+                bytes_before = network.bytes
+                for agent in agents:
+                    with agent.peer_lock:
+                        peers = list(agent.peers)
+                    agent.anti_entropy(rng.choice(peers))
+                network.run()
+                pull_bytes += network.bytes - bytes_before
+            pull_delivered += sum(agent.delivered for agent in agents) - before
+            frames += network.broadcast_frames - frames_before
+    # Every node but the originator can receive a broadcast over the network
+    deliveries = pull_delivered - broadcasts
+    return {
+        'push_delivery': push_delivered / (broadcasts * nodes),
+        'delivery': pull_delivered / (broadcasts * nodes),
+        'duplicates': (frames - deliveries) / frames if frames else 0.0,
+        'push_bytes': push_bytes / broadcasts,
+        'pull_bytes': pull_bytes / broadcasts
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nodes', type=int, default=200)
+    parser.add_argument('--degree', type=int, default=20)
+    parser.add_argument('--broadcasts', type=int, default=20)
+    parser.add_argument('--fanout', type=int, nargs='+', default=[2, 3, 4])
+    parser.add_argument('--max-hops', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{args.nodes} nodes, ~{args.degree} peers each, {args.broadcasts} broadcasts")
+    print(f"{'strategy':>12} {'push deliv':>11} {'deliv':>7} {'dup ratio':>10} {'push KB/bc':>11} {'pull KB/bc':>11}")
+    runs = [('flood', 0)] + [('gossip', fanout) for fanout in args.fanout]
+    for strategy, fanout in runs:
+        r = simulate(args.nodes, args.degree, args.broadcasts, strategy, fanout, args.max_hops, args.seed)
+        name = strategy if strategy == 'flood' else f"gossip f={fanout}"
+        print(f"{name:>12} {r['push_delivery']:>11.1%} {r['delivery']:>7.1%} {r['duplicates']:>10.1%} "
+              f"{r['push_bytes'] / 1024:>11.1f} {r['pull_bytes'] / 1024:>11.1f}")
+
+if __name__ == '__main__':
+    main()
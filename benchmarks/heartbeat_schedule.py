@@ -0,0 +1,129 @@
+"""
+Server-side heartbeat rate under different agent scheduling policies.
+
+Discrete-event simulation of a fleet that starts (or restarts) at the same
+moment against a server that accepts `--capacity` heartbeats per second and
+is down for `--outage` seconds shortly after. Compared policies:
+
+  fixed      the original MCPAgent loop: beat immediately, then every 30 s;
+             on failure tenacity retries after 4 s and 4 s, then the loop
+             sleeps 5 s and starts over
+  scheduler  HeartbeatScheduler: random initial phase, jittered interval,
+             decorrelated-jitter backoff on failure
+  adaptive   HeartbeatScheduler following the X-Heartbeat-Interval advice of
+             the server's HeartbeatLoad (target rate = --target-rate)
+
+Reports per-second request rate at the server (peak, p99, mean and
+coefficient of variation after the first interval) and rejected requests.
+
+    python benchmarks/heartbeat_schedule.py --agents 10000 --duration 300
+"""
+import argparse
+import heapq
+import math
+import os
+import random
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from a2a_mcp.agents.heartbeat import HeartbeatScheduler  # noqa: E402
+from a2a_mcp.mcp.load import HeartbeatLoad  # noqa: E402
+
+INTERVAL = 30.0
+
+class Clock:
+    now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+class FixedPolicy:
+    """The original loop: fixed interval, blocking 3-attempt retry, 5 s pause"""
+
+    def __init__(self):
+        self.failures = 0
+
+    def first_delay(self) -> float:
+        return 0.0
+
+    def next_delay(self, ok: bool, headers) -> float:
+        if ok:
+            self.failures = 0
+            return INTERVAL
+        self.failures += 1
+        if self.failures % 3:
+            return 4.0  # wait_exponential(min=4, max=10) for attempts 1 and 2
+        return 5.0  # retries exhausted, loop waits before the next attempt
+
+class SchedulerPolicy:
+    def __init__(self, rng: random.Random, adaptive: bool):
+        self.scheduler = HeartbeatScheduler(INTERVAL, rng=rng)
+        self.adaptive = adaptive
+
+    def first_delay(self) -> float:
+        return self.scheduler.first_delay()
+
+    def next_delay(self, ok: bool, headers) -> float:
+        if self.adaptive:
+            self.scheduler.advise(headers)
+        return self.scheduler.success() if ok else self.scheduler.failure()
+
+def simulate(policy_name: str, agents: int, duration: float, capacity: int, outage: float,
+             target_rate: float, seed: int):
+    rng = random.Random(seed)
+    clock = Clock()
+    load = HeartbeatLoad(target_rate, INTERVAL, 45.0, clock=clock)
+    if policy_name == 'fixed':
+        policies = [FixedPolicy() for _ in range(agents)]
+    else:
+        policies = [SchedulerPolicy(rng, policy_name == 'adaptive') for _ in range(agents)]
+
+    events = [(policy.first_delay(), i) for i, policy in enumerate(policies)]
+    heapq.heapify(events)
+    arrivals = Counter()
+    rejected = 0
+    outage_start = INTERVAL  # The server goes down one interval in
+    while events:
+        clock.now, agent = heapq.heappop(events)
+        if clock.now >= duration:
+            break
+        second = int(clock.now)
+        arrivals[second] += 1
+        load.record()
+        ok = arrivals[second] <= capacity and not (outage_start <= clock.now < outage_start + outage)
+        rejected += not ok
+        heapq.heappush(events, (clock.now + policies[agent].next_delay(ok, load.headers()), agent))
+
+    rates = [arrivals[s] for s in range(int(INTERVAL), int(duration))]
+    mean = sum(rates) / len(rates)
+    std = math.sqrt(sum((r - mean) ** 2 for r in rates) / len(rates))
+    return {
+        'peak': max(rates),
+        'p99': sorted(rates)[int(0.99 * (len(rates) - 1))],
+        'mean': mean,
+        'cv': std / mean if mean else 0.0,
+        'rejected': rejected,
+        'total': sum(arrivals.values())
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--agents', type=int, default=10_000)
+    parser.add_argument('--duration', type=float, default=300.0)
+    parser.add_argument('--capacity', type=int, default=1000, help='heartbeats/sec the server accepts')
+    parser.add_argument('--outage', type=float, default=20.0, help='seconds the server is down')
+    parser.add_argument('--target-rate', type=float, default=250.0, help='HeartbeatLoad target rate')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{args.agents} agents, {args.capacity}/s capacity, {args.outage:.0f} s outage at t={INTERVAL:.0f} s")
+    print(f"{'policy':>10} {'peak/s':>8} {'p99/s':>8} {'mean/s':>8} {'cv':>6} {'rejected':>10} {'requests':>10}")
+    for name in ('fixed', 'scheduler', 'adaptive'):
+        r = simulate(name, args.agents, args.duration, args.capacity, args.outage, args.target_rate, args.seed)
+        print(f"{name:>10} {r['peak']:>8} {r['p99']:>8} {r['mean']:>8.0f} {r['cv']:>6.2f} "
+              f"{r['rejected']:>10} {r['total']:>10}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Bytes per membership gossip round: full GOSSIP_PEERS dumps versus deltas.
+
+Builds --agents A2AAgent instances connected by an in-memory network, each
+starting with the same view of a --members member cluster (the other
+members are addresses only; nothing is sent to them). Every round each
+agent gossips with one random agent, as speak() does, using either
+
+  full   the original GOSSIP_PEERS message carrying every known peer
+  delta  MEMBERSHIP deltas and digest, with a bucket sync on mismatch
+
+Phases: a warm-up until the views agree, --rounds steady rounds with no
+changes, --rounds rounds in which --joins new members join at random
+agents each round, then one agent restarts with an empty view. For delta
+it also reports how many rounds the views take to converge (all digests
+equal) after the churn stops.
+
+    python benchmarks/membership_gossip.py --members 3000 --agents 20
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from a2a_mcp.agents import framing  # noqa: E402
+from a2a_mcp.agents.a2a_agent import A2AAgent  # noqa: E402
+
+class SimNetwork:
+    def __init__(self):
+        self.agents = {}
+        self.in_flight = deque()
+        self.bytes = 0
+
+    def run(self):
+        while self.in_flight:
+            address, frame = self.in_flight.popleft()
+            if address in self.agents:
+                self.agents[address].handle_message(framing.decode(frame))
+
+class SimConnections:
+    """Stands in for PeerConnectionManager, queueing frames on the SimNetwork"""
+
+    def __init__(self, network: SimNetwork):
+        self.network = network
+
+    def send_frame(self, address, frame: bytes):
+        self.network.bytes += len(frame)
+        self.network.in_flight.append((tuple(address), frame))
+
+    def send(self, address, message):
+        self.send_frame(tuple(address), framing.encode(message))
+
+    def close(self, address):
+        pass
+
+def make_agent(network: SimNetwork, i: int, members) -> A2AAgent:
+    agent = A2AAgent(f"agent-{i}", '127.0.0.1', 20000 + i)
+    agent.connections = SimConnections(network)
+    for member in members:
+        agent.add_peer(member)
+    network.agents[agent.address] = agent
+    return agent
+
+def gossip_round(network: SimNetwork, agents, protocol: str, rng: random.Random) -> int:
+    before = network.bytes
+    for agent in agents:
+        target = rng.choice([a for a in agents if a is not agent]).address
+        if protocol == 'full':
+            with agent.peer_lock:
+                peers = list(agent.peers)
+            agent._send_message(target, 'GOSSIP_PEERS', {'peers': peers})
+        else:
+            agent.gossip_membership(target)
+        network.run()
+    return network.bytes - before
+
+def converged(agents) -> bool:
+    return len({agent.membership.digest for agent in agents}) == 1
+
+def simulate(protocol: str, members: int, count: int, rounds: int, joins: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        network = SimNetwork()
+        addresses = [('127.0.0.1', 20000 + i) for i in range(count)]
+        addresses += [(f"10.{i // 65536}.{i // 256 % 256}.{i % 256}", 5000) for i in range(members - count)]
+        agents = [make_agent(network, i, addresses) for i in range(count)]
+        # Warm up: addresses are first known at incarnation 0 until each agent's own entry spreads
+        warmup = 0
+        while warmup < 1 or (protocol == 'delta' and not converged(agents) and warmup < 50):
+            gossip_round(network, agents, protocol, rng)
+            warmup += 1
+
+        steady = sum(gossip_round(network, agents, protocol, rng) for _ in range(rounds)) / rounds
+
+        churn = 0
+        for r in range(rounds):
+            for j in range(joins):
+                rng.choice(agents).add_peer((f"172.16.{r % 256}.{j % 256}", 6000 + r))
+            churn += gossip_round(network, agents, protocol, rng)
+        churn /= rounds
+
+        settle = 0
+        while not converged(agents) and settle < 50:
+            gossip_round(network, agents, protocol, rng)
+            settle += 1
+
+        restarted = agents.pop()
+        del network.agents[restarted.address]
+        fresh = make_agent(network, count - 1, [agents[0].address])
+        agents.append(fresh)
+        restart = gossip_round(network, agents, protocol, rng)
+        size = len(fresh.membership)
+    return {'steady': steady, 'churn': churn, 'settle': settle, 'restart': restart, 'restored': size}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--members', type=int, default=3000)
+    parser.add_argument('--agents', type=int, default=20)
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--joins', type=int, default=5, help='members joining per churn round')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{args.members} members, {args.agents} gossiping agents, KB sent per round (all agents)")
+    print(f"{'protocol':>9} {'steady':>9} {'churn':>9} {'restart':>9} {'converge':>9} {'restored':>9}")
+    for protocol in ('full', 'delta'):
+        r = simulate(protocol, args.members, args.agents, args.rounds, args.joins, args.seed)
+        rounds = f"{r['settle']} rnd" if protocol == 'delta' else '-'
+        print(f"{protocol:>9} {r['steady'] / 1024:>9.1f} {r['churn'] / 1024:>9.1f} {r['restart'] / 1024:>9.1f} "
+              f"{rounds:>9} {r['restored']:>9,}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Memory footprint of the MCP agent registry.
+
+Compares the original layout (a regular dataclass with an ISO last_seen
+string, an address tuple and the raw API key) with the slotted AgentData
+stored in MemoryRegistry, including its expiry heap.
+
+    python benchmarks/registry_memory.py --sizes 10000 100000 1000000
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from a2a_mcp.mcp.registry import AgentData, MemoryRegistry  # noqa: E402
+
+@dataclass
+class LegacyAgentData:
+    last_seen: str
+    status: str
+    address: tuple
+    api_key: str
+
+def build_legacy(count: int):
+    agents = {}
+    for i in range(count):
+        agents[f"agent-{i}"] = LegacyAgentData(
+            last_seen=datetime.now().isoformat(),
+            status='active',
+            address=('10.0.0.1', 40000 + i % 20000),
+            api_key=os.urandom(32).hex()
+        )
+    return agents
+
+def build_compact(count: int):
+    registry = MemoryRegistry(agent_timeout=60)
+    for i in range(count):
+        registry.add(f"agent-{i}", AgentData(time.monotonic(), 'active', '10.0.0.1', 40000 + i % 20000), count)
+    return registry
+
+def measure(builder, count: int) -> int:
+    """Bytes allocated by builder(count) that are still alive afterwards"""
+    gc.collect()
+    tracemalloc.start()
+    result = builder(count)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    gc.collect()
+    return current
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'agents':>10} {'legacy MiB':>12} {'compact MiB':>12} {'B/agent old':>12} {'B/agent new':>12}")
+    for count in args.sizes:
+        legacy = measure(build_legacy, count)
+        compact = measure(build_compact, count)
+        print(f"{count:>10} {legacy / 2**20:>12.1f} {compact / 2**20:>12.1f} "
+              f"{legacy / count:>12.0f} {compact / count:>12.0f}")
+
+if __name__ == '__main__':
+    main()
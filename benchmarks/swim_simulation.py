@@ -0,0 +1,154 @@
+"""
+Detection time and false positives of the SWIM failure detector.
+
+Starts --nodes A2A agents, each in its own process on a localhost port and
+each knowing every other node. Every outgoing frame is dropped with
+probability --loss to model a lossy network. After --warmup seconds
+--kill nodes are SIGKILLed, and the rest run for --duration more seconds.
+Each node reports every member it suspects, declares dead or sees recover.
+
+For every --suspicion-mult value it reports:
+
+  detect    seconds from the kill to the first node declaring it dead
+  all       seconds until every survivor had declared it dead
+  suspect   suspicions of nodes that were in fact alive
+  false     live nodes declared dead (false positives)
+
+    python benchmarks/swim_simulation.py --nodes 20 --kill 2 --loss 0.05
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import signal
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from a2a_mcp.agents.a2a_agent import A2AAgent  # noqa: E402
+from a2a_mcp.agents.membership import DEAD, SUSPECT  # noqa: E402
+
+HOST = '127.0.0.1'
+
+def run_node(index: int, ports, loss: float, options: dict, log_path: str):
+    sys.stdout = open(os.devnull, 'w')
+    # Stopped with SIGTERM: a multiprocessing.Event can be left locked by the nodes that get SIGKILLed
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    rng = random.Random(index)
+    peers = [f"{HOST}:{port}" for port in ports if port != ports[index]]
+    agent = A2AAgent(f"node-{index}", HOST, ports[index], peers, **options)
+
+    send_frame = agent.connections.send_frame
+    def lossy_send_frame(address, frame):
+        if rng.random() >= loss:
+            send_frame(address, frame)
+    agent.connections.send_frame = lossy_send_frame
+
+    # One file per node, for the same reason
+    log = open(log_path, 'a', buffering=1)
+    member_changed = agent.member_changed
+    def record(address, status):
+        log.write(f"{time.time()} {address[1]} {status}\n")
+        member_changed(address, status)
+    agent.member_changed = record
+
+    agent.start()
+    stop.wait()
+    agent.stop()
+
+def simulate(args, suspicion_mult: int) -> dict:
+    ports = [args.base_port + i for i in range(args.nodes)]
+    options = {
+        'transport': args.transport,
+        'probe_interval': args.probe_interval,
+        'probe_timeout': args.probe_interval / 2,
+        'indirect_probes': args.indirect_probes,
+        'suspicion_mult': suspicion_mult
+    }
+    logs = tempfile.mkdtemp(prefix='swim-')
+    log_paths = [os.path.join(logs, f"node-{i}.log") for i in range(args.nodes)]
+    processes = [multiprocessing.Process(target=run_node, args=(i, ports, args.loss, options, log_paths[i]),
+                                         daemon=True)
+                 for i in range(args.nodes)]
+    for process in processes:
+        process.start()
+    time.sleep(args.warmup)
+
+    killed = {}
+    for index in random.Random(args.seed).sample(range(args.nodes), args.kill):
+        processes[index].kill()
+        killed[ports[index]] = (index, time.time())
+    time.sleep(args.duration)
+    ended = time.time()  # Nodes shutting down from here on look dead to the rest; ignore that
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    for process in processes:
+        process.join(timeout=5)
+        if process.is_alive():
+            process.kill()
+
+    declared = {port: {} for port in killed}  # Killed port -> observer -> when it declared it dead
+    false_suspicions = false_deaths = 0
+    for observer, path in enumerate(log_paths):
+        if not os.path.exists(path):
+            continue
+        with open(path) as log:
+            for line in log:
+                at, port, status = line.split()
+                at, port, status = float(at), int(port), int(status)
+                if at > ended:
+                    continue
+                if port in killed and at >= killed[port][1]:
+                    if status == DEAD:
+                        declared[port].setdefault(observer, at)
+                elif status == SUSPECT:
+                    false_suspicions += 1
+                elif status == DEAD:
+                    false_deaths += 1
+        os.remove(path)
+    os.rmdir(logs)
+
+    survivors = args.nodes - args.kill
+    detect = [min(declared[port].values()) - killed[port][1] for port in killed if declared[port]]
+    complete = [max(declared[port].values()) - killed[port][1] for port in killed
+                if len(declared[port]) == survivors]
+    return {
+        'detected': len(detect),
+        'detect': statistics.mean(detect) if detect else float('nan'),
+        'complete': len(complete),
+        'all': statistics.mean(complete) if complete else float('nan'),
+        'false_suspicions': false_suspicions,
+        'false_deaths': false_deaths
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nodes', type=int, default=20)
+    parser.add_argument('--kill', type=int, default=2)
+    parser.add_argument('--loss', type=float, default=0.05, help='fraction of frames dropped')
+    parser.add_argument('--probe-interval', type=float, default=0.5)
+    parser.add_argument('--indirect-probes', type=int, default=3)
+    parser.add_argument('--suspicion-mult', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--transport', choices=['threads', 'asyncio'], default='threads')
+    parser.add_argument('--warmup', type=float, default=5.0)
+    parser.add_argument('--duration', type=float, default=15.0)
+    parser.add_argument('--base-port', type=int, default=47600)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{args.nodes} processes, {args.kill} killed, {args.loss:.0%} frames lost, "
+          f"probe every {args.probe_interval}s, {args.indirect_probes} indirect probes")
+    print(f"{'susp mult':>9} {'detected':>9} {'detect s':>9} {'all s':>7} {'suspect':>8} {'false':>6}")
+    for suspicion_mult in args.suspicion_mult:
+        r = simulate(args, suspicion_mult)
+        print(f"{suspicion_mult:>9} {r['detected']:>5}/{args.kill:<3} {r['detect']:>9.2f} {r['all']:>7.2f} "
+              f"{r['false_suspicions']:>8} {r['false_deaths']:>6}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Throughput of the MCP task dispatch queue.
+
+Producers submit tasks while agents pull them in batches and acknowledge
+them, all in-process against TaskQueue, so the numbers are the dispatch
+overhead the server adds per task (no HTTP or JSON).
+
+    python benchmarks/task_dispatch.py --agents 1000 --tasks 200000 --batch 100
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from a2a_mcp.mcp.tasks import QueueFull, TaskQueue  # noqa: E402
+
+def run(agents: int, tasks: int, batch: int, keyed: bool) -> float:
+    """Submit, pull and acknowledge tasks; returns tasks per second"""
+    queue = TaskQueue(max_pending=max(batch, 2 * tasks // agents + 1))
+    agent_ids = [f"agent-{i}" for i in range(agents)]
+    for agent_id in agent_ids:
+        queue.pull(agent_id, 1)  # Register the consumers
+
+    started = time.perf_counter()
+    submitted = completed = 0
+    while completed < tasks:
+        # Keep roughly one batch per agent outstanding, like a steady producer
+        while submitted < tasks and submitted - completed < agents * batch:
+            try:
+                queue.submit({'n': submitted}, key=f"key-{submitted}" if keyed else None)
+                submitted += 1
+            except QueueFull:
+                break
+        for agent_id in agent_ids:
+            leased = queue.pull(agent_id, batch)
+            if leased:
+                completed += sum(queue.ack(agent_id, [task.task_id for task in leased]))
+    return tasks / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--agents', type=int, default=1000)
+    parser.add_argument('--tasks', type=int, default=200_000)
+    parser.add_argument('--batch', type=int, nargs='+', default=[1, 10, 100])
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    print(f"{'assignment':>14} {'batch':>6} {'tasks/sec':>12}")
+    for keyed in (False, True):
+        for batch in args.batch:
+            rate = run(args.agents, args.tasks, batch, keyed)
+            print(f"{'consistent-hash' if keyed else 'least-loaded':>14} {batch:>6} {rate:>12,.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Encode/decode cost and size of A2A wire formats.
+
+Compares, for a broadcast, a STATUS_UPDATE and a GOSSIP_PEERS message with
+--peers peers:
+
+  raw      the original path: json.dumps(...).encode() per send and
+           json.loads(data.decode()) on a single recv(4096)
+  json     framing.encode / FrameDecoder with the JSON codec
+  msgpack  the same frames with msgpack bodies (if msgpack is installed)
+
+It first checks that a stream of concatenated frames, including ones far
+larger than 4 KiB, decodes correctly when fed in random-sized chunks.
+
+    python benchmarks/wire_codec.py --peers 2000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from a2a_mcp.agents import framing  # noqa: E402
+
+def sample_messages(peers: int) -> dict:
+    return {
+        'broadcast': {
+            'id': os.urandom(16).hex(),
+            'sender': 'agent-1',
+            'content': 'Hello from agent-1 at 2026-10-17 12:00:00',
+            'timestamp': time.time(),
+            'sender_address': ['127.0.0.1', 5001],
+            'hops': 2,
+            'relay': ['127.0.0.1', 5003]
+        },
+        'status': {
+            'type': 'STATUS_UPDATE',
+            'sender': 'agent-1',
+            'status': {'state': 'running', 'load': 0.42, 'peers': 12, 'uptime': 86400.5},
+            'timestamp': time.time()
+        },
+        'peers': {
+            'type': 'GOSSIP_PEERS',
+            'sender': 'agent-1',
+            'peers': [[f"10.0.{i // 250}.{i % 250}", 5000 + i % 1000] for i in range(peers)]
+        }
+    }
+
+def check_stream(codecs, seed: int) -> int:
+    """Feed concatenated frames in random chunks and verify every message comes back"""
+    rng = random.Random(seed)
+    messages = [{'id': str(i), 'content': 'x' * rng.choice([0, 10, 4000, 5000, 70000])} for i in range(200)]
+    stream = b''.join(framing.encode(m, rng.choice(codecs)) for m in messages)
+    decoder = framing.FrameDecoder()
+    decoded = []
+    offset = 0
+    while offset < len(stream):
+        size = rng.randint(1, 9000)
+        decoded.extend(decoder.feed(stream[offset:offset + size]))
+        offset += size
+    assert decoded == messages and decoder.pending == 0, 'stream decode mismatch'
+    return len(stream)
+
+def timed(function, rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        function()
+    return rounds / (time.perf_counter() - started)
+
+def measure(message: dict, codec: str, rounds: int):
+    if codec == 'raw':
+        data = json.dumps(message).encode()
+        return len(data), timed(lambda: json.dumps(message).encode(), rounds), \
+            timed(lambda: json.loads(data.decode()), rounds)
+    frame = framing.encode(message, codec)
+    decoder = framing.FrameDecoder()
+    return len(frame), timed(lambda: framing.encode(message, codec), rounds), \
+        timed(lambda: decoder.feed(frame), rounds)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--peers', type=int, default=2000)
+    parser.add_argument('--rounds', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    codecs = ['raw', 'json'] + (['msgpack'] if framing.msgpack is not None else [])
+    stream_bytes = check_stream([c for c in codecs if c != 'raw'], args.seed)
+    print(f"stream check: 200 frames, {stream_bytes:,} bytes in random chunks decoded intact")
+    if framing.msgpack is None:
+        print("msgpack not installed; pip install 'a2a_mcp[msgpack]' to compare it")
+
+    print(f"{'message':>10} {'codec':>8} {'bytes':>8} {'encode/s':>11} {'decode/s':>11}")
+    for name, message in sample_messages(args.peers).items():
+        rounds = args.rounds if name != 'peers' else max(1, args.rounds // 100)
+        for codec in codecs:
+            size, encode_rate, decode_rate = measure(message, codec, rounds)
+            print(f"{name:>10} {codec:>8} {size:>8,} {encode_rate:>11,.0f} {decode_rate:>11,.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -6,34 +6,61 @@ import random
 import sys
 import uuid
 from datetime import datetime
+from . import framing
+from .connections import PeerConnectionManager, parse_address
+from .dedup import MessageFilter, MessageIds
+from .dissemination import RecentMessages, create_strategy
+from .failure_detector import FailureDetector
+from .membership import DEAD, SUSPECT, Membership
 
 class A2AAgent:
-    def __init__(self, agent_id, host, port, initial_peers=None):
+    def __init__(self, agent_id, host, port, initial_peers=None, max_connections=64, idle_timeout=60.0,
+                 transport='threads', dissemination='flood', fanout=3, max_hops=None, wire_codec='json',
+                 probe_interval=1.0, probe_timeout=0.5, indirect_probes=3, suspicion_mult=4):
         self.agent_id = agent_id or f"a2a-agent-{uuid.uuid4().hex[:6]}"
         self.host = host
         self.port = int(port)
         self.address = (host, self.port)
-        self.peers = set(initial_peers or [])
+        self.peers = set()
         self.peer_lock = threading.Lock()
+        # Versioned view of the mesh, gossiped as deltas. Starting from the clock means a restarted
+        # agent's incarnation supersedes whatever the mesh remembers about its previous run
+        self.membership = Membership(self.address, incarnation=int(time.time()))
+        self.detector = FailureDetector(self, probe_interval, probe_timeout, indirect_probes, suspicion_mult)
         self.stop_event = threading.Event()
         self.listener_thread = None
         self.speaker_thread = None
         self.status = "Initializing"
         self.running = False
         self.server_socket = None
-        self.known_messages = set()  # For deduplication
-        self.message_lock = threading.Lock()
+        self.known_messages = MessageFilter()  # For deduplication; bounded and expiring
+        self.message_ids = MessageIds(self.agent_id)
+        self.dissemination = create_strategy(dissemination, fanout, max_hops)
+        self.recent = RecentMessages()  # Served to peers that ask for messages they missed
+        self.transport = transport
+        if wire_codec not in framing.CODECS:
+            raise ValueError(f"Unknown wire codec: {wire_codec}")
+        if wire_codec == 'msgpack' and framing.msgpack is None:
+            raise ValueError("The msgpack wire codec requires msgpack: pip install 'a2a_mcp[msgpack]'")
+        self.wire_codec = wire_codec
+        if transport == 'asyncio':
+            from .async_transport import AsyncTransport
+            self.connections = AsyncTransport(self, max_connections=max_connections, idle_timeout=idle_timeout,
+                                              codec=wire_codec)
+        elif transport == 'threads':
+            self.connections = PeerConnectionManager(max_connections, idle_timeout, codec=wire_codec)
+        else:
+            raise ValueError(f"Unknown transport: {transport}")
 
         if initial_peers:
             for peer_str in initial_peers:
                 try:
-                    peer_host, peer_port = peer_str.split(':')
-                    self.add_peer((peer_host, int(peer_port)))
+                    self.add_peer(parse_address(peer_str))
                 except ValueError:
                     print(f"[{self.agent_id}] Invalid initial peer format: {peer_str}. Use HOST:PORT.", file=sys.stderr)
 
     def _send_message(self, target_address, message_type, payload=None):
-        """Sends a JSON message to a specific peer."""
+        """Sends a message to a specific peer over its pooled connection."""
         message = {
             'type': message_type,
             'sender_id': self.agent_id,
@@ -41,27 +68,29 @@ class A2AAgent:
             'timestamp': time.time(),
             'payload': payload or {}
         }
+        members = self.membership.piggyback()  # Membership changes ride along on every message
+        target = parse_address(target_address)
+        state = self.membership.status(target)
+        if state is not None and state[1] == SUSPECT:
+            members.append([target[0], target[1], state[0], SUSPECT])  # Let a suspect refute at once
+        if members:
+            message['members'] = members
+        # A failed send does not remove the peer: one lost message is not proof it is down,
+        # so that is left to the failure detector's probes
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                sock.settimeout(1.0) # Short timeout for connection attempt
-                sock.connect(target_address)
-                sock.sendall(json.dumps(message).encode('utf-8'))
+            self.connections.send(target_address, message)
             # print(f"[{self.agent_id}] Sent {message_type} to {target_address}")
             return True
-        except socket.timeout:
-            # print(f"[{self.agent_id}] Timeout connecting to peer {target_address}", file=sys.stderr)
-            self.remove_peer(target_address) # Assume peer is down/unreachable
-        except ConnectionRefusedError:
-            # print(f"[{self.agent_id}] Connection refused by peer {target_address}", file=sys.stderr)
-            self.remove_peer(target_address)
+        except (socket.timeout, ConnectionRefusedError):
+            pass
         except Exception as e:
             print(f"[{self.agent_id}] Error sending message to {target_address}: {e}", file=sys.stderr)
-            self.remove_peer(target_address) # Remove potentially bad peer
         return False
 
-    def add_peer(self, peer_address):
+    def add_peer(self, peer_address, incarnation=0):
         """Adds a peer to the known list if it's not itself."""
-        if peer_address != self.address:
+        peer_address = parse_address(peer_address)
+        if peer_address != self.address and self.membership.add(peer_address, incarnation):
             with self.peer_lock:
                 if peer_address not in self.peers:
                     print(f"[{self.agent_id}] Discovered new peer: {peer_address}")
@@ -70,68 +99,213 @@ class A2AAgent:
         return False
 
     def remove_peer(self, peer_address):
-        """Removes a peer from the list."""
+        """Forgets a peer locally; gossip from other agents may bring it back."""
+        peer_address = parse_address(peer_address)
         with self.peer_lock:
             if peer_address in self.peers:
                 print(f"[{self.agent_id}] Removing peer: {peer_address}")
                 self.peers.discard(peer_address)
+        self.membership.remove(peer_address)
+        self.connections.close(peer_address)
+
+    def member_changed(self, address, status):
+        """React to a member joining, being suspected, recovering or being declared dead"""
+        if status == DEAD:
+            print(f"[{self.agent_id}] Peer {address[0]}:{address[1]} declared dead")
+            with self.peer_lock:
+                self.peers.discard(address)
+            self.connections.close(address)
+        else:
+            if status == SUSPECT:
+                print(f"[{self.agent_id}] Suspecting peer {address[0]}:{address[1]}")
+            self.add_peer(address)
 
     def handle_connection(self, client_socket, address):
-        """Handle incoming peer connection"""
+        """Handle incoming peer connection until the peer closes it"""
+        decoder = framing.FrameDecoder()
         try:
-            data = client_socket.recv(4096).decode('utf-8')
-            message = json.loads(data)
-            
-            # Add sender to peers if not known
-            sender_address = message.get('sender_address')
-            if sender_address and sender_address not in self.peers:
-                self.peers.add(sender_address)
-
-            # Process message
-            self.process_message(message)
-            
+            data = client_socket.recv(65536)
+            if data.startswith(b'{'):
+                # Unframed JSON from an older agent: one message per connection
+                chunks, size = [data], len(data)
+                while data:
+                    data = client_socket.recv(65536)
+                    chunks.append(data)
+                    size += len(data)
+                    if size > framing.MAX_FRAME:
+                        raise framing.FrameError(f"unframed message exceeds {framing.MAX_FRAME} bytes")
+                self.handle_message(json.loads(b''.join(chunks)))
+                return
+            while data:
+                for message in decoder.feed(data):
+                    try:
+                        self.handle_message(message)
+                    except Exception as e:  # One bad message must not drop the connection
+                        print(f"[{self.agent_id}] Error handling message from {address}: {e}", file=sys.stderr)
+                data = client_socket.recv(65536)
+
         except Exception as e:
             print(f"Error handling connection from {address}: {e}")
         finally:
             client_socket.close()
 
+    def handle_message(self, message):
+        """Dispatch one message received from a peer"""
+        # Add sender to peers if not known
+        sender_address = message.get('sender_address')
+        if message.get('members'):
+            self.merge_membership(message['members'], sender_address)
+        if sender_address:
+            self.add_peer(sender_address)
+
+        message_type = message.get('type')
+        if message_type == 'PROBE':
+            self.detector.handle_probe(message)
+        elif message_type == 'PROBE_ACK':
+            self.detector.handle_ack(message)
+        elif message_type == 'PROBE_REQ':
+            self.detector.handle_probe_req(message)
+        elif message_type == 'MEMBERSHIP':
+            self.handle_membership(message)
+        elif message_type == 'MEMBERSHIP_BUCKETS':
+            self.handle_membership_buckets(message)
+        elif message_type == 'MEMBERSHIP_SYNC':
+            self.handle_membership_sync(message)
+        elif message_type == 'GOSSIP_PEERS':
+            # Full peer list from an agent that predates MEMBERSHIP
+            for peer in message.get('payload', {}).get('peers', []):
+                self.add_peer(peer)
+        elif message_type == 'IHAVE':
+            self.handle_ihave(message)
+        elif message_type == 'IWANT':
+            self.handle_iwant(message)
+        elif message_type in ('PING', 'STATUS_UPDATE'):
+            pass  # Receiving it is all a PING needs; status updates are informational
+        else:
+            self.process_message(message)
+
     def process_message(self, message):
         """Process received message and forward to peers"""
         message_id = message.get('id')
-        with self.message_lock:
-            if message_id in self.known_messages:
-                return  # Already processed this message
-            self.known_messages.add(message_id)
+        if not message_id:
+            return  # Without an ID it cannot be deduplicated, and flooding it would never stop
+        if not self.known_messages.check_and_add(message_id):
+            return  # Already processed this message
+        if self.dissemination.pull:
+            self.recent.add(message_id, message)
 
-        # Print received message
-        print(f"Received from {message.get('sender_id')}: {message.get('content')}")
+        self.deliver(message)
 
-        # Forward to other peers (flood routing)
+        # Forward to other peers (flood or gossip, per self.dissemination)
         self.forward_message(message)
 
+    def deliver(self, message):
+        """Hand a new broadcast to the user"""
+        print(f"Received from {message.get('sender_id')}: {message.get('content')}")
+
     def forward_message(self, message):
-        """Forward message to all known peers"""
-        for peer in self.peers:
-            if peer != f"{self.host}:{self.port}":  # Don't send to self
-                try:
-                    host, port = peer.split(':')
-                    self.send_to_peer(host, int(port), message)
-                except Exception as e:
-                    print(f"Error forwarding to {peer}: {e}")
+        """Forward message to the peers chosen by the dissemination strategy"""
+        hops = message.get('hops', 0)
+        max_hops = self.dissemination.max_hops
+        if max_hops is not None and hops >= max_hops:
+            return  # Travelled far enough; pull repairs any node it missed
+
+        # Nodes that certainly have it: the originator and the relay we got it from
+        exclude = set()
+        for field in ('sender_address', 'relay'):
+            if message.get(field):
+                exclude.add(parse_address(message[field]))
+        with self.peer_lock:
+            current_peers = list(self.peers)
+        targets = self.dissemination.select(current_peers, exclude)
+        if not targets:
+            return
+
+        forwarded = dict(message, hops=hops + 1, relay=f"{self.host}:{self.port}")
+        frame = framing.encode(forwarded, self.wire_codec)  # Encode once for every peer
+        for peer in targets:
+            try:
+                self.connections.send_frame(peer, frame)
+            except Exception as e:
+                print(f"Error forwarding to {peer[0]}:{peer[1]}: {e}")
+
+    def anti_entropy(self, peer):
+        """Offer a peer the IDs of recent broadcasts (the pull half of gossip)"""
+        ids = self.recent.digest()
+        if ids:
+            self._send_message(peer, 'IHAVE', {'ids': ids})
+
+    def handle_ihave(self, message):
+        """Ask for the offered broadcasts we have not seen"""
+        ids = message.get('payload', {}).get('ids', [])
+        missing = [message_id for message_id in ids if message_id not in self.known_messages]
+        if missing and message.get('sender_address'):
+            self._send_message(message['sender_address'], 'IWANT', {'ids': missing})
+
+    def handle_iwant(self, message):
+        """Send requested broadcasts directly to the peer that asked"""
+        peer = message.get('sender_address')
+        if not peer:
+            return
+        for wanted in self.recent.get(message.get('payload', {}).get('ids', [])):
+            try:
+                self.connections.send(peer, dict(wanted, relay=f"{self.host}:{self.port}"))
+            except Exception as e:
+                print(f"Error sending to {peer}: {e}")
+
+    def gossip_membership(self, peer):
+        """Send a peer the membership changes it has not been sent yet, plus our digest"""
+        updates = self.membership.deltas(peer)
+        self._send_message(peer, 'MEMBERSHIP', {'digest': self.membership.digest, 'updates': updates})
+
+    def merge_membership(self, updates, sender=None):
+        """Apply [host, port, incarnation, status] entries from a peer"""
+        for address, status in self.membership.merge(updates, parse_address(sender) if sender else None):
+            self.member_changed(address, status)
+
+    def handle_membership(self, message):
+        """Merge a peer's deltas, answer with ours, and bucket-sync if the views still differ"""
+        payload = message.get('payload', {})
+        sender = message.get('sender_address')
+        self.merge_membership(payload.get('updates', []), sender)
+        if not sender or payload.get('final') or payload.get('digest') == self.membership.digest:
+            return
+        updates = [] if payload.get('reply') else self.membership.deltas(parse_address(sender))
+        if updates:
+            self._send_message(sender, 'MEMBERSHIP',
+                               {'digest': self.membership.digest, 'updates': updates, 'reply': True})
+        else:
+            self._send_message(sender, 'MEMBERSHIP_BUCKETS', {'buckets': self.membership.bucket_digests()})
+
+    def handle_membership_buckets(self, message):
+        """Send our entries in the buckets whose digests differ from the peer's"""
+        sender = message.get('sender_address')
+        buckets = self.membership.differing_buckets(message.get('payload', {}).get('buckets', []))
+        if sender and buckets:
+            self._send_message(sender, 'MEMBERSHIP_SYNC',
+                               {'buckets': buckets, 'updates': self.membership.entries(buckets)})
+
+    def handle_membership_sync(self, message):
+        """Merge the peer's side of the differing buckets and answer with ours"""
+        payload = message.get('payload', {})
+        sender = message.get('sender_address')
+        self.merge_membership(payload.get('updates', []), sender)
+        buckets = payload.get('buckets', [])
+        if sender:
+            self._send_message(sender, 'MEMBERSHIP', {'digest': self.membership.digest, 'final': True,
+                                                      'updates': self.membership.entries(buckets)})
 
     def send_to_peer(self, host, port, message):
         """Send message to a specific peer"""
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.connect((host, port))
-                s.send(json.dumps(message).encode('utf-8'))
+            self.connections.send((host, port), message)
         except Exception as e:
             print(f"Error sending to {host}:{port}: {e}")
 
     def broadcast_message(self, content):
         """Broadcast a message to the network"""
         message = {
-            'id': f"{self.agent_id}-{time.time()}",
+            'id': self.message_ids.next().hex(),
             'sender_id': self.agent_id,
             'sender_address': f"{self.host}:{self.port}",
             'content': content,
@@ -142,6 +316,7 @@ class A2AAgent:
     def start_server(self):
         """Start listening for incoming connections"""
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)  # Rebind at once after a restart
         self.server_socket.bind((self.host, self.port))
         self.server_socket.listen(5)
         print(f"A2A Agent {self.agent_id} listening on {self.host}:{self.port}")
@@ -165,6 +340,8 @@ class A2AAgent:
         self.status = "Starting speaker"
         while not self.stop_event.is_set():
             try:
+                self.connections.prune_idle()
+
                 # Get a snapshot of peers to iterate over
                 with self.peer_lock:
                     current_peers = list(self.peers) # Make a copy
@@ -185,12 +362,9 @@ class A2AAgent:
                         self._send_message(target_peer, 'PING')
 
                     elif action == 'GOSSIP':
-                        # Share our list of known peers (convert set to list for JSON)
-                        with self.peer_lock:
-                            peer_list_payload = list(self.peers)
-                        # print(f"[{self.agent_id}] Gossiping {len(peer_list_payload)} peers to {target_peer}")
+                        # Share membership changes since we last gossiped with this peer
                         self.status = f"Gossiping to {target_peer[0]}"
-                        self._send_message(target_peer, 'GOSSIP_PEERS', {'peers': peer_list_payload})
+                        self.gossip_membership(target_peer)
 
                     elif action == 'STATUS':
                          # Send a simple status update
@@ -199,6 +373,9 @@ class A2AAgent:
                          self.status = f"Sharing status with {target_peer[0]}"
                          self._send_message(target_peer, 'STATUS_UPDATE', {'status': current_status})
 
+                    if self.dissemination.pull:
+                        self.anti_entropy(target_peer)
+
                 # Wait before next action
                 wait_time = random.uniform(5, 15) # Random interval
                 self.stop_event.wait(wait_time)
@@ -215,18 +392,22 @@ class A2AAgent:
     def start(self):
         """Start the agent"""
         self.running = True
-        server_thread = threading.Thread(target=self.start_server)
-        server_thread.daemon = True
-        server_thread.start()
+        if self.transport == 'asyncio':
+            self.connections.start()  # Returns once the listener is bound
+        else:
+            server_thread = threading.Thread(target=self.start_server)
+            server_thread.daemon = True
+            server_thread.start()
 
-        # Give listener a moment to bind port before speaker starts potentially removing peers
-        time.sleep(0.5)
+            # Give listener a moment to bind port before speaker starts potentially removing peers
+            time.sleep(0.5)
 
         if self.speaker_thread is None or not self.speaker_thread.is_alive():
              self.speaker_thread = threading.Thread(target=self.speak, daemon=True)
              self.speaker_thread.start()
         else:
              print(f"[{self.agent_id}] Speaker already running.")
+        self.detector.start()
 
         print(f"[{self.agent_id}] A2A Agent started. ID: {self.agent_id}, Address: {self.address}, Initial Peers: {[f'{p[0]}:{p[1]}' for p in self.peers]}")
 
@@ -235,6 +416,10 @@ class A2AAgent:
         self.running = False
         if self.server_socket:
             self.server_socket.close()
+        if self.transport == 'asyncio':
+            self.connections.stop()
+        else:
+            self.connections.close_all()
         print(f"A2A Agent {self.agent_id} stopped")
         self.stop_event.set()
         threads_to_join = [self.listener_thread, self.speaker_thread]
@@ -244,9 +429,13 @@ class A2AAgent:
         print(f"[{self.agent_id}] Agent stopped.")
         self.status = "Stopped"
 
-def run_agent(agent_id, host, port, initial_peers):
+def run_agent(agent_id, host, port, initial_peers, transport='threads', dissemination='flood', fanout=3,
+              max_hops=None, wire_codec='json', probe_interval=1.0, suspicion_mult=4):
     """Run an A2A agent"""
-    agent = A2AAgent(agent_id, host, port, initial_peers)
+    agent = A2AAgent(agent_id, host, port, initial_peers, transport=transport,
+                     dissemination=dissemination, fanout=fanout, max_hops=max_hops, wire_codec=wire_codec,
+                     probe_interval=probe_interval, probe_timeout=probe_interval / 2,
+                     suspicion_mult=suspicion_mult)
     try:
         agent.start()
         # Interactive mode for sending messages
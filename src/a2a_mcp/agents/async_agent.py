@@ -0,0 +1,261 @@
+import time
+import random
+import asyncio
+import hashlib
+import logging
+from typing import Dict, List, Optional
+import aiohttp
+from .heartbeat import HeartbeatScheduler
+
+logger = logging.getLogger(__name__)
+
+class AsyncMCPAgent:
+    """One agent identity driven by an AsyncAgentPool
+
+    Mirrors MCPAgent's register/heartbeat behaviour (a failed heartbeat is
+    not retried in place; the scheduler backs off before the next one)
+    without a thread or HTTP session of its own.
+    """
+
+    def __init__(self, agent_id: str, pool: 'AsyncAgentPool'):
+        self.agent_id = agent_id
+        self.pool = pool
+        self.access_token: Optional[str] = None
+        self.last_heartbeat_success = False
+        self.start_time = time.time()
+        self.scheduler = HeartbeatScheduler(pool.heartbeat_interval)
+
+    def _get_headers(self) -> dict:
+        """Get request headers with authentication"""
+        headers = {'Content-Type': 'application/json'}
+        if self.access_token:
+            headers['Authorization'] = f'Bearer {self.access_token}'
+        return headers
+
+    async def register(self) -> bool:
+        """Register with the MCP server"""
+        try:
+            api_key = hashlib.sha256(f"agent-{self.agent_id}-{time.time()}".encode()).hexdigest()
+            async with self.pool.http.post(
+                f"{self.pool.mcp_url}/register",
+                json={'agent_id': self.agent_id, 'api_key': api_key},
+                headers=self.pool.gateway_headers()
+            ) as response:
+                response.raise_for_status()
+                data = await response.json()
+            self.access_token = data.get('access_token')
+
+            if not self.access_token:
+                logger.error(f"No access token received from server for {self.agent_id}")
+                return False
+
+            logger.debug(f"Successfully registered with MCP as {self.agent_id}")
+            return True
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Failed to register {self.agent_id} with MCP: {e}")
+            return False
+
+    async def heartbeat_once(self) -> bool:
+        """Send one heartbeat and adopt the interval the server advises"""
+        try:
+            async with self.pool.http.post(
+                f"{self.pool.mcp_url}/heartbeat/{self.agent_id}",
+                json={'status': self.get_status()},
+                headers=self._get_headers()
+            ) as response:
+                self.scheduler.advise(response.headers)
+                if response.status == 404:
+                    # Evicted or the server lost its registry: get a fresh identity
+                    self.access_token = None
+                response.raise_for_status()
+            self.last_heartbeat_success = True
+            return True
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.last_heartbeat_success = False
+            logger.error(f"Failed to send heartbeat for {self.agent_id}: {e}")
+            if self.access_token is None:
+                await self.register()
+            raise
+
+    def get_status(self) -> str:
+        """Get current agent status"""
+        return "healthy" if self.last_heartbeat_success else "degraded"
+
+    def check_health(self) -> dict:
+        """Check agent's health status"""
+        return {
+            'status': self.get_status(),
+            'uptime': time.time() - self.start_time,
+            'last_heartbeat_success': self.last_heartbeat_success,
+            'connected_to_mcp': bool(self.access_token)
+        }
+
+class AsyncAgentPool:
+    """Many agent identities in one event loop over a bounded connection pool
+
+    All agents share one aiohttp session whose connector keeps at most
+    max_connections connections to the server open, so 5,000 agents need
+    neither 5,000 threads nor 5,000 sockets.
+
+    The server rate-limits registrations and heartbeats per client address
+    (5 and 30 a minute by default), and every agent of the pool shares one
+    address. Given the server's gateway key, the pool therefore acts as a
+    gateway: registrations carrying its gateway token are exempt from the
+    per-address limit, and all agents heartbeat together in batches on
+    /heartbeats. Without a key, registrations are paced to register_rate per
+    second and each agent heartbeats on its own schedule, first heartbeats
+    spread evenly (plus jitter) across the interval, which only suits as
+    many agents as the heartbeat limit allows.
+    """
+
+    def __init__(self, mcp_url: str, heartbeat_interval: float = 30.0,
+                 max_connections: int = 100, request_timeout: float = 10.0,
+                 gateway_id: str = 'agent-pool', gateway_key: Optional[str] = None,
+                 register_rate: Optional[float] = None, batch_size: int = 10000):
+        self.mcp_url = mcp_url.rstrip('/')
+        self.heartbeat_interval = heartbeat_interval
+        self.max_connections = max_connections
+        self.request_timeout = request_timeout
+        self.gateway_id = gateway_id
+        self.gateway_key = gateway_key
+        self.gateway_token: Optional[str] = None
+        self.register_rate = register_rate
+        self.batch_size = batch_size
+        self.scheduler = HeartbeatScheduler(heartbeat_interval)
+        self.agents: Dict[str, AsyncMCPAgent] = {}
+        self.http: Optional[aiohttp.ClientSession] = None
+        self.running = False
+        self._tasks: List[asyncio.Task] = []
+
+    def add_agent(self, agent_id: str) -> AsyncMCPAgent:
+        """Add an agent identity; takes effect on the next start()"""
+        agent = self.agents[agent_id] = AsyncMCPAgent(agent_id, self)
+        return agent
+
+    def gateway_headers(self) -> dict:
+        """Authorization for requests the pool makes as a gateway, if it is one"""
+        return {'Authorization': f'Bearer {self.gateway_token}'} if self.gateway_token else {}
+
+    async def register_gateway(self):
+        """Get a gateway token for the pool"""
+        async with self.http.post(
+            f"{self.mcp_url}/gateway/register",
+            json={'gateway_id': self.gateway_id, 'gateway_key': self.gateway_key}
+        ) as response:
+            response.raise_for_status()
+            self.gateway_token = (await response.json())['access_token']
+
+    async def send_batch_heartbeats(self) -> int:
+        """Heartbeat for every agent through the gateway, returning how many were accepted"""
+        if self.gateway_token is None:
+            await self.register_gateway()
+        agents = list(self.agents.values())
+        accepted = 0
+        lost = []
+        for start in range(0, len(agents), self.batch_size):
+            batch = agents[start:start + self.batch_size]
+            async with self.http.post(
+                f"{self.mcp_url}/heartbeats",
+                json={'heartbeats': [{'agent_id': agent.agent_id, 'status': agent.get_status()} for agent in batch]},
+                headers=self.gateway_headers()
+            ) as response:
+                self.scheduler.advise(response.headers)
+                if response.status == 401:
+                    self.gateway_token = None  # Expired: the next batch starts with a fresh one
+                response.raise_for_status()
+                results = (await response.json())['results']
+            for agent, result in zip(batch, results):
+                agent.last_heartbeat_success = 'status' in result
+                if agent.last_heartbeat_success:
+                    accepted += 1
+                else:
+                    lost.append(agent)
+        if lost:
+            # Evicted or the server lost its registry: get fresh identities
+            await asyncio.gather(*(agent.register() for agent in lost))
+        return accepted
+
+    async def _heartbeat_loop(self, agent: AsyncMCPAgent, register_at: float, phase: float):
+        """Register at a paced offset, then heartbeat from a spread phase as the agent's scheduler says"""
+        await asyncio.sleep(register_at)
+        await agent.register()
+        delay = phase
+        while self.running:
+            await asyncio.sleep(delay)
+            try:
+                await agent.heartbeat_once()
+                delay = agent.scheduler.success()
+            except Exception as e:
+                logger.debug(f"Heartbeat of {agent.agent_id} failed, backing off: {e}")
+                delay = agent.scheduler.failure()
+
+    async def _batch_heartbeat_loop(self):
+        """Heartbeat for all agents at once, as the pool's scheduler says"""
+        delay = self.scheduler.first_delay()
+        while self.running:
+            await asyncio.sleep(delay)
+            try:
+                await self.send_batch_heartbeats()
+                delay = self.scheduler.success()
+            except Exception as e:
+                logger.warning(f"Batch heartbeat failed, backing off: {e}")
+                delay = self.scheduler.failure()
+
+    async def start(self):
+        """Open the connection pool, start registering the agents and heartbeating"""
+        self.http = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_connections),
+            timeout=aiohttp.ClientTimeout(total=self.request_timeout)
+        )
+        agents = list(self.agents.values())
+        self.running = True
+        if self.gateway_key:
+            await self.register_gateway()
+            registered = await asyncio.gather(*(agent.register() for agent in agents))
+            failed = [agent.agent_id for agent, ok in zip(agents, registered) if not ok]
+            if failed:
+                logger.warning(f"{len(failed)} of {len(agents)} agents failed to register")
+            self._tasks = [asyncio.ensure_future(self._batch_heartbeat_loop())]
+        else:
+            spacing = 1 / self.register_rate if self.register_rate else 0.0
+            slot = self.heartbeat_interval / max(1, len(agents))
+            self._tasks = [
+                asyncio.ensure_future(self._heartbeat_loop(agent, i * spacing, i * slot + random.uniform(0, slot)))
+                for i, agent in enumerate(agents)
+            ]
+        logger.info(f"Started {len(agents)} agents over {self.max_connections} connections")
+
+    async def stop(self):
+        """Stop heartbeating and close the pool"""
+        self.running = False
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.http is not None:
+            await self.http.close()
+            self.http = None
+
+    def check_health(self) -> dict:
+        """Aggregate health of all agents"""
+        healthy = sum(1 for agent in self.agents.values() if agent.last_heartbeat_success)
+        return {'agents': len(self.agents), 'healthy': healthy, 'degraded': len(self.agents) - healthy}
+
+async def run_agents(agent_ids: List[str], mcp_url: str, max_connections: int = 100,
+                     gateway_key: Optional[str] = None, register_rate: Optional[float] = None):
+    """Run many MCP agents in this event loop until cancelled"""
+    pool = AsyncAgentPool(mcp_url, max_connections=max_connections, gateway_key=gateway_key,
+                          register_rate=register_rate)
+    for agent_id in agent_ids:
+        pool.add_agent(agent_id)
+    await pool.start()
+    try:
+        while True:
+            await asyncio.sleep(60)  # Check health every minute
+            health = pool.check_health()
+            if health['degraded']:
+                logger.warning(f"Agent health degraded: {health}")
+    finally:
+        await pool.stop()
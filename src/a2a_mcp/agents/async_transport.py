@@ -0,0 +1,262 @@
+import sys
+import json
+import socket
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Union
+from . import framing
+from .connections import Address, parse_address
+
+class AsyncTransport:
+    """A2A networking on a single asyncio event loop
+
+    Replaces the thread-per-connection listener and the blocking
+    PeerConnectionManager with one loop thread that accepts, reads and
+    writes for the whole agent:
+
+    - The listener has a real backlog, and at most max_inbound peer
+      connections are kept open; a new one past that closes the least
+      recently active, whose peer reconnects when it next sends.
+    - Each peer gets a writer task fed by a bounded queue. It writes queued
+      frames in batches and awaits drain(), so a slow peer fills its own
+      queue (frames beyond queue_size are dropped and counted) instead of
+      buffering without limit or blocking other peers.
+    - Writer connections are opened lazily, closed after idle_timeout
+      seconds without traffic or when max_connections are open, and a
+      connection the peer closed is re-opened once before the peer is
+      dropped.
+
+    It offers the PeerConnectionManager interface (send, send_frame, close,
+    close_all, prune_idle, stats), so A2AAgent's message handling is shared
+    between both transports. Sends are safe from any thread.
+    """
+
+    def __init__(self, agent, backlog: int = 1024, max_inbound: int = 1024, max_connections: int = 64,
+                 queue_size: int = 1000, idle_timeout: float = 60.0, connect_timeout: float = 1.0,
+                 codec: str = 'json'):
+        self.agent = agent
+        self.backlog = backlog
+        self.max_inbound = max_inbound
+        self.max_connections = max_connections
+        self.queue_size = queue_size
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self.codec = codec
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._queues: 'OrderedDict[Address, asyncio.Queue]' = OrderedDict()
+        self._writers: Dict[Address, asyncio.Task] = {}
+        self._readers: 'OrderedDict[asyncio.Task, asyncio.StreamWriter]' = OrderedDict()  # Least recently active first
+        self.opened = 0
+        self.dropped = 0
+
+    # --- Lifecycle ---
+
+    def start(self):
+        """Start the event loop thread and listen on the agent's address"""
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+        errors = []
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            try:
+                self.loop.run_until_complete(self._listen())
+            except Exception as e:
+                errors.append(e)
+                started.set()
+                return
+            started.set()
+            self.loop.run_forever()
+            self.loop.close()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        started.wait()
+        if errors:
+            raise errors[0]
+        print(f"A2A Agent {self.agent.agent_id} listening on {self.agent.host}:{self.agent.port} (asyncio)")
+
+    async def _listen(self):
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.agent.host, self.agent.port, backlog=self.backlog
+        )
+
+    def stop(self):
+        """Close the listener and every connection, then stop the loop"""
+        if self.loop is None or self.loop.is_closed():
+            return
+        future = asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop)
+        try:
+            future.result(timeout=5)
+        except Exception as e:
+            print(f"[{self.agent.agent_id}] Error stopping transport: {e}", file=sys.stderr)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=2)
+
+    async def _shutdown(self):
+        if self._server is not None:
+            self._server.close()
+        tasks = list(self._writers.values()) + list(self._readers)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._queues.clear()
+        self._writers.clear()
+
+    def _on_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def _call(self, callback, *args):
+        """Run callback on the loop, directly when already on the loop thread"""
+        if self._on_loop():
+            callback(*args)
+        elif self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    # --- Inbound ---
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Read messages from a peer connection until it closes"""
+        task = asyncio.current_task()
+        while len(self._readers) >= self.max_inbound:
+            oldest, _ = self._readers.popitem(last=False)
+            oldest.cancel()  # Only ever interrupted while waiting for data, never mid-message
+        self._readers[task] = writer
+        address = writer.get_extra_info('peername')
+        decoder = framing.FrameDecoder()
+        try:
+            data = await reader.read(65536)
+            if data.startswith(b'{'):
+                # Unframed JSON from an older agent: one message per connection
+                chunks, size = [data], len(data)
+                while data:
+                    data = await reader.read(65536)
+                    chunks.append(data)
+                    size += len(data)
+                    if size > framing.MAX_FRAME:
+                        raise framing.FrameError(f"unframed message exceeds {framing.MAX_FRAME} bytes")
+                self.agent.handle_message(json.loads(b''.join(chunks)))
+                return
+            while data:
+                self._readers.move_to_end(task)
+                for message in decoder.feed(data):
+                    try:
+                        self.agent.handle_message(message)
+                    except Exception as e:  # One bad message must not drop the connection
+                        print(f"[{self.agent.agent_id}] Error handling message from {address}: {e}", file=sys.stderr)
+                data = await reader.read(65536)
+        except asyncio.CancelledError:
+            pass  # Evicted or transport shutting down; the stream callback must not see the cancellation
+        except Exception as e:
+            print(f"Error handling connection from {address}: {e}")
+        finally:
+            self._readers.pop(task, None)
+            writer.close()
+
+    # --- Outbound ---
+
+    def send_frame(self, address: Address, frame: bytes):
+        """Queue one encoded frame for a peer"""
+        self._call(self._enqueue, address, frame)
+
+    def send(self, address: Union[str, tuple, list], message: dict):
+        """Frame and queue a message for a peer"""
+        self.send_frame(parse_address(address), framing.encode(message, self.codec))
+
+    def _enqueue(self, address: Address, frame: bytes):
+        queue = self._queues.get(address)
+        if queue is None:
+            queue = self._queues[address] = asyncio.Queue(self.queue_size)
+            self._writers[address] = self.loop.create_task(self._write_loop(address, queue))
+            self._evict_idle(keep=address)
+        else:
+            self._queues.move_to_end(address)
+        try:
+            queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self.dropped += 1  # The peer is not keeping up; shed load rather than buffer
+
+    def _evict_idle(self, keep: Address):
+        """Close least recently used writers with nothing queued beyond max_connections"""
+        excess = len(self._queues) - self.max_connections
+        for address, queue in list(self._queues.items()):
+            if excess <= 0:
+                break
+            if address != keep and queue.empty():
+                self._close_writer(address)
+                excess -= 1
+
+    def _close_writer(self, address: Address):
+        self._queues.pop(address, None)
+        task = self._writers.pop(address, None)
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+
+    async def _connect(self, address: Address) -> asyncio.StreamWriter:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(*address), self.connect_timeout)
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.opened += 1
+        return writer
+
+    async def _write_loop(self, address: Address, queue: asyncio.Queue):
+        """Write a peer's queued frames over one connection until idle or failed"""
+        writer = None
+        batch = []
+        try:
+            for attempt in range(2):
+                try:
+                    writer = await self._connect(address)
+                    while True:
+                        if not batch:
+                            batch.append(await asyncio.wait_for(queue.get(), self.idle_timeout))
+                            while not queue.empty() and len(batch) < 64:
+                                batch.append(queue.get_nowait())
+                        writer.write(b''.join(batch))
+                        await writer.drain()  # Back-pressure: wait while the socket buffer is full
+                        batch = []
+                except asyncio.TimeoutError:
+                    if writer is None:
+                        raise ConnectionError(f"timed out connecting to {address[0]}:{address[1]}")
+                    return  # Idle: close now, reconnect on the next send
+                except (OSError, ConnectionError):
+                    if writer is None or attempt:
+                        raise
+                    writer.close()
+                    writer = None  # The peer closed a connection we held; reconnect once
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.dropped += len(batch) + queue.qsize()
+            if self._writers.get(address) is asyncio.current_task():
+                self._close_writer(address)
+            # The peer stays in the view: the failure detector decides whether it is down
+        finally:
+            if writer is not None:
+                writer.close()
+            if self._writers.get(address) is asyncio.current_task():
+                self._close_writer(address)
+
+    def close(self, address: Union[str, tuple, list]):
+        """Close the connection to a peer, if any"""
+        self._call(self._close_writer, parse_address(address))
+
+    def close_all(self):
+        def close_writers():
+            for address in list(self._queues):
+                self._close_writer(address)
+        self._call(close_writers)
+
+    def prune_idle(self):
+        """Writers close themselves after idle_timeout; nothing to do here"""
+
+    def stats(self) -> Dict[str, int]:
+        return {'open': len(self._writers), 'opened': self.opened, 'dropped': self.dropped,
+                'reading': len(self._readers)}
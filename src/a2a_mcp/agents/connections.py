@@ -0,0 +1,155 @@
+import time
+import select
+import socket
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Tuple, Union
+from . import framing
+
+Address = Tuple[str, int]
+
+def parse_address(value: Union[str, tuple, list]) -> Address:
+    """Normalize "host:port", (host, port) or a JSON [host, port] to a tuple"""
+    if isinstance(value, str):
+        host, port = value.rsplit(':', 1)
+        return host, int(port)
+    host, port = value
+    return host, int(port)
+
+@dataclass
+class PeerConnection:
+    """An outbound connection; lock serializes writers so frames never interleave"""
+    __slots__ = ('sock', 'lock', 'last_used')
+    sock: socket.socket
+    lock: threading.Lock
+    last_used: float
+
+class PeerConnectionManager:
+    """Long-lived framed connections to peers, shared by every message type
+
+    A connection is opened the first time a peer is sent to and reused for
+    everything after that (PROBE, MEMBERSHIP, STATUS_UPDATE and flooded
+    broadcasts). Connections are kept in least-recently-used order; the
+    oldest idle ones are closed once more than max_connections are open or
+    after idle_timeout seconds without traffic, and reopened lazily on the
+    next send. A send on a connection the peer has closed is retried once on
+    a fresh connection; errors that remain are raised as OSError. send()
+    encodes bodies with `codec` (see framing.CODECS).
+    """
+
+    def __init__(self, max_connections: int = 64, idle_timeout: float = 60.0,
+                 connect_timeout: float = 1.0, send_timeout: float = 5.0, codec: str = 'json'):
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self.send_timeout = send_timeout
+        self.codec = codec
+        self._lock = threading.Lock()
+        self._connections: 'OrderedDict[Address, PeerConnection]' = OrderedDict()
+        self.opened = 0
+
+    def _connect(self, address: Address) -> PeerConnection:
+        sock = socket.create_connection(address, timeout=self.connect_timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.settimeout(self.send_timeout)
+        return PeerConnection(sock, threading.Lock(), time.monotonic())
+
+    @staticmethod
+    def _closed_by_peer(sock: socket.socket) -> bool:
+        """Peers never write to our outbound connections, so readable means EOF or reset"""
+        if hasattr(select, 'poll'):
+            # select() cannot watch descriptors >= FD_SETSIZE (1024) on POSIX
+            poller = select.poll()
+            poller.register(sock, select.POLLIN)
+            readable = poller.poll(0)
+        else:  # Windows: no poll, but its select() has no descriptor number limit
+            readable, _, _ = select.select([sock], [], [], 0)
+        if not readable:
+            return False
+        try:
+            return not sock.recv(1, socket.MSG_PEEK)
+        except OSError:
+            return True
+
+    def _evict_idle(self, now: float):
+        """Close idle connections beyond the cap or the idle timeout; callers hold the lock"""
+        for address, connection in list(self._connections.items()):
+            over_cap = len(self._connections) > self.max_connections
+            if not over_cap and now - connection.last_used < self.idle_timeout:
+                break  # LRU order: everything after this is more recent
+            if connection.lock.locked():
+                continue  # Mid-send; it will be reconsidered next time
+            del self._connections[address]
+            connection.sock.close()
+
+    def _acquire(self, address: Address) -> Tuple[PeerConnection, bool]:
+        """Return a connection to address and whether it was reused"""
+        with self._lock:
+            connection = self._connections.get(address)
+            if connection is not None:
+                self._connections.move_to_end(address)
+        if connection is not None:
+            if not self._closed_by_peer(connection.sock):
+                return connection, True
+            self._discard(address, connection)
+
+        connection = self._connect(address)  # Outside the lock: connecting may block
+        with self._lock:
+            existing = self._connections.get(address)
+            if existing is not None:
+                connection.sock.close()  # Another thread connected first
+                return existing, True
+            self._connections[address] = connection
+            self.opened += 1
+            self._evict_idle(time.monotonic())
+        return connection, False
+
+    def _discard(self, address: Address, connection: PeerConnection):
+        with self._lock:
+            if self._connections.get(address) is connection:
+                del self._connections[address]
+        connection.sock.close()
+
+    def send_frame(self, address: Address, frame: bytes):
+        """Write one encoded frame to a peer, reconnecting if needed"""
+        for attempt in range(2):
+            connection, reused = self._acquire(address)
+            try:
+                with connection.lock:
+                    connection.sock.sendall(frame)
+                    connection.last_used = time.monotonic()
+                return
+            except OSError:
+                self._discard(address, connection)
+                if attempt or not reused:
+                    raise
+                # A stale pooled connection; retry once on a fresh one
+
+    def send(self, address: Union[str, tuple, list], message: dict):
+        """Frame and send a message to a peer"""
+        self.send_frame(parse_address(address), framing.encode(message, self.codec))
+
+    def prune_idle(self):
+        """Close connections idle for longer than idle_timeout"""
+        with self._lock:
+            self._evict_idle(time.monotonic())
+
+    def close(self, address: Union[str, tuple, list]):
+        """Close the connection to a peer, if any"""
+        address = parse_address(address)
+        with self._lock:
+            connection = self._connections.pop(address, None)
+        if connection is not None:
+            connection.sock.close()
+
+    def close_all(self):
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        for connection in connections:
+            connection.sock.close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'open': len(self._connections), 'opened': self.opened}
@@ -0,0 +1,107 @@
+import os
+import time
+import hashlib
+import itertools
+import threading
+from typing import Callable, List, Union
+from ..bloom import BloomFilter
+
+ID_SIZE = 16
+
+class MessageIds:
+    """Compact fixed-size message IDs for one agent
+
+    An ID is 16 bytes: 4 bytes of the agent ID's hash, 4 random bytes drawn
+    once per process (so a restarted agent does not reuse IDs) and an 8-byte
+    sequence number. On the JSON wire they travel as 32 hex characters.
+    """
+
+    def __init__(self, agent_id: str):
+        self._prefix = hashlib.blake2b(agent_id.encode(), digest_size=4).digest() + os.urandom(4)
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def next(self) -> bytes:
+        with self._lock:
+            sequence = next(self._sequence)
+        return self._prefix + sequence.to_bytes(8, 'big')
+
+def id_bytes(message_id: Union[str, bytes]) -> bytes:
+    """Binary form of an ID; string IDs from older agents are hashed to 16 bytes"""
+    if isinstance(message_id, bytes):
+        return message_id
+    if len(message_id) == 2 * ID_SIZE:
+        try:
+            return bytes.fromhex(message_id)
+        except ValueError:
+            pass
+    return hashlib.blake2b(message_id.encode(), digest_size=ID_SIZE).digest()
+
+class MessageFilter:
+    """Bounded, expiring "seen message" filter for flood deduplication
+
+    Two Bloom filter generations are kept. New IDs go into the current one;
+    when it has held `capacity` IDs or is ttl / 2 seconds old it becomes the
+    previous generation and the old previous one is discarded. An ID is
+    therefore remembered for at least min(ttl / 2, time to see `capacity`
+    further messages) and forgotten after at most ttl, and memory is fixed at
+    two filters regardless of traffic.
+
+    False positives (a new message wrongly treated as a duplicate and not
+    delivered) happen with probability at most about 2 * error_rate, since a
+    lookup consults both generations, each sized for error_rate at
+    `capacity` entries. The defaults (100,000 IDs, 0.1%) use about 360 KiB
+    and give at most about 0.2%. There are no false negatives within the
+    retention window, so a message is never delivered twice while its ID is
+    remembered.
+    """
+
+    def __init__(self, capacity: int = 100_000, error_rate: float = 0.001, ttl: float = 300.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.ttl = ttl
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._current = BloomFilter(capacity, error_rate)
+        self._previous = BloomFilter(capacity, error_rate)
+        self._rotated = clock()
+        self.rotations = 0
+
+    def _rotate_if_due(self):
+        now = self.clock()
+        if self._current.count >= self.capacity or now - self._rotated >= self.ttl / 2:
+            self._previous = self._current
+            self._current = BloomFilter(self.capacity, self.error_rate)
+            self._rotated = now
+            self.rotations += 1
+
+    def _indexes(self, message_id: Union[str, bytes]) -> List[int]:
+        # IDs share a per-agent prefix and count up, so hash them into uniform
+        # filter keys; both generations have the same size and share indexes
+        key = hashlib.blake2b(id_bytes(message_id), digest_size=16).digest()
+        return self._current.indexes(key)
+
+    def check_and_add(self, message_id: Union[str, bytes]) -> bool:
+        """Record an ID, returning True if it had not been seen before"""
+        indexes = self._indexes(message_id)
+        with self._lock:
+            self._rotate_if_due()
+            if self._current.contains_indexes(indexes):
+                return False
+            seen = self._previous.contains_indexes(indexes)
+            self._current.add_indexes(indexes)  # Refresh so it survives the next rotation
+            return not seen
+
+    def __contains__(self, message_id: Union[str, bytes]) -> bool:
+        indexes = self._indexes(message_id)
+        with self._lock:
+            return self._current.contains_indexes(indexes) or self._previous.contains_indexes(indexes)
+
+    def add(self, message_id: Union[str, bytes]):
+        self.check_and_add(message_id)
+
+    @property
+    def memory_bytes(self) -> int:
+        """Bytes held by the two filters' bit arrays"""
+        return self._current.memory_bytes + self._previous.memory_bytes
@@ -0,0 +1,94 @@
+import time
+import random
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterable, List, Optional, Sequence
+
+class Flood:
+    """Forward every broadcast to every peer except the one it came from"""
+
+    pull = False
+
+    def __init__(self, max_hops: Optional[int] = None):
+        self.max_hops = max_hops
+
+    def select(self, peers: Sequence, exclude: Iterable = ()) -> List:
+        excluded = set(exclude)
+        return [peer for peer in peers if peer not in excluded]
+
+class Gossip(Flood):
+    """Push-pull epidemic gossip
+
+    Push: a broadcast is forwarded to `fanout` random peers (not the one it
+    came from) and carries a hop counter, so it stops after max_hops relays.
+    With fanout f, each node that receives a message relays it about f times
+    instead of once per peer, so traffic is O(N * f) per broadcast rather
+    than O(N * degree). Push alone reaches all but roughly e^-f of the nodes.
+
+    Pull: every speaker round a node sends one peer an IHAVE digest of the
+    IDs it recently delivered; the peer answers IWANT for the ones it has
+    not seen and gets them sent directly. This repairs the nodes push
+    missed, which lets fanout stay small.
+    """
+
+    pull = True
+
+    def __init__(self, fanout: int = 3, max_hops: Optional[int] = 8, rng: Optional[random.Random] = None):
+        super().__init__(max_hops)
+        self.fanout = fanout
+        self.random = rng or random.Random()
+
+    def select(self, peers: Sequence, exclude: Iterable = ()) -> List:
+        candidates = super().select(peers, exclude)
+        if len(candidates) <= self.fanout:
+            return candidates
+        return self.random.sample(candidates, self.fanout)
+
+def create_strategy(name: str, fanout: int = 3, max_hops: Optional[int] = None):
+    """Build a strategy by name; only gossip limits hops unless max_hops is given"""
+    if name == 'flood':
+        return Flood(max_hops)
+    if name == 'gossip':
+        return Gossip(fanout, 8 if max_hops is None else max_hops)
+    raise ValueError(f"Unknown dissemination strategy: {name}")
+
+class RecentMessages:
+    """Broadcasts delivered recently, kept to answer IWANT requests"""
+
+    def __init__(self, capacity: int = 1000, ttl: float = 60.0, clock: Callable[[], float] = time.monotonic):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._messages: 'OrderedDict[str, tuple]' = OrderedDict()
+
+    def _expire(self, now: float):
+        while self._messages:
+            _, (added, _) = next(iter(self._messages.items()))
+            if len(self._messages) <= self.capacity and now - added < self.ttl:
+                break
+            self._messages.popitem(last=False)
+
+    def add(self, message_id: str, message: dict):
+        now = self.clock()
+        with self._lock:
+            self._messages[message_id] = (now, message)
+            self._expire(now)
+
+    def digest(self, limit: int = 256) -> List[str]:
+        """IDs of the `limit` most recent messages, newest first"""
+        with self._lock:
+            self._expire(self.clock())
+            ids = []
+            for message_id in reversed(self._messages):
+                if len(ids) >= limit:
+                    break
+                ids.append(message_id)
+            return ids
+
+    def get(self, message_ids: Iterable[str]) -> List[dict]:
+        with self._lock:
+            return [self._messages[i][1] for i in message_ids if i in self._messages]
+
+    def __len__(self) -> int:
+        return len(self._messages)
@@ -0,0 +1,169 @@
+import math
+import time
+import random
+import itertools
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .membership import DEAD, SUSPECT, Address
+
+class FailureDetector:
+    """SWIM failure detector for an A2AAgent's membership
+
+    Every protocol_period one member is probed, in a shuffled round-robin
+    order so each is probed at least once per pass over the view. A PROBE
+    that is not acknowledged within probe_timeout is retried indirectly:
+    indirect_probes other members are sent a PROBE_REQ, probe the target
+    themselves and relay its ack. With no ack by the end of the period the
+    target becomes suspect rather than dead, and only if it has not refuted
+    the suspicion (by gossiping a higher incarnation) after
+
+        suspicion_mult * max(1, log10(members)) * protocol_period
+
+    seconds is it declared dead. Suspicion, death and refutation spread as
+    piggybacked membership updates on every message the agent sends.
+
+    The expected time to first detect a crashed member is about
+    protocol_period * e / (e - 1) plus the suspicion timeout; a higher
+    suspicion_mult or more indirect probes lower the false-positive rate
+    under packet loss at the cost of slower detection.
+    """
+
+    def __init__(self, agent, protocol_period: float = 1.0, probe_timeout: float = 0.5,
+                 indirect_probes: int = 3, suspicion_mult: int = 4, rng: Optional[random.Random] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.agent = agent
+        self.protocol_period = protocol_period
+        self.probe_timeout = probe_timeout
+        self.indirect_probes = indirect_probes
+        self.suspicion_mult = suspicion_mult
+        self.random = rng or random.Random()
+        self.clock = clock
+        self._sequence = itertools.count(1)
+        self._lock = threading.Lock()
+        self._acks: Dict[int, threading.Event] = {}  # Probes we are waiting on
+        self._relays: Dict[int, Tuple[Address, int, float]] = {}  # Our probe -> (requester, its seq, sent)
+        self._suspected: Dict[Address, Tuple[int, float]] = {}  # Suspect -> (incarnation, since)
+        self._order: List[Address] = []
+        self._thread = None
+        self.probes = 0
+        self.indirect = 0
+
+    @property
+    def suspicion_timeout(self) -> float:
+        members = max(1, len(self.agent.membership))
+        return self.suspicion_mult * max(1.0, math.log10(members)) * self.protocol_period
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def run(self):
+        stop_event = self.agent.stop_event
+        while not stop_event.is_set():
+            started = self.clock()
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"[{self.agent.agent_id}] Failure detector error: {e}")
+            stop_event.wait(max(0.0, self.protocol_period - (self.clock() - started)))
+
+    def tick(self):
+        """One protocol period: expire suspicions, then probe the next member"""
+        self.expire_suspicions()
+        self.agent.membership.expire_dead()
+        target = self._next_target()
+        if target is not None:
+            self.probe(target)
+
+    def _next_target(self) -> Optional[Address]:
+        membership = self.agent.membership
+        while True:
+            if not self._order:
+                self._order = membership.live()
+                if not self._order:
+                    return None
+                self.random.shuffle(self._order)
+            target = self._order.pop()
+            state = membership.status(target)
+            if state is not None and state[1] != DEAD:
+                return target
+
+    def _expect_ack(self) -> Tuple[int, threading.Event]:
+        seq = next(self._sequence)
+        event = threading.Event()
+        with self._lock:
+            self._acks[seq] = event
+        return seq, event
+
+    def probe(self, target: Address) -> bool:
+        """Probe a member directly, then through others; suspect it if nobody hears back"""
+        started = self.clock()
+        seq, event = self._expect_ack()
+        self.probes += 1
+        try:
+            self.agent._send_message(target, 'PROBE', {'seq': seq})
+            if event.wait(self.probe_timeout):
+                return True
+            others = [m for m in self.agent.membership.live() if m != target]
+            for helper in self.random.sample(others, min(self.indirect_probes, len(others))):
+                self.indirect += 1
+                self.agent._send_message(helper, 'PROBE_REQ', {'seq': seq, 'target': list(target)})
+            remaining = self.protocol_period - (self.clock() - started)
+            if event.wait(max(0.0, remaining)):
+                return True
+        finally:
+            with self._lock:
+                self._acks.pop(seq, None)
+        self.suspect(target)
+        return False
+
+    def suspect(self, target: Address):
+        state = self.agent.membership.status(target)
+        if state is not None and state[1] != DEAD and self.agent.membership.set_status(target, SUSPECT):
+            self.agent.member_changed(target, SUSPECT)
+
+    def handle_probe(self, message: dict):
+        """Acknowledge a direct probe"""
+        sender = message.get('sender_address')
+        if sender:
+            self.agent._send_message(sender, 'PROBE_ACK', {'seq': message.get('payload', {}).get('seq')})
+
+    def handle_probe_req(self, message: dict):
+        """Probe a member on behalf of another and relay the ack"""
+        payload = message.get('payload', {})
+        sender = message.get('sender_address')
+        if not sender or not payload.get('target'):
+            return
+        seq = next(self._sequence)
+        now = self.clock()
+        with self._lock:
+            self._relays = {s: r for s, r in self._relays.items() if now - r[2] < self.protocol_period}
+            self._relays[seq] = (tuple(sender), payload.get('seq'), now)
+        self.agent._send_message(payload['target'], 'PROBE', {'seq': seq})
+
+    def handle_ack(self, message: dict):
+        seq = message.get('payload', {}).get('seq')
+        with self._lock:
+            event = self._acks.get(seq)
+            relay = self._relays.pop(seq, None)
+        if event is not None:
+            event.set()
+        elif relay is not None:
+            self.agent._send_message(relay[0], 'PROBE_ACK', {'seq': relay[1]})
+
+    def expire_suspicions(self):
+        """Declare dead every suspect whose suspicion outlived the timeout unrefuted"""
+        now = self.clock()
+        timeout = self.suspicion_timeout
+        current = dict(self.agent.membership.suspects())
+        for address in list(self._suspected):
+            if current.get(address) != self._suspected[address][0]:
+                del self._suspected[address]  # Refuted, or already declared dead
+        for address, incarnation in current.items():
+            if address not in self._suspected:
+                self._suspected[address] = (incarnation, now)
+            elif now - self._suspected[address][1] >= timeout:
+                del self._suspected[address]
+                if self.agent.membership.set_status(address, DEAD, incarnation):
+                    self.agent.member_changed(address, DEAD)
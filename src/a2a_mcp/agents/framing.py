@@ -0,0 +1,96 @@
+import json
+import struct
+from typing import List
+
+# Body length (big-endian), version, codec; the body follows
+HEADER = struct.Struct('>IBB')
+VERSION = 1
+CODEC_JSON = 0
+CODEC_MSGPACK = 1
+CODECS = {'json': CODEC_JSON, 'msgpack': CODEC_MSGPACK}
+MAX_FRAME = 16 * 1024 * 1024
+# json.dumps builds a new encoder per call when given any option
+_json_encoder = json.JSONEncoder(separators=(',', ':'))
+
+try:
+    import msgpack
+except ImportError:  # Optional: JSON frames work without it; every agent needs it before any sends msgpack
+    msgpack = None
+
+class FrameError(Exception):
+    """A peer sent a frame that cannot be decoded"""
+
+def _dumps(message: dict, codec: int) -> bytes:
+    if codec == CODEC_JSON:
+        return _json_encoder.encode(message).encode('utf-8')
+    if msgpack is None:
+        raise FrameError('the msgpack codec requires msgpack: pip install "a2a_mcp[msgpack]"')
+    return msgpack.packb(message, use_bin_type=True)
+
+def _loads(body, codec: int) -> dict:
+    if codec == CODEC_JSON:
+        return json.loads(body)
+    if codec == CODEC_MSGPACK:
+        if msgpack is None:
+            raise FrameError('received a msgpack frame but msgpack is not installed')
+        return msgpack.unpackb(body, raw=False)
+    raise FrameError(f"unknown codec {codec}")
+
+def encode(message: dict, codec: str = 'json') -> bytes:
+    """Serialize a message into one frame"""
+    codec_id = CODECS[codec]
+    body = _dumps(message, codec_id)
+    if len(body) > MAX_FRAME:
+        raise FrameError(f"message of {len(body)} bytes exceeds {MAX_FRAME}")
+    return HEADER.pack(len(body), VERSION, codec_id) + body
+
+def decode(frame: bytes) -> dict:
+    """Decode exactly one complete frame"""
+    messages = FrameDecoder().feed(frame)
+    if len(messages) != 1:
+        raise FrameError(f"expected one frame, found {len(messages)}")
+    return messages[0]
+
+class FrameDecoder:
+    """Incremental decoder for a stream of frames
+
+    feed() takes whatever bytes arrived and returns every message they
+    complete; a partial frame, including a partial header, stays buffered
+    until the rest arrives.
+    """
+
+    def __init__(self, max_frame: int = MAX_FRAME):
+        self.max_frame = max_frame
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> List[dict]:
+        if self._buffer:
+            self._buffer += data
+            buffer = self._buffer
+        else:
+            buffer = data  # Common case: parse straight from the received bytes, no copy into the buffer
+        messages = []
+        offset = 0
+        size = len(buffer)
+        while size - offset >= HEADER.size:
+            length, version, codec = HEADER.unpack_from(buffer, offset)
+            if length > self.max_frame:
+                raise FrameError(f"frame of {length} bytes exceeds {self.max_frame}")
+            if version != VERSION:
+                raise FrameError(f"unsupported frame version {version}")
+            start = offset + HEADER.size
+            end = start + length
+            if size < end:
+                break
+            messages.append(_loads(buffer[start:end], codec))
+            offset = end
+        if buffer is self._buffer:
+            del buffer[:offset]
+        elif offset < size:
+            self._buffer += buffer[offset:]
+        return messages
+
+    @property
+    def pending(self) -> int:
+        """Bytes of an incomplete frame still buffered"""
+        return len(self._buffer)
@@ -0,0 +1,56 @@
+import random
+from typing import Mapping, Optional
+
+class HeartbeatScheduler:
+    """Decides how long an agent waits before its next heartbeat
+
+    - The first heartbeat is delayed by a random phase in [0, interval), so
+      agents started (or restarted) together do not beat in lockstep.
+    - After a success the wait is the server-advised interval (from the
+      X-Heartbeat-Interval header, bounded to [min_interval, max_interval])
+      with +/- jitter, so phases keep drifting apart instead of re-aligning.
+    - After a failure the wait follows decorrelated jitter backoff:
+      min(max_backoff, uniform(base_backoff, 3 * previous wait)), which
+      spreads retries of agents that failed at the same moment.
+
+    The scheduler holds no clock; callers sleep for the returned delays.
+    """
+
+    def __init__(self, interval: float = 30.0, min_interval: float = 5.0, max_interval: float = 45.0,
+                 jitter: float = 0.1, base_backoff: float = 1.0, max_backoff: float = 30.0,
+                 rng: Optional[random.Random] = None):
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.random = rng or random.Random()
+        self.server_load: Optional[float] = None
+        self._backoff = 0.0
+
+    def first_delay(self) -> float:
+        """Random phase before the first heartbeat"""
+        return self.random.uniform(0, self.interval)
+
+    def advise(self, headers: Mapping[str, str]):
+        """Adopt the interval and load a server advertised in its response headers"""
+        try:
+            if 'X-Heartbeat-Interval' in headers:
+                advised = float(headers['X-Heartbeat-Interval'])
+                self.interval = min(self.max_interval, max(self.min_interval, advised))
+            if 'X-Server-Load' in headers:
+                self.server_load = float(headers['X-Server-Load'])
+        except ValueError:
+            pass  # Ignore malformed advice and keep the current interval
+
+    def success(self) -> float:
+        """Delay after a successful heartbeat"""
+        self._backoff = 0.0
+        return self.interval * self.random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def failure(self) -> float:
+        """Delay after a failed heartbeat (decorrelated jitter)"""
+        previous = self._backoff or self.base_backoff
+        self._backoff = min(self.max_backoff, self.random.uniform(self.base_backoff, previous * 3))
+        return self._backoff
@@ -1,10 +1,15 @@
 import requests
 import time
+import json
+import random
+import hashlib
+import asyncio
 import threading
 import logging
 from datetime import datetime
-from typing import Optional
+from typing import Any, Callable, Dict, List, Optional
 from tenacity import retry, stop_after_attempt, wait_exponential
+from .heartbeat import HeartbeatScheduler
 
 # Setup logging
 logging.basicConfig(
@@ -13,8 +18,142 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Session close codes sent by the MCP server
+CLOSE_UNKNOWN_AGENT = 4404
+CLOSE_REPLACED = 4409
+
+class AgentSession:
+    """Persistent WebSocket session between an MCPAgent and the MCP server
+
+    Runs its own asyncio loop in a background thread. While connected, the
+    server treats the open socket (kept alive with WebSocket ping/pong) as
+    the agent's heartbeat and can push commands over it; the agent's HTTP
+    heartbeat loop stands by and takes over whenever the session is down.
+    Servers without session support (the Flask/WSGI mode) answer the
+    upgrade with 404; the session then gives up for good and leaves the
+    agent on HTTP heartbeats.
+    """
+
+    def __init__(self, agent: 'MCPAgent', min_backoff: float = 1.0, max_backoff: float = 60.0):
+        self.agent = agent
+        self.url = agent.mcp_url.replace('http', 'ws', 1) + f"/session/{agent.agent_id}"
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.connected = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopped: Optional[asyncio.Event] = None
+        self._ws = None
+        self._thread: Optional[threading.Thread] = None
+
+    async def _wait(self, seconds: float) -> bool:
+        """Sleep unless stopped first; returns whether the session should keep going"""
+        try:
+            await asyncio.wait_for(self._stopped.wait(), seconds)
+            return False
+        except asyncio.TimeoutError:
+            return True
+
+    async def _handle(self, frame: Dict[str, Any]):
+        if frame.get('type') != 'command':
+            return
+        handler = self.agent.command_handlers.get(frame.get('command'))
+        if handler is None:
+            logger.warning(f"No handler for server command: {frame.get('command')}")
+            return
+        try:
+            # Handlers are plain callables and may block, so keep them off the loop
+            await self._loop.run_in_executor(None, handler, frame.get('params') or {})
+        except Exception as e:
+            logger.error(f"Command {frame.get('command')} failed: {e}")
+
+    async def _connect(self, http) -> Optional[int]:
+        """Hold one session open, returning its close code"""
+        import aiohttp
+        async with http.ws_connect(self.url, headers=self.agent._get_headers(), autoping=True) as ws:
+            self._ws = ws
+            self.connected = True
+            self.agent.last_heartbeat_success = True
+            logger.info(f"Session established with MCP for {self.agent.agent_id}")
+            await ws.send_json({'type': 'status', 'status': self.agent.get_status()})
+            async for msg in ws:
+                if msg.type == aiohttp.WSMsgType.TEXT:
+                    try:
+                        frame = json.loads(msg.data)
+                    except ValueError:
+                        continue
+                    if isinstance(frame, dict):
+                        asyncio.ensure_future(self._handle(frame))
+                elif msg.type == aiohttp.WSMsgType.ERROR:
+                    break
+            return ws.close_code
+
+    async def _run(self):
+        import aiohttp
+        self._stopped = asyncio.Event()
+        backoff = self.min_backoff
+        async with aiohttp.ClientSession() as http:
+            while not self._stopped.is_set():
+                reregister = False
+                try:
+                    close_code = await self._connect(http)
+                    backoff = self.min_backoff
+                    reregister = close_code == CLOSE_UNKNOWN_AGENT
+                    if close_code == CLOSE_REPLACED:
+                        logger.warning("Session replaced by another connection with our agent id")
+                except aiohttp.WSServerHandshakeError as e:
+                    if e.status == 404:  # Server has no session endpoint; HTTP heartbeats carry on
+                        logger.info("MCP server does not support sessions; using HTTP heartbeats only")
+                        break
+                    reregister = e.status == 401
+                except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                    logger.debug(f"Session connection failed: {e}")
+                finally:
+                    self._ws = None
+                    self.connected = False
+
+                if reregister and not self._stopped.is_set():
+                    logger.info("Session rejected, registering again")
+                    await self._loop.run_in_executor(None, self.agent.register)
+                # Full jitter so a restarted server is not hit by every agent at once
+                if not await self._wait(random.uniform(0, backoff)):
+                    break
+                backoff = min(self.max_backoff, backoff * 2)
+
+    def start(self):
+        """Start the session thread"""
+        def run():
+            self._loop = asyncio.new_event_loop()
+            try:
+                self._loop.run_until_complete(self._run())
+            finally:
+                self._loop.close()
+
+        try:
+            import aiohttp  # noqa: F401
+        except ImportError:
+            logger.info("aiohttp not installed; using HTTP heartbeats only")
+            return
+        self._thread = threading.Thread(target=run, name=f"session-{self.agent.agent_id}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Close the session and wait for the thread to finish"""
+        if self._thread is None:
+            return
+        loop = self._loop
+        if loop is not None and self._stopped is not None:
+            def shutdown():
+                self._stopped.set()
+                if self._ws is not None:
+                    asyncio.ensure_future(self._ws.close())
+            try:
+                loop.call_soon_threadsafe(shutdown)
+            except RuntimeError:  # Loop already closed
+                pass
+        self._thread.join(timeout=2)
+
 class MCPAgent:
-    def __init__(self, agent_id: str, mcp_url: str):
+    def __init__(self, agent_id: str, mcp_url: str, use_session: bool = True):
         self.agent_id = agent_id
         self.mcp_url = mcp_url.rstrip('/')
         self.running = False
@@ -23,6 +162,13 @@ class MCPAgent:
         self.last_heartbeat_success = False
         self.start_time = time.time()
         self.session = requests.Session()
+        self.scheduler = HeartbeatScheduler()
+        self._stopped = threading.Event()
+        self.command_handlers: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
+        self.task_handler: Optional[Callable[[Any], Any]] = None
+        self.task_thread = None
+        self.task_batch_size = 10
+        self.agent_session = AgentSession(self) if use_session else None
         
         # Retry configuration
         self.max_retries = 3
@@ -38,8 +184,9 @@ class MCPAgent:
     def register(self) -> bool:
         """Register with the MCP server"""
         try:
-            # Generate a simple API key (in production, use proper key management)
-            api_key = f"agent-{self.agent_id}-{time.time()}"
+            # Generate a simple API key (in production, use proper key management);
+            # the server expects a 64 character hex digest
+            api_key = hashlib.sha256(f"agent-{self.agent_id}-{time.time()}".encode()).hexdigest()
             
             response = self.session.post(
                 f"{self.mcp_url}/register",
@@ -65,23 +212,109 @@ class MCPAgent:
             logger.error(f"Failed to register with MCP: {e}")
             return False
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-    def send_heartbeat(self) -> bool:
-        """Send heartbeat to MCP server with retry"""
+    def heartbeat_once(self) -> bool:
+        """Send one heartbeat and adopt the interval the server advises"""
         try:
             response = self.session.post(
                 f"{self.mcp_url}/heartbeat/{self.agent_id}",
                 json={'status': self.get_status()},
                 headers=self._get_headers()
             )
+            self.scheduler.advise(response.headers)
+            if response.status_code == 404:
+                # Evicted or the server lost its registry: get a fresh identity
+                self.access_token = None
             response.raise_for_status()
             self.last_heartbeat_success = True
             return True
-            
+
         except requests.exceptions.RequestException as e:
             self.last_heartbeat_success = False
             logger.error(f"Failed to send heartbeat: {e}")
-            raise  # Allow retry mechanism to handle it
+            if self.access_token is None:
+                self.register()
+            raise
+
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
+    def send_heartbeat(self) -> bool:
+        """Send heartbeat to MCP server with retry"""
+        return self.heartbeat_once()  # Failures propagate to the retry mechanism
+
+    def on_command(self, command: str, handler: Callable[[Dict[str, Any]], Any]):
+        """Run handler(params) when the server pushes command over the session"""
+        self.command_handlers[command] = handler
+
+    def on_task(self, handler: Callable[[Any], Any], batch_size: int = 10):
+        """Process tasks dispatched by the MCP with handler(payload)
+
+        Must be set before start(). A task is acknowledged once the handler
+        returns; if it raises, the task is left to be redelivered when its
+        visibility timeout runs out.
+        """
+        self.task_handler = handler
+        self.task_batch_size = batch_size
+
+    def pull_tasks(self, max_tasks: int = 10, visibility_timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Lease up to max_tasks tasks queued for this agent"""
+        body: Dict[str, Any] = {'max_tasks': max_tasks}
+        if visibility_timeout is not None:
+            body['visibility_timeout'] = visibility_timeout
+        response = self.session.post(
+            f"{self.mcp_url}/tasks/{self.agent_id}/pull",
+            json=body,
+            headers=self._get_headers()
+        )
+        response.raise_for_status()
+        return response.json()['tasks']
+
+    def ack_tasks(self, task_ids: List[str]) -> int:
+        """Acknowledge completed tasks, returning how many were still leased to us"""
+        response = self.session.post(
+            f"{self.mcp_url}/tasks/{self.agent_id}/ack",
+            json={'task_ids': task_ids},
+            headers=self._get_headers()
+        )
+        response.raise_for_status()
+        return response.json()['acked']
+
+    def task_loop(self):
+        """Pull, run and acknowledge tasks while running"""
+        idle_delay = 0.5
+        dispatch_off = False
+        while self.running:
+            try:
+                tasks = self.pull_tasks(self.task_batch_size)
+                dispatch_off = False
+                done = []
+                for task in tasks:
+                    try:
+                        self.task_handler(task['payload'])
+                        done.append(task['task_id'])
+                    except Exception as e:
+                        logger.error(f"Task {task['task_id']} failed: {e}")
+                if done:
+                    self.ack_tasks(done)
+                # Poll quickly while there is work, back off while idle
+                idle_delay = 0.5 if tasks else min(idle_delay * 2, 5.0)
+                if not tasks:
+                    time.sleep(idle_delay)
+            except requests.HTTPError as e:
+                if e.response is None or e.response.status_code != 503:
+                    logger.error(f"Error in task loop: {e}")
+                    time.sleep(5)
+                    continue
+                # Dispatch is off on this server; not an agent fault, so check back rarely and quietly
+                if not dispatch_off:
+                    logger.info("MCP server has task dispatch turned off; checking again every minute")
+                    dispatch_off = True
+                self._stopped.wait(60)
+            except Exception as e:
+                logger.error(f"Error in task loop: {e}")
+                time.sleep(5)
+
+    def session_connected(self) -> bool:
+        """Whether liveness is currently carried by the session instead of HTTP heartbeats"""
+        return self.agent_session is not None and self.agent_session.connected
 
     def get_status(self) -> str:
         """Get current agent status"""
@@ -93,26 +326,41 @@ class MCPAgent:
             'status': self.get_status(),
             'uptime': time.time() - self.start_time,
             'last_heartbeat_success': self.last_heartbeat_success,
-            'connected_to_mcp': bool(self.access_token)
+            'connected_to_mcp': bool(self.access_token),
+            'session_connected': self.session_connected()
         }
 
     def heartbeat_loop(self):
-        """Continuously send heartbeats while running"""
-        while self.running:
+        """Send heartbeats while running, paced by the heartbeat scheduler
+
+        Failures are not retried in place: the scheduler's backoff decides
+        when the next attempt goes out.
+        """
+        delay = self.scheduler.first_delay()
+        while not self._stopped.wait(delay):
+            if self.session_connected():  # The open session is the heartbeat
+                delay = self.scheduler.success()
+                continue
             try:
-                self.send_heartbeat()
-                time.sleep(30)  # Send heartbeat every 30 seconds
+                self.heartbeat_once()
+                delay = self.scheduler.success()
             except Exception as e:
-                logger.error(f"Error in heartbeat loop: {e}")
-                time.sleep(5)  # Wait before retry on error
+                logger.debug(f"Heartbeat failed, backing off: {e}")
+                delay = self.scheduler.failure()
 
     def start(self):
         """Start the agent"""
         if self.register():
             self.running = True
+            self._stopped.clear()
             self.heartbeat_thread = threading.Thread(target=self.heartbeat_loop)
             self.heartbeat_thread.daemon = True
             self.heartbeat_thread.start()
+            if self.agent_session:
+                self.agent_session.start()
+            if self.task_handler:
+                self.task_thread = threading.Thread(target=self.task_loop, daemon=True)
+                self.task_thread.start()
             logger.info(f"MCP Agent {self.agent_id} started")
         else:
             raise RuntimeError("Failed to start agent - registration failed")
@@ -120,13 +368,18 @@ class MCPAgent:
     def stop(self):
         """Stop the agent"""
         self.running = False
+        self._stopped.set()
+        if self.agent_session:
+            self.agent_session.stop()
         if self.heartbeat_thread:
             self.heartbeat_thread.join(timeout=2)
+        if self.task_thread:
+            self.task_thread.join(timeout=2)
         logger.info(f"MCP Agent {self.agent_id} stopped")
 
-def run_agent(agent_id: str, mcp_url: str):
+def run_agent(agent_id: str, mcp_url: str, use_session: bool = True):
     """Run an MCP agent"""
-    agent = MCPAgent(agent_id, mcp_url)
+    agent = MCPAgent(agent_id, mcp_url, use_session)
     try:
         agent.start()
         # Keep main thread alive and monitor health
@@ -0,0 +1,270 @@
+import math
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+Address = Tuple[str, int]
+
+# Member states. For one incarnation a later state overrides an earlier one,
+# and any state at a higher incarnation overrides every lower incarnation,
+# so (incarnation, status) compared as a tuple decides which entry wins
+ALIVE = 0
+SUSPECT = 1
+DEAD = 2
+STATUS_NAMES = {ALIVE: 'alive', SUSPECT: 'suspect', DEAD: 'dead'}
+
+# Members are spread over this many buckets by address; each bucket keeps the
+# XOR of its entries' hashes, and the XOR of all buckets is the digest
+BUCKETS = 32
+
+def _bucket(address: Address) -> int:
+    return hashlib.blake2b(f"{address[0]}:{address[1]}".encode(), digest_size=1).digest()[0] % BUCKETS
+
+def _entry_hash(address: Address, incarnation: int, status: int) -> int:
+    key = f"{address[0]}:{address[1]}:{incarnation}:{status}".encode()
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'big')
+
+def _parse_entry(entry) -> Optional[Tuple[Address, int, int]]:
+    """(address, incarnation, status) of a [host, port, incarnation(, status)] entry, or None if malformed"""
+    try:
+        host, port, incarnation = entry[:3]
+        status = entry[3] if len(entry) > 3 else ALIVE
+        port, incarnation, status = int(port), int(incarnation), int(status)
+    except (TypeError, ValueError, KeyError):
+        return None
+    if not isinstance(host, str) or not 0 < port < 65536 or incarnation < 0 or status not in STATUS_NAMES:
+        return None
+    return (host, port), incarnation, status
+
+class Membership:
+    """Versioned view of the mesh: every known member, its incarnation and state
+
+    Entries only move forward in (incarnation, status) order, so merging two
+    views keeps the greater entry per address and the result does not depend
+    on the order updates arrive in. Only a member itself raises its own
+    incarnation, which is how it refutes being suspected or declared dead.
+    Dead members are kept as tombstones for dead_ttl seconds so gossip does
+    not bring them back, and a tombstone for an address we do not know is
+    ignored, so expired ones are not passed around again.
+
+    Every change is stamped with a local version, which lets deltas() send a
+    peer only the entries that changed since the last round with it instead
+    of the whole table. Failure-detector changes (suspicion, death, recovery
+    and our own entry) are also queued for piggyback(), which attaches them
+    to outgoing messages a limited number of times each; plain joins are
+    left to the deltas.
+
+    The digest is an XOR of per-entry hashes, kept per bucket and updated in
+    O(1) per change. Two members with equal digests hold the same view; when
+    they still differ after exchanging deltas, comparing the bucket digests
+    narrows a full sync down to the buckets that actually disagree.
+    """
+
+    def __init__(self, address: Address, incarnation: int = 0, max_updates: int = 256,
+                 retransmit_mult: int = 3, dead_ttl: float = 300.0, clock: Callable[[], float] = time.monotonic):
+        self.address = address
+        self.max_updates = max_updates
+        self.retransmit_mult = retransmit_mult
+        self.dead_ttl = dead_ttl
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._members: 'OrderedDict[Address, Tuple[int, int, int]]' = OrderedDict()  # Oldest change first
+        self._buckets = [0] * BUCKETS
+        self._version = 0
+        self._sent: Dict[Address, int] = {}  # Version last sent to each peer
+        self._dead: Dict[Address, float] = {}  # Tombstones and when they were recorded
+        self._suspects = set()
+        self._broadcasts: 'OrderedDict[Address, int]' = OrderedDict()  # Times each change was piggybacked
+        self._apply(address, incarnation, ALIVE)
+
+    def _apply(self, address: Address, incarnation: int, status: int):
+        bucket = _bucket(address)
+        current = self._members.get(address)
+        if current is not None:
+            self._buckets[bucket] ^= _entry_hash(address, current[0], current[1])
+        self._buckets[bucket] ^= _entry_hash(address, incarnation, status)
+        self._version += 1
+        self._members[address] = (incarnation, status, self._version)
+        self._members.move_to_end(address)
+        if status == DEAD:
+            self._dead[address] = self.clock()
+        else:
+            self._dead.pop(address, None)
+        if status == SUSPECT:
+            self._suspects.add(address)
+        else:
+            self._suspects.discard(address)
+        if status != ALIVE or (current is not None and current[1] != ALIVE) or address == self.address:
+            self._broadcasts[address] = 0
+            self._broadcasts.move_to_end(address)
+
+    def _update(self, address: Address, incarnation: int, status: int) -> Optional[int]:
+        """Apply one entry if it supersedes ours; returns the previous status (None if new) or -1 if ignored"""
+        current = self._members.get(address)
+        if address == self.address:
+            if status != ALIVE and current is not None and incarnation >= current[0]:
+                self._apply(address, incarnation + 1, ALIVE)  # Refute: we are alive
+            return -1
+        if current is None:
+            if status == DEAD:
+                return -1
+            self._apply(address, incarnation, status)
+            return None
+        if (incarnation, status) <= current[:2]:
+            return -1
+        self._apply(address, incarnation, status)
+        return current[1]
+
+    def add(self, address: Address, incarnation: int = 0) -> bool:
+        """Merge one member as alive, returning True if it is alive or suspect afterwards"""
+        with self._lock:
+            self._update(address, incarnation, ALIVE)
+            current = self._members.get(address)
+            return current is not None and current[1] != DEAD
+
+    def set_status(self, address: Address, status: int, incarnation: Optional[int] = None) -> bool:
+        """Mark a member suspect or dead at its current (or the given) incarnation; True if that changed it"""
+        with self._lock:
+            current = self._members.get(address)
+            if current is None:
+                return False
+            return self._update(address, current[0] if incarnation is None else incarnation, status) != -1
+
+    def merge(self, updates: Iterable, source: Optional[Address] = None) -> List[Tuple[Address, int]]:
+        """Merge [host, port, incarnation(, status)] entries
+
+        Returns (address, status) for every member that is new or whose state
+        changed. Malformed entries and unknown states are skipped. If `source`
+        had already been sent everything we knew, it is marked as having what
+        it just sent too, so our next deltas() do not echo it back.
+        """
+        changed = []
+        with self._lock:
+            up_to_date = source is not None and self._sent.get(source) == self._version
+            for entry in updates:
+                parsed = _parse_entry(entry)
+                if parsed is None:
+                    continue
+                address, incarnation, status = parsed
+                previous = self._update(address, incarnation, status)
+                if previous != -1 and previous != status:
+                    changed.append((address, status))
+            if up_to_date:
+                self._sent[source] = self._version
+        return changed
+
+    def remove(self, address: Address):
+        with self._lock:
+            current = self._members.pop(address, None)
+            if current is not None:
+                self._buckets[_bucket(address)] ^= _entry_hash(address, current[0], current[1])
+            self._sent.pop(address, None)
+            self._dead.pop(address, None)
+            self._suspects.discard(address)
+            self._broadcasts.pop(address, None)
+
+    def expire_dead(self) -> List[Address]:
+        """Drop tombstones older than dead_ttl"""
+        now = self.clock()
+        with self._lock:
+            expired = [address for address, since in self._dead.items() if now - since >= self.dead_ttl]
+        for address in expired:
+            self.remove(address)
+        return expired
+
+    def status(self, address: Address) -> Optional[Tuple[int, int]]:
+        """(incarnation, status) of a member, or None if unknown"""
+        with self._lock:
+            current = self._members.get(address)
+            return None if current is None else current[:2]
+
+    @property
+    def incarnation(self) -> int:
+        return self.status(self.address)[0]
+
+    def live(self) -> List[Address]:
+        """Every other member that is alive or suspect"""
+        with self._lock:
+            return [address for address, (_, status, _) in self._members.items()
+                    if status != DEAD and address != self.address]
+
+    def suspects(self) -> List[Tuple[Address, int]]:
+        """(address, incarnation) of every suspect member"""
+        with self._lock:
+            return [(address, self._members[address][0]) for address in self._suspects]
+
+    def piggyback(self, limit: int = 6) -> List[list]:
+        """Up to `limit` recent changes to attach to an outgoing message
+
+        Each change is sent retransmit_mult * log10(members) times in total,
+        newest first, which spreads it epidemically without a dedicated
+        broadcast.
+        """
+        with self._lock:
+            if not self._broadcasts:
+                return []
+            transmits = self.retransmit_mult * max(1, math.ceil(math.log10(len(self._members) + 1)))
+            updates = []
+            for address in reversed(self._broadcasts):
+                if len(updates) >= limit:
+                    break
+                current = self._members.get(address)
+                if current is not None:
+                    updates.append([address[0], address[1], current[0], current[1]])
+            for host, port, _, _ in updates:
+                address = (host, port)
+                self._broadcasts[address] += 1
+                if self._broadcasts[address] >= transmits:
+                    del self._broadcasts[address]
+            return updates
+
+    def deltas(self, peer: Address) -> List[list]:
+        """Entries changed since the last deltas() for `peer`, newest first
+
+        A peer we have not gossiped with yet gets none: we cannot tell what
+        it already has, so its digest decides whether a bucket sync is
+        needed. At most max_updates are returned; anything left out is also
+        repaired by a bucket sync.
+        """
+        with self._lock:
+            since = self._sent.get(peer, self._version)
+            updates = []
+            for address in reversed(self._members):
+                incarnation, status, version = self._members[address]
+                if version <= since or len(updates) >= self.max_updates:
+                    break
+                updates.append([address[0], address[1], incarnation, status])
+            self._sent[peer] = self._version
+            return updates
+
+    def entries(self, buckets: Optional[Iterable[int]] = None) -> List[list]:
+        """Every entry, or only those in the given buckets"""
+        wanted = None if buckets is None else set(buckets)
+        with self._lock:
+            return [[address[0], address[1], incarnation, status]
+                    for address, (incarnation, status, _) in self._members.items()
+                    if wanted is None or _bucket(address) in wanted]
+
+    @property
+    def digest(self) -> str:
+        with self._lock:
+            combined = 0
+            for value in self._buckets:
+                combined ^= value
+            return f"{combined:016x}"
+
+    def bucket_digests(self) -> List[str]:
+        with self._lock:
+            return [f"{value:016x}" for value in self._buckets]
+
+    def differing_buckets(self, digests: List[str]) -> List[int]:
+        """Buckets whose digest differs from a peer's bucket_digests()"""
+        mine = self.bucket_digests()
+        if len(digests) != len(mine):
+            return list(range(BUCKETS))
+        return [i for i, (a, b) in enumerate(zip(mine, digests)) if a != b]
+
+    def __len__(self) -> int:
+        return len(self._members)
@@ -3,15 +3,16 @@ import sys
 import os
 import uuid
 
-# Ensure the project directory is in the Python path
+# Ensure the package's parent directory is in the Python path, so that
+# `python cli.py` works from a checkout without installing the package
 project_dir = os.path.dirname(os.path.abspath(__file__))
-sys.path.insert(0, project_dir)
+sys.path.insert(0, os.path.dirname(project_dir))
 
 # Import after adjusting path
 try:
-    from mcp import server as mcp_server
-    from agents import mcp_agent
-    from agents import a2a_agent
+    from a2a_mcp.mcp import server as mcp_server
+    from a2a_mcp.agents import mcp_agent
+    from a2a_mcp.agents import a2a_agent
 except ImportError as e:
     print(f"Error importing modules. Make sure structure is correct and requirements installed: {e}", file=sys.stderr)
     sys.exit(1)
@@ -31,7 +32,13 @@ def cli():
 @click.option('--workers', default=None, type=int, help='Number of Gunicorn worker processes (default: 2x CPU cores + 1).')
 @click.option('--max-requests', default=1000, type=int, help='Restart workers after handling this many requests.')
 @click.option('--max-requests-jitter', default=100, type=int, help='Add randomness to max requests to avoid all workers restarting at once.')
-def run_mcp(host, port, production, workers, max_requests, max_requests_jitter):
+@click.option('--registry', default=None, type=click.Choice(['memory', 'sqlite']), help='Agent registry and token revocation backend (sqlite shares them between workers).')
+@click.option('--registry-path', default=None, help='Database file for the sqlite registry backend.')
+@click.option('--snapshot-dir', default=None, help='Directory for snapshots of the in-memory registry, restored on restart (one worker only).')
+@click.option('--async', 'use_async', is_flag=True, help='Serve with asyncio (aiohttp) to hold many concurrent keep-alive connections.')
+@click.option('--task-dispatch', is_flag=True, help='Queue tasks for agents in this process (one worker, memory registry; also MCP_TASK_DISPATCH=1).')
+def run_mcp(host, port, production, workers, max_requests, max_requests_jitter, registry, registry_path, snapshot_dir, use_async,
+            task_dispatch):
     """Starts the Master Control Program (MCP) web server."""
     if production and host == '127.0.0.1':
         print("Warning: In production mode, you might want to use '0.0.0.0' to accept external connections")
@@ -41,6 +48,33 @@ def run_mcp(host, port, production, workers, max_requests, max_requests_jitter):
     print("Press Ctrl+C to stop the server.")
     
     try:
+        from a2a_mcp.mcp.config import config
+        if registry or registry_path:
+            from a2a_mcp.mcp.security import security_manager
+            backend = registry or config.REGISTRY_BACKEND
+            path = registry_path or config.REGISTRY_PATH
+            mcp_server.configure_registry(backend, path)
+            # Token revocations live in the same database so every worker honours them
+            security_manager.configure_revocations(backend, path)
+
+        if snapshot_dir:
+            config.SNAPSHOT_DIR = snapshot_dir
+        if task_dispatch:
+            config.TASK_DISPATCH = True
+
+        from a2a_mcp.mcp.registry import MemoryRegistry
+        if config.TASK_DISPATCH and not isinstance(mcp_server.agents, MemoryRegistry):
+            # Task queues are per process, but a shared registry means other servers see (and expire) the agents
+            config.TASK_DISPATCH = False
+            print("Warning: task dispatch is disabled with the sqlite registry")
+
+        if use_async:
+            try:
+                from a2a_mcp.mcp import async_server
+            except ImportError:
+                print("The async server requires aiohttp: pip install 'a2a_mcp[async]'", file=sys.stderr)
+                sys.exit(1)
+
         if production:
             import gunicorn.app.base
             import multiprocessing
@@ -63,27 +97,58 @@ def run_mcp(host, port, production, workers, max_requests, max_requests_jitter):
             if workers is None:
                 workers = (multiprocessing.cpu_count() * 2) + 1
 
+            # Share Prometheus metrics between workers so one scrape covers all of them
+            from a2a_mcp.mcp.exporter import mark_process_dead, prepare_multiprocess_dir
+            metrics_dir = prepare_multiprocess_dir()
+
+            if workers > 1 and config.TASK_DISPATCH:
+                # A task queued by one worker could only be pulled through that worker
+                config.TASK_DISPATCH = False
+                print("Warning: task dispatch is disabled with more than one worker")
+            if workers > 1 and isinstance(mcp_server.agents, MemoryRegistry):
+                if config.SNAPSHOT_DIR:
+                    # Each worker would restore and journal its own registry, and only one can own the directory
+                    print("Registry snapshots need --workers 1; use --registry sqlite to share and persist "
+                          "agents across workers", file=sys.stderr)
+                    sys.exit(1)
+                print("Warning: the in-memory registry is per worker; use --registry sqlite to share agents")
+
             options = {
                 'bind': f"{host}:{port}",
                 'workers': workers,
-                'worker_class': 'sync',
+                'worker_class': 'aiohttp.GunicornWebWorker' if use_async else 'sync',
                 'worker_tmp_dir': '/dev/shm',  # Use RAM for temp files
                 'timeout': 120,
-                'keepalive': 5,  # Keep-alive timeout
+                'keepalive': config.ASYNC_KEEPALIVE_TIMEOUT if use_async else 5,  # Keep-alive timeout
+                'backlog': config.ASYNC_BACKLOG if use_async else None,
                 'max_requests': max_requests,
                 'max_requests_jitter': max_requests_jitter,
                 'accesslog': '-',  # Log to stdout
                 'errorlog': '-',   # Log to stderr
-                'access_log_format': '%({x-real-ip}i)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s"',
+                # aiohttp workers take the same fields in aiohttp's own access log syntax
+                'access_log_format': '%{X-Real-IP}i - - %t "%r" %s %b "%{Referer}i" "%{User-Agent}i"' if use_async
+                else '%({x-real-ip}i)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s"',
                 'loglevel': 'info',
                 # Security settings
                 'limit_request_line': 4094,  # Limit request line size
                 'limit_request_fields': 100,  # Limit number of header fields
                 'limit_request_field_size': 8190,  # Limit header field sizes
+                'child_exit': lambda server, worker: mark_process_dead(worker.pid),
+                'post_worker_init': lambda worker: (mcp_server.start_snapshots(), mcp_server.start_cleanup_thread()),
             }
             
-            from mcp.wsgi import application
-            GunicornApp(application, options).run()
+            if use_async:
+                application = async_server.create_app()
+            else:
+                from a2a_mcp.mcp.wsgi import application
+            try:
+                GunicornApp(application, options).run()
+            finally:
+                if metrics_dir:
+                    import shutil
+                    shutil.rmtree(metrics_dir, ignore_errors=True)
+        elif use_async:
+            async_server.run_async_server(host, port)
         else:
             mcp_server.run_server(host, port)
     except Exception as e:
@@ -93,13 +158,49 @@ def run_mcp(host, port, production, workers, max_requests, max_requests_jitter):
 @cli.command('run-mcp-agent')
 @click.option('--agent-id', default=None, help='Unique ID for this agent (auto-generated if not set).')
 @click.option('--mcp-url', default='http://127.0.0.1:5000', help='URL of the MCP server.')
-def run_mcp_agent_cli(agent_id, mcp_url):
+@click.option('--no-session', is_flag=True, help='Only use HTTP heartbeats, without a persistent session.')
+def run_mcp_agent_cli(agent_id, mcp_url, no_session):
     """Starts an agent that connects to the MCP."""
     if agent_id is None:
         agent_id = f"mcp-agent-{uuid.uuid4().hex[:6]}"
     print(f"Starting MCP Agent '{agent_id}' connecting to {mcp_url}")
     print("Press Ctrl+C to stop the agent.")
-    mcp_agent.run_agent(agent_id, mcp_url)
+    mcp_agent.run_agent(agent_id, mcp_url, use_session=not no_session)
+
+@cli.command('run-mcp-agents')
+@click.option('--count', default=100, type=int, help='Number of agent identities to run.')
+@click.option('--prefix', default=None, help='Agent ID prefix (auto-generated if not set).')
+@click.option('--mcp-url', default='http://127.0.0.1:5000', help='URL of the MCP server.')
+@click.option('--max-connections', default=100, type=int, help='Size of the shared HTTP connection pool.')
+@click.option('--gateway-key', envvar='MCP_GATEWAY_KEY', default=None,
+              help="The server's gateway key (default: $MCP_GATEWAY_KEY). Needed beyond a handful of agents: the "
+                   "server allows each address 5 registrations and 30 heartbeats a minute by default, so without "
+                   "it registrations are paced to that limit and most heartbeats are refused.")
+def run_mcp_agents_cli(count, prefix, mcp_url, max_connections, gateway_key):
+    """Runs many MCP agents in one process on an asyncio event loop."""
+    try:
+        import asyncio
+        from a2a_mcp.agents import async_agent
+    except ImportError:
+        print("Running many agents requires aiohttp: pip install 'a2a_mcp[async]'", file=sys.stderr)
+        sys.exit(1)
+    from limits import parse
+    from a2a_mcp.mcp.config import config
+    register_limit = parse(config.REGISTER_RATE_LIMIT)
+    heartbeat_limit = parse(config.HEARTBEAT_RATE_LIMIT)
+    register_rate = register_limit.amount / register_limit.get_expiry()
+    max_agents = int(heartbeat_limit.amount / heartbeat_limit.get_expiry() * config.HEARTBEAT_INTERVAL)
+    if not gateway_key and count > max_agents:
+        print(f"Warning: without --gateway-key the server's per-address limits ({config.REGISTER_RATE_LIMIT} "
+              f"registrations, {config.HEARTBEAT_RATE_LIMIT} heartbeats) keep about {max_agents} agents alive")
+    prefix = prefix or f"mcp-agent-{uuid.uuid4().hex[:6]}"
+    print(f"Starting {count} MCP agents '{prefix}-N' connecting to {mcp_url}")
+    print("Press Ctrl+C to stop the agents.")
+    try:
+        asyncio.run(async_agent.run_agents([f"{prefix}-{i}" for i in range(count)], mcp_url, max_connections,
+                                           gateway_key=gateway_key, register_rate=register_rate))
+    except KeyboardInterrupt:
+        print("Stopping agents...")
 
 
 # --- A2A Commands ---
@@ -109,8 +210,27 @@ def run_mcp_agent_cli(agent_id, mcp_url):
 @click.option('--host', default='127.0.0.1', help='Host IP for this agent to listen on.')
 @click.option('--port', default=0, type=int, help='Port for this agent (0 means random available port).')
 @click.option('--peer', '-p', 'initial_peers', multiple=True, help='Initial peer address (HOST:PORT). Can specify multiple times.')
-def run_a2a_agent_cli(agent_id, host, port, initial_peers):
+@click.option('--transport', type=click.Choice(['threads', 'asyncio']), default='threads',
+              help='Networking core: a thread per connection, or one asyncio event loop.')
+@click.option('--dissemination', type=click.Choice(['flood', 'gossip']), default='flood',
+              help='Broadcast forwarding: to every peer, or push-pull gossip to a few random peers.')
+@click.option('--fanout', default=3, type=int, help='Peers each gossip node forwards a broadcast to.')
+@click.option('--max-hops', default=None, type=int, help='Relays after which a broadcast stops (gossip default 8).')
+@click.option('--wire-codec', type=click.Choice(['json', 'msgpack']), default='json',
+              help='Body encoding of sent frames; msgpack must be installed on every agent.')
+@click.option('--probe-interval', default=1.0, type=float,
+              help='Seconds between failure-detector probes; a probe times out after half of it.')
+@click.option('--suspicion-mult', default=4, type=int,
+              help='Suspicion timeout in probe intervals (scaled by log10 of the member count).')
+def run_a2a_agent_cli(agent_id, host, port, initial_peers, transport, dissemination, fanout, max_hops, wire_codec,
+                      probe_interval, suspicion_mult):
     """Starts an Agent-to-Agent (A2A) communicating agent."""
+    if wire_codec == 'msgpack':
+        try:
+            import msgpack  # noqa: F401
+        except ImportError:
+            print("The msgpack codec requires msgpack: pip install 'a2a_mcp[msgpack]'", file=sys.stderr)
+            sys.exit(1)
     # Resolve port 0 to an actual available port
     if port == 0:
         try:
@@ -128,7 +248,8 @@ def run_a2a_agent_cli(agent_id, host, port, initial_peers):
     if initial_peers:
         print(f"Attempting to connect to initial peers: {', '.join(initial_peers)}")
     print("Press Ctrl+C to stop the agent.")
-    a2a_agent.run_agent(agent_id, host, port, initial_peers)
+    a2a_agent.run_agent(agent_id, host, port, initial_peers, transport, dissemination, fanout, max_hops, wire_codec,
+                        probe_interval, suspicion_mult)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,549 @@
+import json
+import time
+import asyncio
+import logging
+from functools import partial, wraps
+from typing import Any, Dict, Optional
+from aiohttp import WSMsgType, web
+from limits import parse
+from limits.storage import MemoryStorage
+from limits.strategies import FixedWindowRateLimiter
+from marshmallow import ValidationError
+from .config import config
+from .security import security_manager
+from .monitoring import monitoring
+from .exporter import render_metrics
+from .registry import AgentData, SQLiteRegistry
+from .revocation import SQLiteRevocationStore
+from . import server
+
+logger = logging.getLogger(__name__)
+
+# Same per-client, per-route fixed windows as the Flask app's limiter
+DEFAULT_LIMITS = [parse("200 per day"), parse("50 per hour")]
+rate_limiter = FixedWindowRateLimiter(MemoryStorage())
+
+async def run_blocking(function, *args, **kwargs):
+    """Run a call that does file or database I/O on the default executor"""
+    return await asyncio.get_running_loop().run_in_executor(None, partial(function, *args, **kwargs))
+
+def does_io(registry) -> bool:
+    """Whether a registry, or any registry it wraps, is backed by disk"""
+    while registry is not None:
+        if isinstance(registry, SQLiteRegistry):
+            return True
+        registry = getattr(registry, 'inner', None)
+    return False
+
+async def call_registry(method, *args, **kwargs):
+    """Call a registry method, off the event loop when the backend does disk I/O"""
+    if does_io(server.agents):
+        return await run_blocking(method, *args, **kwargs)
+    return method(*args, **kwargs)
+
+async def validate_token(token: str, token_type: str) -> Optional[Dict[str, Any]]:
+    """Token claims, checked off the event loop when revocations are kept in SQLite"""
+    if isinstance(security_manager.revocations.store, SQLiteRevocationStore):
+        return await run_blocking(security_manager.validate_token, token, token_type)
+    return security_manager.validate_token(token, token_type=token_type)
+
+def error(message, status: int) -> web.Response:
+    return web.json_response({'error': message}, status=status)
+
+async def read_json(request: web.Request):
+    """Request body as JSON, or None when it is missing or malformed"""
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+def rate_limited(*limit_values, exempt_when=None):
+    """Apply rate limits per client address and route, like flask_limiter"""
+    items = [parse(value) for value in limit_values] or DEFAULT_LIMITS
+    def decorator(handler):
+        @wraps(handler)
+        async def wrapped(request: web.Request):
+            route = request.match_info.route.name
+            if exempt_when is not None and await exempt_when(request):
+                return await handler(request)
+            for item in items:
+                if not rate_limiter.hit(item, request.remote or '', route):
+                    return error('rate limit exceeded', 429)
+            return await handler(request)
+        return wrapped
+    return decorator
+
+def rate_limited_jwt_required(limit_value, token_type='agent_auth'):
+    """Combine rate limiting and token verification; claims land in request['token_payload']"""
+    def decorator(handler):
+        @wraps(handler)
+        @rate_limited(limit_value)
+        async def wrapped(request: web.Request):
+            auth_header = request.headers.get('Authorization', '')
+            token = auth_header[7:] if auth_header.startswith('Bearer ') else None
+            payload = await validate_token(token, token_type) if token else None
+            if payload is None:
+                return error('unauthorized', 401)
+            request['token_payload'] = payload
+            return await handler(request)
+        return wrapped
+    return decorator
+
+# Close codes in the private-use range (4000-4999) that tell the agent what to do next
+CLOSE_UNKNOWN_AGENT = 4404  # not in the registry (e.g. expired): register again
+CLOSE_REPLACED = 4409  # a newer session for the same agent took over
+
+monitoring.register_metric('session_count', 'Open agent sessions')
+
+class SessionHub:
+    """Open agent sessions of this process
+
+    A session is a WebSocket kept alive by protocol-level ping/pong frames
+    (every SESSION_PING_INTERVAL seconds; a missed pong closes it). While it
+    is open the agent counts as alive: the hub refreshes last_seen of every
+    connected agent with one batched registry touch per SESSION_TOUCH_INTERVAL,
+    so a session costs no per-agent request traffic. Agents report status
+    changes and receive server commands as JSON text frames on the same socket.
+    """
+
+    def __init__(self):
+        self.sessions: Dict[str, web.WebSocketResponse] = {}
+        self._touch_task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def __contains__(self, agent_id: str) -> bool:
+        return agent_id in self.sessions
+
+    async def send(self, agent_id: str, command: str, **params: Any) -> bool:
+        """Push a command to a connected agent, returning False if it has no session"""
+        ws = self.sessions.get(agent_id)
+        if ws is None or ws.closed:
+            return False
+        await ws.send_json({'type': 'command', 'command': command, 'params': params})
+        return True
+
+    async def broadcast(self, command: str, **params: Any) -> int:
+        """Push a command to every connected agent, returning how many were sent"""
+        message = json.dumps({'type': 'command', 'command': command, 'params': params})
+        sockets = [ws for ws in self.sessions.values() if not ws.closed]
+        results = await asyncio.gather(*(ws.send_str(message) for ws in sockets), return_exceptions=True)
+        return sum(1 for result in results if result is None)
+
+    async def _touch_loop(self):
+        """Keep connected agents from expiring"""
+        while True:
+            await asyncio.sleep(config.SESSION_TOUCH_INTERVAL)
+            try:
+                agent_ids = list(self.sessions)
+                # Statuses arrive on their own frames; this only refreshes last_seen
+                touched = await call_registry(server.agents.touch_many, [(agent_id, None) for agent_id in agent_ids])
+                for agent_id, ok in zip(agent_ids, touched):
+                    ws = self.sessions.get(agent_id)
+                    if not ok and ws is not None:  # Removed from the registry behind our back
+                        await ws.close(code=CLOSE_UNKNOWN_AGENT, message=b'agent not found')
+                monitoring.record_metric('session_count', len(self.sessions))
+            except Exception as e:
+                logger.error(f"Session touch error: {e}")
+
+    async def on_startup(self, app: web.Application):
+        self._touch_task = asyncio.ensure_future(self._touch_loop())
+
+    async def on_shutdown(self, app: web.Application):
+        if self._touch_task:
+            self._touch_task.cancel()
+        for ws in list(self.sessions.values()):
+            await ws.close(code=web.WSCloseCode.GOING_AWAY, message=b'server shutdown')
+
+    async def handle(self, request: web.Request, agent_id: str) -> web.WebSocketResponse:
+        """Run one authenticated agent session until either side closes it"""
+        ws = web.WebSocketResponse(heartbeat=config.SESSION_PING_INTERVAL, max_msg_size=config.SESSION_MAX_FRAME)
+        await ws.prepare(request)
+
+        if not await call_registry(server.agents.touch, agent_id, 'active'):
+            await ws.close(code=CLOSE_UNKNOWN_AGENT, message=b'agent not found')
+            return ws
+
+        previous = self.sessions.get(agent_id)
+        self.sessions[agent_id] = ws
+        if previous is not None:
+            await previous.close(code=CLOSE_REPLACED, message=b'replaced by a newer session')
+        logger.info(f"Session opened for {agent_id} from {request.remote}")
+
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    frame = json.loads(msg.data)
+                except ValueError:
+                    logger.warning(f"Malformed session frame from {agent_id}")
+                    continue
+                if isinstance(frame, dict) and frame.get('type') == 'status' and isinstance(frame.get('status'), str):
+                    if len(frame['status']) > config.STATUS_MAX_LENGTH:
+                        logger.warning(f"Oversized session status from {agent_id}")
+                        continue
+                    await call_registry(server.agents.touch, agent_id, frame['status'])
+        finally:
+            if self.sessions.get(agent_id) is ws:
+                del self.sessions[agent_id]
+                # Expose the lost connection immediately; the agent still has
+                # AGENT_TIMEOUT seconds to come back or fall back to HTTP heartbeats
+                await call_registry(server.agents.touch, agent_id, 'disconnected')
+            logger.info(f"Session closed for {agent_id} (code {ws.close_code})")
+        return ws
+
+session_hub = SessionHub()
+
+@web.middleware
+async def metrics_middleware(request: web.Request, handler):
+    """Record the same request metrics as the Flask app's after_request hook"""
+    start_time = time.time()
+    response = None
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        # A session only returns when its socket closes; its lifetime is not a response time
+        if not isinstance(response, web.WebSocketResponse):
+            try:
+                route = request.match_info.route.name if request.match_info.route else None
+                monitoring.record_metric('response_time', (time.time() - start_time) * 1000, labels=(
+                    request.method, route or 'unmatched', str(status)
+                ))
+                if status >= 400:
+                    monitoring.record_metric('error_rate', 1)
+            except Exception as e:
+                logger.error(f"Error recording metrics: {e}")
+    return response
+
+@rate_limited()
+async def health_check(request: web.Request) -> web.Response:
+    """Get system health status"""
+    # Flushing metrics runs the exporter, which writes files in multiprocess mode
+    health = await run_blocking(monitoring.get_system_health)
+    health['token_cache'] = security_manager.token_cache.stats()
+    health['tasks'] = server.task_queue.stats()
+    return web.json_response(health)
+
+async def prometheus_metrics(request: web.Request) -> web.Response:
+    """Prometheus text exposition of monitoring metrics"""
+    body, content_type = await run_blocking(render_metrics)
+    return web.Response(body=body, headers={'Content-Type': content_type})
+
+@rate_limited_jwt_required("30/minute")
+async def get_metric(request: web.Request) -> web.Response:
+    """Get historical data for a specific metric"""
+    try:
+        window = int(request.query.get('window', 3600))
+        step = int(request.query['step']) if 'step' in request.query else None
+    except ValueError:
+        window, step = 3600, None  # Flask's type=int falls back to the default too
+    history = await run_blocking(monitoring.get_metric_history, request.match_info['name'], window, step)
+    return web.json_response(history)
+
+async def gateway_request(request: web.Request) -> bool:
+    """Whether the request carries a valid gateway token, which lifts the per-address registration limit"""
+    auth_header = request.headers.get('Authorization', '')
+    return auth_header.startswith('Bearer ') and \
+        await validate_token(auth_header[7:], 'gateway_auth') is not None
+
+@rate_limited(config.REGISTER_RATE_LIMIT, exempt_when=gateway_request)
+async def register_agent(request: web.Request) -> web.Response:
+    """Register a new agent with API key"""
+    try:
+        data = server.RegisterSchema().load(await read_json(request))
+        agent_id = data['agent_id']
+
+        if not security_manager.validate_api_key(agent_id, data['api_key']):
+            logger.warning(f"Invalid API key for agent: {agent_id}")
+            return error('invalid api key', 401)
+
+        peer = request.transport.get_extra_info('peername') if request.transport else None
+        agent = AgentData(
+            last_seen=time.monotonic(),
+            status='active',
+            host=request.remote,
+            port=peer[1] if peer and len(peer) > 1 else None
+        )
+        if not await call_registry(server.agents.add, agent_id, agent, config.MAX_AGENTS):
+            logger.warning(f"Max agent limit reached, rejecting {agent_id}")
+            return error('maximum agents limit reached', 503)
+
+        access_token = security_manager.generate_token(agent_id)
+        logger.info(f"Agent registered: {agent_id} from {request.remote}")
+
+        return web.json_response({
+            'status': 'registered',
+            'agent_id': agent_id,
+            'access_token': access_token
+        })
+
+    except ValidationError as err:
+        logger.error(f"Registration validation error: {err.messages}")
+        return error(err.messages, 400)
+    except Exception as e:
+        logger.error(f"Registration error: {str(e)}")
+        monitoring.record_metric('error_rate', 1)
+        return error('internal server error', 500)
+
+@rate_limited_jwt_required(config.HEARTBEAT_RATE_LIMIT)
+async def heartbeat(request: web.Request) -> web.Response:
+    """Update agent heartbeat with authentication"""
+    try:
+        agent_id = request.match_info['agent_id']
+        token_agent_id = request['token_payload']['agent_id']
+        if token_agent_id != agent_id:
+            logger.warning(f"Token mismatch: {token_agent_id} != {agent_id}")
+            return error('unauthorized', 401)
+
+        data = server.HeartbeatSchema().load(await read_json(request) or {})
+
+        server.heartbeat_load.record()
+        if not await call_registry(server.agents.touch, agent_id, data.get('status')):
+            logger.warning(f"Heartbeat from unknown agent: {agent_id}")
+            return error('agent not found', 404)
+
+        return web.json_response({'status': 'ok'}, headers=server.heartbeat_load.headers())
+
+    except ValidationError as err:
+        logger.error(f"Heartbeat validation error: {err.messages}")
+        return error(err.messages, 400)
+    except Exception as e:
+        logger.error(f"Heartbeat error: {str(e)}")
+        monitoring.record_metric('error_rate', 1)
+        return error('internal server error', 500)
+
+@rate_limited_jwt_required(config.SESSION_RATE_LIMIT)
+async def agent_session(request: web.Request) -> web.StreamResponse:
+    """Upgrade to a persistent WebSocket session replacing HTTP heartbeats"""
+    agent_id = request.match_info['agent_id']
+    token_agent_id = request['token_payload']['agent_id']
+    if token_agent_id != agent_id:
+        logger.warning(f"Token mismatch: {token_agent_id} != {agent_id}")
+        return error('unauthorized', 401)
+    return await session_hub.handle(request, agent_id)
+
+@rate_limited(config.REGISTER_RATE_LIMIT)
+async def register_gateway(request: web.Request) -> web.Response:
+    """Issue a gateway token that can send heartbeats on behalf of many agents"""
+    try:
+        data = server.GatewayRegisterSchema().load(await read_json(request))
+        gateway_id = data['gateway_id']
+
+        if not security_manager.validate_gateway_key(gateway_id, data['gateway_key']):
+            return error('invalid gateway key', 401)
+
+        access_token = security_manager.generate_token(gateway_id, token_type='gateway_auth')
+        logger.info(f"Gateway registered: {gateway_id} from {request.remote}")
+
+        return web.json_response({
+            'status': 'registered',
+            'gateway_id': gateway_id,
+            'access_token': access_token
+        })
+
+    except ValidationError as err:
+        logger.error(f"Gateway registration validation error: {err.messages}")
+        return error(err.messages, 400)
+    except Exception as e:
+        logger.error(f"Gateway registration error: {str(e)}")
+        monitoring.record_metric('error_rate', 1)
+        return error('internal server error', 500)
+
+@rate_limited_jwt_required(config.BATCH_HEARTBEAT_RATE_LIMIT, token_type='gateway_auth')
+async def batch_heartbeat(request: web.Request) -> web.Response:
+    """Apply a batch of agent heartbeats sent by a gateway"""
+    try:
+        entries = server.BatchHeartbeatSchema().load(await read_json(request) or {})['heartbeats']
+
+        errors = server.BatchHeartbeatEntrySchema(many=True).validate(entries)
+        valid = [i for i in range(len(entries)) if i not in errors]
+        server.heartbeat_load.record(len(valid))
+        applied = await call_registry(server.agents.touch_many, [
+            (entries[i]['agent_id'], entries[i].get('status')) for i in valid
+        ])
+
+        results = [None] * len(entries)
+        for i, messages in errors.items():
+            results[i] = {'agent_id': entries[i].get('agent_id'), 'error': messages}
+        for i, ok in zip(valid, applied):
+            results[i] = {'agent_id': entries[i]['agent_id'], 'status': 'ok'} if ok \
+                else {'agent_id': entries[i]['agent_id'], 'error': 'agent not found'}
+
+        accepted = sum(applied)
+        logger.debug(f"Gateway {request['token_payload']['agent_id']} applied {accepted}/{len(entries)} heartbeats")
+        return web.json_response({'accepted': accepted, 'rejected': len(entries) - accepted, 'results': results},
+                                 headers=server.heartbeat_load.headers())
+
+    except ValidationError as err:
+        logger.error(f"Batch heartbeat validation error: {err.messages}")
+        return error(err.messages, 400)
+    except Exception as e:
+        logger.error(f"Batch heartbeat error: {str(e)}")
+        monitoring.record_metric('error_rate', 1)
+        return error('internal server error', 500)
+
+@rate_limited_jwt_required(config.TASK_SUBMIT_RATE_LIMIT, token_type='gateway_auth')
+async def submit_task_batch(request: web.Request) -> web.Response:
+    """Queue tasks for the least-loaded (or key-owning) agents"""
+    if not config.TASK_DISPATCH:
+        return error(server.DISPATCH_DISABLED, 503)
+    try:
+        entries = server.TaskSubmitSchema().load(await read_json(request) or {})['tasks']
+        body, status = server.submit_tasks(entries)
+        headers = {'Retry-After': '1'} if status == 503 else None
+        return web.json_response(body, status=status, headers=headers)
+    except ValidationError as err:
+        logger.error(f"Task submission validation error: {err.messages}")
+        return error(err.messages, 400)
+    except Exception as e:
+        logger.error(f"Task submission error: {str(e)}")
+        monitoring.record_metric('error_rate', 1)
+        return error('internal server error', 500)
+
+@rate_limited_jwt_required(config.TASK_PULL_RATE_LIMIT)
+async def pull_tasks(request: web.Request) -> web.Response:
+    """Lease a batch of the agent's queued tasks"""
+    if not config.TASK_DISPATCH:
+        return error(server.DISPATCH_DISABLED, 503)
+    try:
+        agent_id = request.match_info['agent_id']
+        if request['token_payload']['agent_id'] != agent_id:
+            return error('unauthorized', 401)
+        if not await call_registry(server.agents.__contains__, agent_id):
+            return error('agent not found', 404)
+
+        data = server.TaskPullSchema().load(await read_json(request) or {})
+        visibility_timeout = data.get('visibility_timeout', config.TASK_VISIBILITY_TIMEOUT)
+        tasks = server.task_queue.pull(agent_id, data.get('max_tasks', 1), visibility_timeout)
+        return web.json_response({
+            'tasks': [server.serialize_task(task) for task in tasks],
+            'visibility_timeout': visibility_timeout
+        })
+    except ValidationError as err:
+        logger.error(f"Task pull validation error: {err.messages}")
+        return error(err.messages, 400)
+    except Exception as e:
+        logger.error(f"Task pull error: {str(e)}")
+        monitoring.record_metric('error_rate', 1)
+        return error('internal server error', 500)
+
+@rate_limited_jwt_required(config.TASK_PULL_RATE_LIMIT)
+async def ack_tasks(request: web.Request) -> web.Response:
+    """Acknowledge completed tasks so they are not redelivered"""
+    if not config.TASK_DISPATCH:
+        return error(server.DISPATCH_DISABLED, 503)
+    try:
+        agent_id = request.match_info['agent_id']
+        if request['token_payload']['agent_id'] != agent_id:
+            return error('unauthorized', 401)
+
+        task_ids = server.TaskAckSchema().load(await read_json(request) or {})['task_ids']
+        acked = server.task_queue.ack(agent_id, task_ids)
+        return web.json_response({'acked': sum(acked), 'results': acked})
+    except ValidationError as err:
+        logger.error(f"Task ack validation error: {err.messages}")
+        return error(err.messages, 400)
+    except Exception as e:
+        logger.error(f"Task ack error: {str(e)}")
+        monitoring.record_metric('error_rate', 1)
+        return error('internal server error', 500)
+
+@rate_limited_jwt_required("30/minute")
+async def get_status(request: web.Request) -> web.StreamResponse:
+    """Get a page of registered agents, optionally filtered, projected or streamed"""
+    try:
+        query = server.StatusQuerySchema().load(request.query)
+        selected = tuple(query['projection'].split(',')) if 'projection' in query else server.STATUS_FIELDS
+        unknown = set(selected) - set(server.STATUS_FIELDS)
+        if unknown:
+            return error({'fields': [f"Unknown fields: {', '.join(sorted(unknown))}"]}, 400)
+
+        now = time.monotonic()
+        filters = {
+            'status': query.get('status'),
+            'seen_after': now - query['max_age'] if 'max_age' in query else None,
+            'seen_before': now - query['min_age'] if 'min_age' in query else None
+        }
+        limit = query.get('limit', config.STATUS_PAGE_SIZE)
+        offset = time.time() - time.monotonic()
+
+        if query.get('format') == 'ndjson':
+            response = web.StreamResponse(headers={
+                'Content-Type': 'application/x-ndjson',
+                'X-Total-Agents': str(await call_registry(len, server.agents))
+            })
+            await response.prepare(request)
+            after = query.get('cursor')
+            while True:
+                page = await call_registry(server.agents.page, after, limit, **filters)
+                await response.write(''.join(
+                    json.dumps(dict(agent_id=agent_id, **server._serialize_agent(data, selected, offset))) + '\n'
+                    for agent_id, data in page
+                ).encode())
+                if len(page) < limit:
+                    break
+                after = page[-1][0]
+            await response.write_eof()
+            return response
+
+        page = await call_registry(server.agents.page, query.get('cursor'), limit, **filters)
+        return web.json_response({
+            'agents': {agent_id: server._serialize_agent(data, selected, offset) for agent_id, data in page},
+            'total_agents': await call_registry(len, server.agents),
+            'next_cursor': page[-1][0] if len(page) == limit else None,
+            'system_health': await run_blocking(monitoring.get_system_health)
+        })
+    except ValidationError as err:
+        logger.error(f"Status query validation error: {err.messages}")
+        return error(err.messages, 400)
+    except Exception as e:
+        logger.error(f"Status retrieval error: {str(e)}")
+        monitoring.record_metric('error_rate', 1)
+        return error('internal server error', 500)
+
+def create_app() -> web.Application:
+    """Build the aiohttp application serving the MCP routes"""
+    app = web.Application(middlewares=[metrics_middleware], client_max_size=config.ASYNC_MAX_BODY_SIZE)
+    # Route names match the Flask endpoints so metric labels line up across modes
+    app.router.add_get('/health', health_check, name='health_check')
+    app.router.add_get('/metrics', prometheus_metrics, name='prometheus_metrics')
+    app.router.add_get('/metrics/{name}', get_metric, name='get_metric')
+    app.router.add_post('/register', register_agent, name='register_agent')
+    app.router.add_post('/heartbeat/{agent_id}', heartbeat, name='heartbeat')
+    app.router.add_get('/session/{agent_id}', agent_session, name='agent_session')
+    app.router.add_post('/gateway/register', register_gateway, name='register_gateway')
+    app.router.add_post('/heartbeats', batch_heartbeat, name='batch_heartbeat')
+    app.router.add_post('/tasks', submit_task_batch, name='submit_task_batch')
+    app.router.add_post('/tasks/{agent_id}/pull', pull_tasks, name='pull_tasks')
+    app.router.add_post('/tasks/{agent_id}/ack', ack_tasks, name='ack_tasks')
+    app.router.add_get('/status', get_status, name='get_status')
+    app.on_startup.append(session_hub.on_startup)
+    app.on_shutdown.append(session_hub.on_shutdown)
+    return app
+
+def run_async_server(host=None, port=None):
+    """Run the MCP server on a single asyncio event loop"""
+    host = host or config.HOST
+    port = port or config.PORT
+
+    logger.info(f"Starting async MCP Server on {host}:{port}")
+
+    server.start_snapshots()
+    server.start_cleanup_thread()
+
+    web.run_app(
+        create_app(),
+        host=host,
+        port=port,
+        backlog=config.ASYNC_BACKLOG,
+        keepalive_timeout=config.ASYNC_KEEPALIVE_TIMEOUT,
+        access_log=None,
+        print=None
+    )
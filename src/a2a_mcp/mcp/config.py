@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Optional
+from typing import Optional, Tuple
 import os
 
 @dataclass
@@ -8,20 +8,71 @@ class ServerConfig:
     HOST: str = '0.0.0.0'
     PORT: int = 5000
     DEBUG: bool = False
+    ASYNC_BACKLOG: int = 4096  # pending connections queued by the async server
+    ASYNC_KEEPALIVE_TIMEOUT: int = 75  # seconds; longer than the agent heartbeat interval
+    ASYNC_MAX_BODY_SIZE: int = 16 * 1024 * 1024  # bytes, room for full heartbeat batches
     
     # Security
     SECRET_KEY: str = os.environ.get('MCP_SECRET_KEY', 'dev-secret-key')
     JWT_SECRET_KEY: str = os.environ.get('MCP_JWT_SECRET_KEY', 'dev-jwt-secret')
+    GATEWAY_KEY: Optional[str] = os.environ.get('MCP_GATEWAY_KEY')  # Enables agent gateways
+    TOKEN_CACHE_SIZE: int = 100000  # verified tokens kept per process
+    TOKEN_CACHE_TTL: int = 300      # seconds, capped by each token's exp
+    REVOCATION_BACKEND: str = os.environ.get('MCP_REVOCATION_BACKEND', 'memory')  # memory or sqlite
+    REVOCATION_PATH: Optional[str] = os.environ.get('MCP_REVOCATION_PATH', 'mcp_registry.db')
+    REVOCATION_BLOOM_CAPACITY: int = 100000
+    REVOCATION_BLOOM_FP_RATE: float = 0.001
+    REVOCATION_SYNC_INTERVAL: float = 1.0  # seconds until other workers see a revocation
     
     # Agent settings
     CLEANUP_INTERVAL: int = 30  # seconds
+    CLEANUP_BATCH_SIZE: int = 500  # agents evicted per registry lock acquisition
     AGENT_TIMEOUT: int = 60     # seconds
+    HEARTBEAT_INTERVAL: float = 30.0  # seconds advised to agents at normal load
+    HEARTBEAT_MAX_INTERVAL: float = 45.0  # advised ceiling under load; keep well below AGENT_TIMEOUT
+    HEARTBEAT_TARGET_RATE: float = 500.0  # heartbeats/sec per process before intervals stretch
     MAX_AGENTS: int = 1000
+    AGENT_ID_MAX_LENGTH: int = 256  # characters
+    STATUS_MAX_LENGTH: int = 256  # characters
+    REGISTRY_BACKEND: str = os.environ.get('MCP_REGISTRY_BACKEND', 'memory')  # memory or sqlite
+    REGISTRY_PATH: Optional[str] = os.environ.get('MCP_REGISTRY_PATH', 'mcp_registry.db')
+    SNAPSHOT_DIR: Optional[str] = os.environ.get('MCP_SNAPSHOT_DIR')  # warm restarts of the memory registry
+    SNAPSHOT_INTERVAL: float = 60.0  # seconds between compact checkpoints
+    SNAPSHOT_FLUSH_INTERVAL: float = 1.0  # seconds between log appends
     
     # Rate limiting
     HEARTBEAT_RATE_LIMIT: str = "30/minute"
     REGISTER_RATE_LIMIT: str = "5/minute"
+    BATCH_HEARTBEAT_RATE_LIMIT: str = "60/minute"
+    BATCH_HEARTBEAT_MAX: int = 10000  # entries per batch
+    SESSION_RATE_LIMIT: str = "10/minute"  # session (re)connects
+    TASK_SUBMIT_RATE_LIMIT: str = "600/minute"
+    TASK_PULL_RATE_LIMIT: str = "120/minute"  # pull and ack calls per agent address
+
+    # Task dispatch
+    # Opt-in: queues are per process, so dispatch needs one worker and the memory registry
+    TASK_DISPATCH: bool = os.environ.get('MCP_TASK_DISPATCH', '').lower() in ('1', 'true', 'yes')
+    TASK_QUEUE_SIZE: int = 1000  # pending tasks per agent before submissions are refused
+    TASK_VISIBILITY_TIMEOUT: float = 60.0  # seconds a pulled task stays leased
+    TASK_MAX_VISIBILITY_TIMEOUT: float = 3600.0
+    TASK_MAX_ATTEMPTS: int = 5  # deliveries before a task is dropped
+    TASK_HASH_REPLICAS: int = 16  # virtual nodes per agent for keyed tasks
+    TASK_BATCH_MAX: int = 1000  # tasks per submit, pull or ack call
+
+    # Agent sessions (async server only)
+    SESSION_PING_INTERVAL: float = 15.0  # seconds between WebSocket pings; a missed pong drops the session
+    SESSION_TOUCH_INTERVAL: float = 20.0  # seconds between last_seen refreshes of connected agents
+    SESSION_MAX_FRAME: int = 64 * 1024  # bytes
+    STATUS_PAGE_SIZE: int = 1000  # agents per /status page by default
+    STATUS_MAX_PAGE_SIZE: int = 10000
     
+    # Monitoring
+    METRIC_BUFFER_CAPACITY: int = 65536  # samples kept per metric
+    ROLLUP_WINDOWS: Tuple[int, ...] = (60, 300, 3600)  # seconds
+    HISTOGRAM_RELATIVE_ACCURACY: float = 0.01
+    HISTOGRAM_HISTORY_STEP: int = 60  # seconds per downsampled history slot
+    METRIC_FLUSH_INTERVAL: float = 1.0  # seconds between per-thread buffer merges
+
     # Logging
     LOG_LEVEL: str = 'INFO'
     LOG_FORMAT: str = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
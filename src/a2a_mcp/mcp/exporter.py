@@ -0,0 +1,131 @@
+import os
+import logging
+import tempfile
+import threading
+from typing import Dict, List, Optional, Tuple
+from .monitoring import Sample, monitoring
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+RESPONSE_TIME_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_instruments: Optional[Dict] = None
+_instruments_lock = threading.Lock()
+
+def multiprocess_enabled() -> bool:
+    """Whether metrics are shared between processes through PROMETHEUS_MULTIPROC_DIR"""
+    return bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+def prepare_multiprocess_dir() -> Optional[str]:
+    """Point PROMETHEUS_MULTIPROC_DIR at an empty directory before workers fork
+
+    prometheus_client requires the directory to be wiped between runs, or the
+    files of a previous run's workers are summed into the new one's metrics,
+    so the .db files in a configured directory are removed. Without one a
+    temporary directory is created and returned for the caller to remove on
+    shutdown.
+    """
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            if name.endswith('.db'):
+                os.remove(os.path.join(directory, name))
+        return None
+    directory = tempfile.mkdtemp(prefix='mcp-prometheus-')
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = directory
+    return directory
+
+def _get_instruments() -> Dict:
+    """Create the Prometheus instruments on first use
+
+    prometheus_client picks its single- or multi-process value storage when it
+    is first imported, so the import is deferred until the process (e.g. a
+    gunicorn worker) has its environment in place.
+    """
+    global _instruments
+    if _instruments is None:
+        with _instruments_lock:
+            if _instruments is None:
+                from prometheus_client import Counter, Gauge, Histogram
+                _instruments = {
+                    'agents': Gauge(
+                        'mcp_agents', 'Number of connected agents',
+                        multiprocess_mode='livemax'
+                    ),
+                    'sessions': Gauge(
+                        'mcp_agent_sessions', 'Open agent sessions',
+                        multiprocess_mode='livesum'
+                    ),
+                    'task_depth': Gauge(
+                        'mcp_task_queue_depth', 'Tasks waiting to be pulled',
+                        multiprocess_mode='livesum'
+                    ),
+                    'task_inflight': Gauge(
+                        'mcp_tasks_inflight', 'Tasks pulled but not yet acknowledged',
+                        multiprocess_mode='livesum'
+                    ),
+                    'task_latency': Histogram(
+                        'mcp_task_latency_seconds', 'Time from task submission to acknowledgement'
+                    ),
+                    'errors': Counter('mcp_errors', 'Requests that ended in an error'),
+                    'response_time': Histogram(
+                        'mcp_response_time_milliseconds', 'Response time in ms',
+                        buckets=RESPONSE_TIME_BUCKETS_MS
+                    ),
+                    'requests': Counter(
+                        'mcp_http_requests', 'HTTP requests by endpoint',
+                        ['method', 'endpoint', 'status']
+                    ),
+                    'latency': Histogram(
+                        'mcp_http_request_duration_seconds', 'HTTP request latency by endpoint',
+                        ['method', 'endpoint']
+                    )
+                }
+    return _instruments
+
+def export_samples(samples: List[Sample]):
+    """Mirror a batch of merged monitoring samples into Prometheus instruments"""
+    instruments = _get_instruments()
+    for _, name, value, labels in samples:
+        if name == 'response_time':
+            instruments['response_time'].observe(value)
+            if labels:
+                method, endpoint, status = labels
+                instruments['requests'].labels(method, endpoint, status).inc()
+                instruments['latency'].labels(method, endpoint).observe(value / 1000)
+        elif name == 'error_rate':
+            instruments['errors'].inc(value)
+        elif name == 'agent_count':
+            instruments['agents'].set(value)
+        elif name == 'session_count':
+            instruments['sessions'].set(value)
+        elif name == 'task_queue_depth':
+            instruments['task_depth'].set(value)
+        elif name == 'task_inflight':
+            instruments['task_inflight'].set(value)
+        elif name == 'task_latency':
+            instruments['task_latency'].observe(value / 1000)
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Render the text exposition format, aggregating all workers if multiprocess"""
+    from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest
+    _get_instruments()
+    monitoring.flush()  # Include samples still buffered in this process
+    if multiprocess_enabled():
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+def mark_process_dead(pid: int):
+    """Drop live gauges of an exited worker (gunicorn child_exit hook)"""
+    if multiprocess_enabled():
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid)
+        logger.debug(f"Marked metrics of worker {pid} as dead")
+
+monitoring.add_flush_listener(export_samples)
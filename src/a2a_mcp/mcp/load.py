@@ -0,0 +1,55 @@
+import time
+import threading
+from typing import Callable, Dict
+
+class HeartbeatLoad:
+    """Heartbeat rate of this process and the interval it advises agents to use
+
+    Heartbeats are counted in one-second buckets over the last window seconds.
+    load is the observed rate divided by target_rate; agents are advised to
+    heartbeat every interval * max(1, load) seconds, capped at max_interval so
+    that they still beat comfortably within AGENT_TIMEOUT. The advice is sent
+    back as X-Server-Load and X-Heartbeat-Interval response headers.
+    """
+
+    def __init__(self, target_rate: float, interval: float, max_interval: float, window: int = 10,
+                 clock: Callable[[], float] = time.monotonic):
+        self.target_rate = target_rate
+        self.interval = interval
+        self.max_interval = max_interval
+        self.window = window
+        self.clock = clock
+        self._lock = threading.Lock()
+        # One slot more than the window, so the current second never overwrites the oldest complete one
+        self._seconds = [0] * (window + 1)
+        self._counts = [0] * (window + 1)
+        self._advice_second = -1
+        self._advice: Dict[str, str] = {}
+
+    def record(self, count: int = 1):
+        """Count heartbeats received now"""
+        second = int(self.clock())
+        slot = second % len(self._seconds)
+        with self._lock:
+            if self._seconds[slot] != second:
+                self._seconds[slot] = second
+                self._counts[slot] = 0
+            self._counts[slot] += count
+
+    def rate(self) -> float:
+        """Heartbeats per second over the last complete window"""
+        current = int(self.clock())
+        with self._lock:
+            total = sum(count for second, count in zip(self._seconds, self._counts)
+                        if current - self.window <= second < current)
+        return total / self.window
+
+    def headers(self) -> Dict[str, str]:
+        """Load advice headers, recomputed at most once per second"""
+        second = int(self.clock())
+        if second != self._advice_second:
+            load = self.rate() / self.target_rate
+            interval = min(self.max_interval, self.interval * max(1.0, load))
+            self._advice = {'X-Server-Load': f"{load:.2f}", 'X-Heartbeat-Interval': f"{interval:.1f}"}
+            self._advice_second = second
+        return self._advice
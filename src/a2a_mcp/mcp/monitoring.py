@@ -1,9 +1,14 @@
 import time
 import threading
 import os
-from typing import Dict, List, Optional
+import math
+import weakref
+import functools
+from array import array
+from collections import deque
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple
 from dataclasses import dataclass, field
-from datetime import datetime, timedelta
+from operator import itemgetter
 import logging
 from .config import config
 
@@ -31,65 +36,569 @@ if not logger.handlers:  # Only add handlers if none exist
     
     logger.setLevel(config.LOG_LEVEL)
 
+# (timestamp, metric name, value, labels) as buffered by record_metric
+Sample = Tuple[float, str, float, Optional[Tuple[str, ...]]]
+
 @dataclass
 class MetricPoint:
     timestamp: float
     value: float
 
+class TimeSeriesBuffer:
+    """Fixed-capacity ring buffer of samples stored as parallel timestamp/value arrays"""
+
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._timestamps = array('d', bytes(8 * capacity))
+        self._values = array('d', bytes(8 * capacity))
+        self._head = 0  # Physical index of the oldest sample
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, timestamp: float, value: float):
+        """Append a sample in O(1), overwriting the oldest one when full"""
+        if self._size:
+            # Keep timestamps sorted so window lookups can binary search
+            timestamp = max(timestamp, self._timestamps[(self._head + self._size - 1) % self.capacity])
+        tail = (self._head + self._size) % self.capacity
+        self._timestamps[tail] = timestamp
+        self._values[tail] = value
+        if self._size < self.capacity:
+            self._size += 1
+        else:
+            self._head = (self._head + 1) % self.capacity
+
+    def evict_until(self, cutoff: float):
+        """Drop samples at or before cutoff by advancing the head index"""
+        count = self._first_after(cutoff)
+        if count:
+            self._head = (self._head + count) % self.capacity
+            self._size -= count
+
+    def _first_after(self, cutoff: float) -> int:
+        """Logical index of the first sample newer than cutoff"""
+        lo, hi = 0, self._size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._timestamps[(self._head + mid) % self.capacity] > cutoff:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def _slices(self, data: array, start: int) -> List[array]:
+        """Contiguous slices of data covering logical indices start..size"""
+        if start >= self._size:
+            return []
+        begin = (self._head + start) % self.capacity
+        end = begin + self._size - start
+        if end <= self.capacity:
+            return [data[begin:end]]
+        return [data[begin:], data[:end - self.capacity]]
+
+    def values_since(self, cutoff: float) -> List[array]:
+        """Value slices for samples newer than cutoff"""
+        return self._slices(self._values, self._first_after(cutoff))
+
+    def items_since(self, cutoff: float) -> Iterator[Tuple[float, float]]:
+        """Iterate (timestamp, value) pairs for samples newer than cutoff"""
+        start = self._first_after(cutoff)
+        for timestamps, values in zip(self._slices(self._timestamps, start),
+                                      self._slices(self._values, start)):
+            yield from zip(timestamps, values)
+
+@dataclass
+class RollupBucket:
+    second: int
+    count: int = 0
+    total: float = 0.0
+    minimum: float = float('inf')
+    maximum: float = float('-inf')
+
+class RollupWindow:
+    """Running count/sum/min/max over the most recent one-second buckets"""
+
+    def __init__(self, seconds: int):
+        self.seconds = seconds
+        self.count = 0
+        self.total = 0.0
+        self._buckets: Deque[RollupBucket] = deque()
+        # Monotonic deques of (second, bucket min/max) for closed buckets, at
+        # most one entry per second, so min/max survive expiry in O(1)
+        self._mins: Deque[Tuple[int, float]] = deque()
+        self._maxs: Deque[Tuple[int, float]] = deque()
+
+    def add(self, bucket: RollupBucket, value: float):
+        """Fold a sample that was just added to bucket into the window"""
+        if not self._buckets or self._buckets[-1] is not bucket:
+            if self._buckets:
+                self._close(self._buckets[-1])
+            self._buckets.append(bucket)
+        self.count += 1
+        self.total += value
+        self.expire(bucket.second)
+
+    def _close(self, bucket: RollupBucket):
+        """Fold the min/max of a bucket that will receive no more samples"""
+        while self._mins and self._mins[-1][1] >= bucket.minimum:
+            self._mins.pop()
+        self._mins.append((bucket.second, bucket.minimum))
+        while self._maxs and self._maxs[-1][1] <= bucket.maximum:
+            self._maxs.pop()
+        self._maxs.append((bucket.second, bucket.maximum))
+
+    def expire(self, now_second: int):
+        """Subtract buckets that have slid out of the window"""
+        cutoff = now_second - self.seconds
+        while self._buckets and self._buckets[0].second <= cutoff:
+            bucket = self._buckets.popleft()
+            self.count -= bucket.count
+            self.total -= bucket.total
+        if not self.count:
+            self.total = 0.0  # Drop accumulated float error
+        while self._mins and self._mins[0][0] <= cutoff:
+            self._mins.popleft()
+        while self._maxs and self._maxs[0][0] <= cutoff:
+            self._maxs.popleft()
+
+    def summary(self, now: float) -> Optional[Dict[str, float]]:
+        """Aggregate for the window ending at now, or None if it is empty"""
+        self.expire(int(now))
+        if not self.count:
+            return None
+        # The newest bucket may still be filling, so it is not in the deques yet
+        current = self._buckets[-1]
+        return {
+            'count': self.count,
+            'average': self.total / self.count,
+            'min': min(current.minimum, self._mins[0][1]) if self._mins else current.minimum,
+            'max': max(current.maximum, self._maxs[0][1]) if self._maxs else current.maximum
+        }
+
+class MetricRollups:
+    """Per-second buckets merged incrementally into fixed trailing windows"""
+
+    def __init__(self, windows: Tuple[int, ...]):
+        self.windows = {seconds: RollupWindow(seconds) for seconds in windows}
+        self._current: Optional[RollupBucket] = None
+
+    def add(self, timestamp: float, value: float):
+        """Record a sample in the current bucket and every window"""
+        second = int(timestamp)
+        bucket = self._current
+        if bucket is None or second > bucket.second:
+            bucket = self._current = RollupBucket(second)
+        bucket.count += 1
+        bucket.total += value
+        bucket.minimum = min(bucket.minimum, value)
+        bucket.maximum = max(bucket.maximum, value)
+        for window in self.windows.values():
+            window.add(bucket, value)
+
+    def summary(self, window_seconds: int, now: Optional[float] = None) -> Optional[Dict[str, float]]:
+        """Precomputed aggregate for a configured window"""
+        return self.windows[window_seconds].summary(now or time.time())
+
+def check_finite(value: float):
+    """Reject NaN and infinities, which would poison running sums for a whole window"""
+    if not math.isfinite(value):
+        raise ValueError(f"non-finite value {value!r}")
+
+def window_label(seconds: int) -> str:
+    """Short label for a window length, e.g. 60 -> '1m'"""
+    for unit, size in (('h', 3600), ('m', 60)):
+        if seconds % size == 0:
+            return f"{seconds // size}{unit}"
+    return f"{seconds}s"
+
 @dataclass
 class Metric:
     name: str
     description: str
-    points: List[MetricPoint] = field(default_factory=list)
     retention_period: int = 3600  # 1 hour default retention
+    capacity: int = config.METRIC_BUFFER_CAPACITY
+    rollup_windows: Tuple[int, ...] = config.ROLLUP_WINDOWS
+    buffer: Optional[TimeSeriesBuffer] = field(init=False, repr=False)
+    rollups: MetricRollups = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.buffer = TimeSeriesBuffer(self.capacity)
+        self.rollups = MetricRollups(self.rollup_windows)
+
+    @property
+    def points(self) -> List[MetricPoint]:
+        """Retained data points, oldest first"""
+        return [MetricPoint(t, v) for t, v in self.buffer.items_since(float('-inf'))]
 
-    def add_point(self, value: float):
+    def add_point(self, value: float, timestamp: Optional[float] = None):
         """Add a new data point"""
-        now = time.time()
-        self.points.append(MetricPoint(now, value))
-        self._cleanup_old_points()
+        check_finite(value)
+        now = timestamp or time.time()
+        self.buffer.append(now, value)
+        self.rollups.add(now, value)
+        self._cleanup_old_points(now)
 
-    def _cleanup_old_points(self):
+    def _cleanup_old_points(self, now: Optional[float] = None):
         """Remove points older than retention period"""
-        cutoff = time.time() - self.retention_period
-        self.points = [p for p in self.points if p.timestamp > cutoff]
+        self.buffer.evict_until((now or time.time()) - self.retention_period)
+
+    def get_average(self, window_seconds: int = 300) -> Optional[float]:
+        """Get average value over the last window_seconds"""
+        if window_seconds in self.rollups.windows:
+            summary = self.rollups.summary(window_seconds)
+            return summary['average'] if summary else None
+        chunks = self.buffer.values_since(time.time() - window_seconds)
+        count = sum(len(chunk) for chunk in chunks)
+        return sum(sum(chunk) for chunk in chunks) / count if count else None
+
+    def window_summary(self, window_seconds: int, now: Optional[float] = None) -> Optional[Dict[str, float]]:
+        """Aggregate for one of the configured rollup windows"""
+        return self.rollups.summary(window_seconds, now)
+
+    def history(self, cutoff: float, step: Optional[int] = None) -> List[Dict]:
+        """Raw data points newer than cutoff"""
+        return [
+            {'timestamp': timestamp, 'value': value}
+            for timestamp, value in self.buffer.items_since(cutoff)
+        ]
+
+class LogHistogram:
+    """Mergeable quantile sketch over logarithmically sized buckets
+
+    Bucket boundaries grow by gamma = (1 + a) / (1 - a), so every quantile is
+    reported within relative error a. Values are clamped to
+    [min_value, max_value], which bounds the number of buckets regardless of
+    how many samples are added.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01,
+                 min_value: float = 1e-3, max_value: float = 1e9):
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.max_value = max_value
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.counts: Dict[int, int] = {}
+        self.zero_count = 0  # Samples below min_value
+        self.count = 0
+        self.total = 0.0
+
+    def _key(self, value: float) -> int:
+        return math.ceil(math.log(min(value, self.max_value)) / self._log_gamma)
+
+    def _bucket_value(self, key: int) -> float:
+        """Representative value of a bucket, within relative_accuracy of any member"""
+        return 2 * self._gamma ** key / (self._gamma + 1)
+
+    def add(self, value: float, count: int = 1):
+        """Record value count times"""
+        if value < self.min_value:
+            self.zero_count += count
+        else:
+            key = self._key(value)
+            self.counts[key] = self.counts.get(key, 0) + count
+        self.count += count
+        self.total += value * count
+
+    def merge(self, other: 'LogHistogram'):
+        """Add another sketch's counts into this one"""
+        for key, count in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.total += other.total
+
+    def subtract(self, other: 'LogHistogram'):
+        """Remove counts previously merged from another sketch"""
+        for key, count in other.counts.items():
+            remaining = self.counts.get(key, 0) - count
+            if remaining > 0:
+                self.counts[key] = remaining
+            else:
+                self.counts.pop(key, None)
+        self.zero_count -= other.zero_count
+        self.count -= other.count
+        self.total = self.total - other.total if self.count else 0.0
+
+    def quantiles(self, qs: Tuple[float, ...]) -> List[Optional[float]]:
+        """Estimate several quantiles with a single pass over the buckets"""
+        if not self.count:
+            return [None] * len(qs)
+        keys = sorted(self.counts)
+        results = []
+        index = 0
+        seen = self.zero_count
+        for q in qs:
+            rank = q * (self.count - 1)
+            if rank < self.zero_count:
+                results.append(0.0)
+                continue
+            while index < len(keys) - 1 and seen + self.counts[keys[index]] <= rank:
+                seen += self.counts[keys[index]]
+                index += 1
+            results.append(self._bucket_value(keys[index]))
+        return results
+
+    def to_dict(self) -> Dict:
+        """Bucket counts as [upper_bound, count] pairs in ascending order"""
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'zero_count': self.zero_count,
+            'buckets': [[self._gamma ** key, self.counts[key]] for key in sorted(self.counts)]
+        }
+
+class HistogramWindow:
+    """Running sketch over the most recent one-second sketches"""
+
+    def __init__(self, seconds: int, relative_accuracy: float):
+        self.seconds = seconds
+        self.sketch = LogHistogram(relative_accuracy)
+        self._buckets: Deque[Tuple[int, LogHistogram]] = deque()
+
+    def add(self, second: int, bucket: LogHistogram, value: float):
+        """Fold a sample that was just added to bucket into the window"""
+        if not self._buckets or self._buckets[-1][1] is not bucket:
+            self._buckets.append((second, bucket))
+        self.sketch.add(value)
+        self.expire(second)
+
+    def expire(self, now_second: int):
+        """Subtract per-second sketches that have slid out of the window"""
+        cutoff = now_second - self.seconds
+        while self._buckets and self._buckets[0][0] <= cutoff:
+            self.sketch.subtract(self._buckets.popleft()[1])
+
+@dataclass
+class HistogramMetric(Metric):
+    """Metric kind that keeps per-second quantile sketches instead of raw samples"""
+    relative_accuracy: float = config.HISTOGRAM_RELATIVE_ACCURACY
+    buckets: Deque[Tuple[int, LogHistogram]] = field(init=False, repr=False)
+    windows: Dict[int, HistogramWindow] = field(init=False, repr=False)
+
+    QUANTILES = (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('p999', 0.999))
+
+    def __post_init__(self):
+        self.buffer = None
+        self.rollups = MetricRollups(self.rollup_windows)
+        self.buckets = deque()
+        self.windows = {
+            seconds: HistogramWindow(seconds, self.relative_accuracy)
+            for seconds in self.rollup_windows
+        }
+
+    @property
+    def points(self) -> List[MetricPoint]:
+        """Histograms do not retain individual points"""
+        return []
+
+    def add_point(self, value: float, timestamp: Optional[float] = None):
+        """Add a new sample to the current one-second sketch"""
+        check_finite(value)
+        now = timestamp or time.time()
+        second = int(now)
+        if not self.buckets or second > self.buckets[-1][0]:
+            self.buckets.append((second, LogHistogram(self.relative_accuracy)))
+        bucket = self.buckets[-1][1]
+        bucket.add(value)
+        self.rollups.add(now, value)
+        for window in self.windows.values():
+            window.add(second, bucket, value)
+        self._cleanup_old_points(now)
+
+    def _cleanup_old_points(self, now: Optional[float] = None):
+        """Drop per-second sketches older than retention period"""
+        cutoff = (now or time.time()) - self.retention_period
+        while self.buckets and self.buckets[0][0] <= cutoff:
+            self.buckets.popleft()
+
+    def _merged_since(self, cutoff: float) -> LogHistogram:
+        merged = LogHistogram(self.relative_accuracy)
+        for second, bucket in self.buckets:
+            if second > cutoff:
+                merged.merge(bucket)
+        return merged
 
     def get_average(self, window_seconds: int = 300) -> Optional[float]:
         """Get average value over the last window_seconds"""
-        if not self.points:
+        if window_seconds in self.rollups.windows:
+            return super().get_average(window_seconds)
+        merged = self._merged_since(time.time() - window_seconds)
+        return merged.total / merged.count if merged.count else None
+
+    def window_summary(self, window_seconds: int, now: Optional[float] = None) -> Optional[Dict[str, float]]:
+        """Rollup aggregate plus p50/p90/p99/p999 for a configured window"""
+        now = now or time.time()
+        summary = super().window_summary(window_seconds, now)
+        if summary is None:
             return None
-        cutoff = time.time() - window_seconds
-        recent_points = [p.value for p in self.points if p.timestamp > cutoff]
-        return sum(recent_points) / len(recent_points) if recent_points else None
+        window = self.windows[window_seconds]
+        window.expire(int(now))
+        values = window.sketch.quantiles(tuple(q for _, q in self.QUANTILES))
+        # Bucket midpoints can overshoot the observed extremes; clamp to them
+        summary.update({
+            label: min(max(value, summary['min']), summary['max'])
+            for (label, _), value in zip(self.QUANTILES, values)
+        })
+        return summary
+
+    def history(self, cutoff: float, step: Optional[int] = None) -> List[Dict]:
+        """Bucket counts newer than cutoff, downsampled into step-second slots"""
+        step = max(1, step or config.HISTOGRAM_HISTORY_STEP)
+        slots: Dict[int, LogHistogram] = {}
+        for second, bucket in self.buckets:
+            if second > cutoff:
+                slot = second - second % step
+                if slot not in slots:
+                    slots[slot] = LogHistogram(self.relative_accuracy)
+                slots[slot].merge(bucket)
+        return [dict(timestamp=slot, **sketch.to_dict()) for slot, sketch in slots.items()]
+
+def _reset_after_fork(ref: 'weakref.ref'):
+    system = ref()
+    if system is not None:
+        system._after_fork()
+
+METRIC_KINDS = {
+    'gauge': Metric,
+    'histogram': HistogramMetric
+}
 
 class MonitoringSystem:
-    def __init__(self):
+    def __init__(self, flush_interval: float = config.METRIC_FLUSH_INTERVAL):
         self.metrics: Dict[str, Metric] = {}
         self._lock = threading.Lock()
         self.start_time = time.time()
 
+        # Samples are buffered per thread and merged into metrics by a flusher,
+        # so recording never contends on _lock
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._buffers: List[Tuple[threading.Thread, Deque[Sample]]] = []
+        self._buffers_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+        self._flush_listeners: List[Callable[[List[Sample]], None]] = []
+        self._pending: List[Sample] = []  # Drained but not yet recorded
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=functools.partial(_reset_after_fork, weakref.ref(self)))
+
         # Initialize standard metrics
         self.register_metric('agent_count', 'Number of connected agents')
         self.register_metric('message_rate', 'Messages per second')
         self.register_metric('error_rate', 'Errors per minute')
-        self.register_metric('response_time', 'Average response time in ms')
+        self.register_metric('response_time', 'Response time in ms', kind='histogram')
 
-    def register_metric(self, name: str, description: str, retention_period: int = 3600):
+    def register_metric(self, name: str, description: str, retention_period: int = 3600,
+                        kind: str = 'gauge'):
         """Register a new metric"""
+        if kind not in METRIC_KINDS:
+            raise ValueError(f"Unknown metric kind: {kind}")
         with self._lock:
             if name not in self.metrics:
-                self.metrics[name] = Metric(name, description, retention_period=retention_period)
+                self.metrics[name] = METRIC_KINDS[kind](name, description, retention_period=retention_period)
 
-    def record_metric(self, name: str, value: float):
-        """Record a value for a metric"""
-        with self._lock:
-            if name in self.metrics:
-                self.metrics[name].add_point(value)
-            else:
-                logger.warning(f"Attempted to record unregistered metric: {name}")
+    def _thread_buffer(self) -> Deque[Sample]:
+        """Get the calling thread's sample buffer, registering it on first use"""
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None:
+            buffer = self._local.buffer = deque()
+            with self._buffers_lock:
+                self._buffers.append((threading.current_thread(), buffer))
+                # Started by the first recording thread, in every (forked) process
+                if self._flusher is None or not self._flusher.is_alive():
+                    self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flusher', daemon=True)
+                    self._flusher.start()
+        return buffer
+
+    def _after_fork(self):
+        """Start over with empty buffers in a forked child
+
+        Samples buffered before the fork belong to the parent, which flushes
+        them itself, and the parent's flusher thread does not exist here. The
+        fresh thread-local makes the next record_metric register a buffer and
+        start a flusher for this process. Locks are replaced in case another
+        parent thread held one at the moment of the fork.
+        """
+        self._lock = threading.Lock()
+        self._buffers_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._local = threading.local()
+        self._buffers = []
+        self._pending = []
+        self._flusher = None
+
+    def record_metric(self, name: str, value: float, labels: Optional[Tuple[str, ...]] = None):
+        """Record a value for a metric
+
+        labels are not aggregated by the metric store; they are passed through
+        to flush listeners such as the Prometheus exporter.
+        """
+        # deque.append is atomic, so the hot path takes no shared lock
+        self._thread_buffer().append((time.time(), name, value, labels))
+
+    def add_flush_listener(self, listener: Callable[[List[Sample]], None]):
+        """Call listener with every batch of samples accepted by flush()"""
+        self._flush_listeners.append(listener)
+
+    def flush(self):
+        """Merge all per-thread buffers into the metric store"""
+        with self._flush_lock:
+            with self._buffers_lock:
+                buffers = self._buffers
+                self._buffers = [(thread, buffer) for thread, buffer in buffers
+                                 if thread.is_alive() or buffer]
+
+            # Samples stay in _pending until they are in the store, so a flush
+            # that fails part way is retried instead of losing them
+            samples = self._pending
+            for _, buffer in buffers:
+                while buffer:
+                    samples.append(buffer.popleft())
+            if not samples:
+                return
+            samples.sort(key=itemgetter(0))
+
+            accepted = []
+            with self._lock:
+                for sample in samples:
+                    timestamp, name, value, _ = sample
+                    metric = self.metrics.get(name)
+                    if metric is None:
+                        logger.warning(f"Attempted to record unregistered metric: {name}")
+                        continue
+                    try:
+                        metric.add_point(value, timestamp)
+                    except Exception as e:
+                        logger.error(f"Dropping sample {value!r} of {name}: {e}")
+                        continue
+                    accepted.append(sample)
+            self._pending = []
+            if not accepted:
+                return
+
+            for listener in self._flush_listeners:
+                try:
+                    listener(accepted)
+                except Exception as e:
+                    logger.error(f"Metric flush listener error: {e}")
+
+    def _flush_loop(self):
+        """Periodically merge per-thread buffers in the background"""
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Metric flush error: {e}")
 
     def get_system_health(self) -> Dict:
         """Get overall system health status"""
+        self.flush()
         with self._lock:
             health = {
                 'status': 'healthy',
@@ -97,12 +606,17 @@ class MonitoringSystem:
                 'metrics': {}
             }
 
+            now = time.time()
             for name, metric in self.metrics.items():
                 avg = metric.get_average()
                 if avg is not None:
                     health['metrics'][name] = {
                         'current': avg,
-                        'description': metric.description
+                        'description': metric.description,
+                        'windows': {
+                            window_label(seconds): metric.window_summary(seconds, now)
+                            for seconds in metric.rollups.windows
+                        }
                     }
 
             # Determine system health based on metrics
@@ -116,19 +630,15 @@ class MonitoringSystem:
 
             return health
 
-    def get_metric_history(self, name: str, window_seconds: int = 3600) -> List[Dict]:
+    def get_metric_history(self, name: str, window_seconds: int = 3600,
+                           step: Optional[int] = None) -> List[Dict]:
         """Get historical data for a metric"""
+        self.flush()
         with self._lock:
             if name not in self.metrics:
                 return []
             
-            metric = self.metrics[name]
-            cutoff = time.time() - window_seconds
-            return [
-                {'timestamp': p.timestamp, 'value': p.value}
-                for p in metric.points
-                if p.timestamp > cutoff
-            ]
+            return self.metrics[name].history(time.time() - window_seconds, step)
 
 # Global monitoring instance
 monitoring = MonitoringSystem() 
\ No newline at end of file
@@ -0,0 +1,397 @@
+import sys
+import time
+import heapq
+import bisect
+import sqlite3
+import threading
+import logging
+import itertools
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, replace
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from .storage import SQLiteDatabase
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class AgentData:
+    """Compact per-agent record; last_seen is a time.monotonic() value"""
+    __slots__ = ('last_seen', 'status', 'host', 'port')
+    last_seen: float
+    status: str
+    host: Optional[str]
+    port: Optional[int]
+
+    def __post_init__(self):
+        # Agents report a handful of distinct statuses; share one string each
+        self.status = sys.intern(self.status)
+
+    @property
+    def address(self) -> Tuple[Optional[str], Optional[int]]:
+        return (self.host, self.port)
+
+def monotonic_to_wall(timestamp: float) -> float:
+    """Convert a time.monotonic() value to a Unix timestamp"""
+    return time.time() - (time.monotonic() - timestamp)
+
+def wall_to_monotonic(timestamp: float) -> float:
+    """Convert a Unix timestamp to the time.monotonic() clock"""
+    return time.monotonic() - (time.time() - timestamp)
+
+def monotonic_to_iso(timestamp: float, offset: Optional[float] = None) -> str:
+    """ISO 8601 local time for a time.monotonic() value
+
+    offset (time.time() - time.monotonic()) can be computed once and passed in
+    when formatting many timestamps.
+    """
+    if offset is None:
+        offset = time.time() - time.monotonic()
+    return datetime.fromtimestamp(timestamp + offset).isoformat()
+
+class AgentRegistry(ABC):
+    """Storage backend for registered agents
+
+    Every method is atomic with respect to the others, so callers never need
+    to hold a lock of their own. An agent expires agent_timeout seconds
+    after its last_seen time.
+    """
+
+    def __init__(self, agent_timeout: float):
+        self.agent_timeout = agent_timeout
+
+    @abstractmethod
+    def add(self, agent_id: str, data: AgentData, max_agents: int) -> bool:
+        """Store an agent unless the registry already holds max_agents"""
+
+    @abstractmethod
+    def touch(self, agent_id: str, status: Optional[str] = None) -> bool:
+        """Record a heartbeat now, returning False for unknown agents"""
+
+    @abstractmethod
+    def touch_many(self, updates: List[Tuple[str, Optional[str]]]) -> List[bool]:
+        """Apply a batch of (agent_id, status) heartbeats in one atomic step"""
+
+    @abstractmethod
+    def remove(self, agent_id: str) -> bool:
+        """Delete an agent, returning False if it was not registered"""
+
+    @abstractmethod
+    def items(self) -> List[Tuple[str, AgentData]]:
+        """Snapshot of all (agent_id, data) pairs"""
+
+    @abstractmethod
+    def page(self, after: Optional[str], limit: int, status: Optional[str] = None,
+             seen_after: Optional[float] = None,
+             seen_before: Optional[float] = None) -> List[Tuple[str, AgentData]]:
+        """Up to limit agents with ids greater than after, in id order
+
+        Optional filters match an exact status and a monotonic last_seen range.
+        """
+
+    @abstractmethod
+    def expire(self, limit: int) -> List[str]:
+        """Remove up to limit agents whose deadline has passed, returning their ids"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    def __contains__(self, agent_id: str) -> bool:
+        return self.get(agent_id) is not None
+
+    @abstractmethod
+    def get(self, agent_id: str) -> Optional[AgentData]:
+        """Copy of one agent's data"""
+
+class MemoryRegistry(AgentRegistry):
+    """Per-process registry backed by a dict (the default)
+
+    Expiry uses a lazy-deletion min-heap of monotonic deadlines: a heartbeat
+    pushes a new entry and leaves the old one in place, and entries that no
+    longer match the agent's last_seen are skipped when they reach the top.
+    """
+
+    def __init__(self, agent_timeout: float):
+        super().__init__(agent_timeout)
+        self._lock = threading.Lock()
+        self._agents: Dict[str, AgentData] = {}
+        self._expiry_heap: List[Tuple[float, str]] = []
+        # Sorted ids for paging, rebuilt lazily after registrations/removals
+        self._ordered_ids: List[str] = []
+        self._membership_version = 0
+        self._ordered_version = 0
+
+    def _schedule(self, agent_id: str, agent: AgentData):
+        heapq.heappush(self._expiry_heap, (agent.last_seen + self.agent_timeout, agent_id))
+        # Rebuild when stale entries dominate so the heap stays O(agents)
+        if len(self._expiry_heap) > 2 * len(self._agents) + 1024:
+            self._expiry_heap = [
+                (agent.last_seen + self.agent_timeout, agent_id)
+                for agent_id, agent in self._agents.items()
+            ]
+            heapq.heapify(self._expiry_heap)
+
+    def add(self, agent_id: str, data: AgentData, max_agents: int) -> bool:
+        with self._lock:
+            if len(self._agents) >= max_agents:
+                return False
+            if agent_id not in self._agents:
+                self._membership_version += 1
+            self._agents[agent_id] = data
+            self._schedule(agent_id, data)
+            return True
+
+    def touch(self, agent_id: str, status: Optional[str] = None) -> bool:
+        return self.touch_many([(agent_id, status)])[0]
+
+    def touch_many(self, updates: List[Tuple[str, Optional[str]]]) -> List[bool]:
+        results = []
+        with self._lock:
+            now = time.monotonic()
+            for agent_id, status in updates:
+                agent = self._agents.get(agent_id)
+                if agent is None:
+                    results.append(False)
+                    continue
+                agent.last_seen = now
+                if status is not None:
+                    agent.status = sys.intern(status)
+                self._schedule(agent_id, agent)
+                results.append(True)
+        return results
+
+    def remove(self, agent_id: str) -> bool:
+        with self._lock:
+            self._membership_version += 1
+            return self._agents.pop(agent_id, None) is not None
+
+    def expire(self, limit: int) -> List[str]:
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            while self._expiry_heap and len(expired) < limit:
+                deadline, agent_id = self._expiry_heap[0]
+                if deadline > now:
+                    break
+                heapq.heappop(self._expiry_heap)
+                agent = self._agents.get(agent_id)
+                if agent is not None and agent.last_seen + self.agent_timeout == deadline:
+                    del self._agents[agent_id]
+                    expired.append(agent_id)
+            if expired:
+                self._membership_version += 1
+        return expired
+
+    def _sorted_ids(self) -> List[str]:
+        """Sorted agent ids, sorting outside the lock when membership changed"""
+        with self._lock:
+            if self._ordered_version == self._membership_version:
+                return self._ordered_ids
+            version = self._membership_version
+            ids = list(self._agents)
+        ids.sort()
+        with self._lock:
+            if version >= self._ordered_version:
+                self._ordered_ids = ids
+                self._ordered_version = version
+        return ids
+
+    def page(self, after: Optional[str], limit: int, status: Optional[str] = None,
+             seen_after: Optional[float] = None,
+             seen_before: Optional[float] = None) -> List[Tuple[str, AgentData]]:
+        ids = self._sorted_ids()
+        start = bisect.bisect_right(ids, after) if after is not None else 0
+        result = []
+        # Single dict lookups are atomic, so the scan itself runs without the lock
+        for agent_id in itertools.islice(ids, start, None):
+            agent = self._agents.get(agent_id)
+            if agent is None:
+                continue
+            agent = replace(agent)
+            if status is not None and agent.status != status:
+                continue
+            if seen_after is not None and agent.last_seen < seen_after:
+                continue
+            if seen_before is not None and agent.last_seen > seen_before:
+                continue
+            result.append((agent_id, agent))
+            if len(result) >= limit:
+                break
+        return result
+
+    def get(self, agent_id: str) -> Optional[AgentData]:
+        with self._lock:
+            agent = self._agents.get(agent_id)
+            return replace(agent) if agent is not None else None
+
+    def items(self) -> List[Tuple[str, AgentData]]:
+        with self._lock:
+            pairs = list(self._agents.items())
+        return [(agent_id, replace(agent)) for agent_id, agent in pairs]
+
+    def __len__(self) -> int:
+        return len(self._agents)
+
+class SQLiteRegistry(AgentRegistry):
+    """Registry shared by every process that opens the same SQLite file
+
+    See SQLiteDatabase for how connections are shared. last_seen is stored as
+    a Unix timestamp because the file outlives any one process's monotonic
+    clock; it is converted at the API boundary.
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS agents (
+            agent_id TEXT PRIMARY KEY,
+            last_seen REAL NOT NULL,
+            status TEXT NOT NULL,
+            host TEXT,
+            port INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS agents_last_seen ON agents (last_seen);
+        CREATE TABLE IF NOT EXISTS agent_count (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            total INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO agent_count (id, total) VALUES (0, 0);
+        CREATE TRIGGER IF NOT EXISTS agents_insert AFTER INSERT ON agents
+            BEGIN UPDATE agent_count SET total = total + 1 WHERE id = 0; END;
+        CREATE TRIGGER IF NOT EXISTS agents_delete AFTER DELETE ON agents
+            BEGIN UPDATE agent_count SET total = total - 1 WHERE id = 0; END;
+    '''
+
+    def __init__(self, path: str, agent_timeout: float, timeout: float = 5.0):
+        super().__init__(agent_timeout)
+        self.path = path
+        self._db = SQLiteDatabase(path, timeout)
+        self._connection().executescript(self.SCHEMA)
+        logger.info(f"Using shared SQLite agent registry at {path}")
+
+    def _connection(self) -> sqlite3.Connection:
+        return self._db.connection()
+
+    @staticmethod
+    def _row_to_agent(row) -> AgentData:
+        last_seen, status, host, port = row
+        return AgentData(wall_to_monotonic(last_seen), status, host, port)
+
+    def add(self, agent_id: str, data: AgentData, max_agents: int) -> bool:
+        conn = self._connection()
+        # IMMEDIATE takes the write lock up front so the limit check cannot race
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            (total,) = conn.execute('SELECT total FROM agent_count WHERE id = 0').fetchone()
+            if total >= max_agents:
+                conn.execute('ROLLBACK')
+                return False
+            conn.execute(
+                'INSERT INTO agents (agent_id, last_seen, status, host, port) '
+                'VALUES (?, ?, ?, ?, ?) '
+                # An upsert (unlike OR REPLACE) keeps the count triggers accurate
+                'ON CONFLICT (agent_id) DO UPDATE SET last_seen = excluded.last_seen, '
+                'status = excluded.status, host = excluded.host, port = excluded.port',
+                (agent_id, monotonic_to_wall(data.last_seen), data.status, data.host, data.port)
+            )
+            conn.execute('COMMIT')
+            return True
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def touch(self, agent_id: str, status: Optional[str] = None) -> bool:
+        cursor = self._connection().execute(
+            'UPDATE agents SET last_seen = ?, status = COALESCE(?, status) WHERE agent_id = ?',
+            (time.time(), status, agent_id)
+        )
+        return cursor.rowcount > 0
+
+    def touch_many(self, updates: List[Tuple[str, Optional[str]]]) -> List[bool]:
+        conn = self._connection()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            results = [
+                conn.execute(
+                    'UPDATE agents SET last_seen = ?, status = COALESCE(?, status) WHERE agent_id = ?',
+                    (now, status, agent_id)
+                ).rowcount > 0
+                for agent_id, status in updates
+            ]
+            conn.execute('COMMIT')
+            return results
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def remove(self, agent_id: str) -> bool:
+        cursor = self._connection().execute('DELETE FROM agents WHERE agent_id = ?', (agent_id,))
+        return cursor.rowcount > 0
+
+    def expire(self, limit: int) -> List[str]:
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            expired = [row[0] for row in conn.execute(
+                'SELECT agent_id FROM agents WHERE last_seen <= ? ORDER BY last_seen LIMIT ?',
+                (time.time() - self.agent_timeout, limit)
+            )]
+            conn.executemany('DELETE FROM agents WHERE agent_id = ?', [(agent_id,) for agent_id in expired])
+            conn.execute('COMMIT')
+            return expired
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def get(self, agent_id: str) -> Optional[AgentData]:
+        row = self._connection().execute(
+            'SELECT last_seen, status, host, port FROM agents WHERE agent_id = ?',
+            (agent_id,)
+        ).fetchone()
+        return self._row_to_agent(row) if row else None
+
+    def page(self, after: Optional[str], limit: int, status: Optional[str] = None,
+             seen_after: Optional[float] = None,
+             seen_before: Optional[float] = None) -> List[Tuple[str, AgentData]]:
+        clauses, params = [], []
+        if after is not None:
+            clauses.append('agent_id > ?')
+            params.append(after)
+        if status is not None:
+            clauses.append('status = ?')
+            params.append(status)
+        if seen_after is not None:
+            clauses.append('last_seen >= ?')
+            params.append(monotonic_to_wall(seen_after))
+        if seen_before is not None:
+            clauses.append('last_seen <= ?')
+            params.append(monotonic_to_wall(seen_before))
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ''
+        rows = self._connection().execute(
+            f'SELECT agent_id, last_seen, status, host, port FROM agents {where}ORDER BY agent_id LIMIT ?',
+            params + [limit]
+        ).fetchall()
+        return [(row[0], self._row_to_agent(row[1:])) for row in rows]
+
+    def items(self) -> List[Tuple[str, AgentData]]:
+        rows = self._connection().execute(
+            'SELECT agent_id, last_seen, status, host, port FROM agents'
+        ).fetchall()
+        return [(row[0], self._row_to_agent(row[1:])) for row in rows]
+
+    def __len__(self) -> int:
+        (total,) = self._connection().execute('SELECT total FROM agent_count WHERE id = 0').fetchone()
+        return total
+
+REGISTRY_BACKENDS = ('memory', 'sqlite')
+
+def create_registry(backend: str = 'memory', path: Optional[str] = None,
+                    agent_timeout: float = 60) -> AgentRegistry:
+    """Build the agent registry for the configured backend"""
+    if backend == 'memory':
+        return MemoryRegistry(agent_timeout)
+    if backend == 'sqlite':
+        if not path:
+            raise ValueError("The sqlite registry backend requires a database path")
+        return SQLiteRegistry(path, agent_timeout)
+    raise ValueError(f"Unknown registry backend: {backend}")
@@ -0,0 +1,211 @@
+import time
+import heapq
+import hashlib
+import sqlite3
+import threading
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+from ..bloom import BloomFilter
+from .storage import SQLiteDatabase
+
+logger = logging.getLogger(__name__)
+
+def revocation_key(value: str) -> bytes:
+    """Compact fixed-size key for a token or jti"""
+    return hashlib.sha256(value.encode()).digest()[:16]
+
+class RevocationStore(ABC):
+    """Backing store of revoked keys with their expiry times"""
+
+    @abstractmethod
+    def revoke(self, key: bytes, expires_at: float):
+        """Record key as revoked until expires_at (Unix time)"""
+
+    @abstractmethod
+    def contains(self, key: bytes, now: float) -> bool:
+        """Whether key is revoked and not yet expired"""
+
+    @abstractmethod
+    def purge(self, now: float) -> int:
+        """Drop expired revocations, returning how many were removed"""
+
+    @abstractmethod
+    def keys(self) -> List[bytes]:
+        """All live revoked keys"""
+
+    def changes_since(self, cursor: int) -> Tuple[List[bytes], int]:
+        """Keys revoked by other processes after cursor, and the new cursor"""
+        return [], cursor
+
+class MemoryRevocationStore(RevocationStore):
+    """Per-process revocations with a min-heap of expiry deadlines"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._expiry: Dict[bytes, float] = {}
+        self._heap: List[Tuple[float, bytes]] = []
+
+    def revoke(self, key: bytes, expires_at: float):
+        with self._lock:
+            if expires_at > self._expiry.get(key, 0):
+                self._expiry[key] = expires_at
+                heapq.heappush(self._heap, (expires_at, key))
+
+    def contains(self, key: bytes, now: float) -> bool:
+        return self._expiry.get(key, 0) > now
+
+    def purge(self, now: float) -> int:
+        removed = 0
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                expires_at, key = heapq.heappop(self._heap)
+                # Skip entries superseded by a later revocation of the same key
+                if self._expiry.get(key) == expires_at:
+                    del self._expiry[key]
+                    removed += 1
+        return removed
+
+    def keys(self) -> List[bytes]:
+        with self._lock:
+            return list(self._expiry)
+
+class SQLiteRevocationStore(RevocationStore):
+    """Revocations shared by every process that opens the same SQLite file"""
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS revocations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            key BLOB NOT NULL UNIQUE,
+            expires_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS revocations_expires_at ON revocations (expires_at);
+    '''
+
+    def __init__(self, path: str, timeout: float = 5.0):
+        self.path = path
+        self._db = SQLiteDatabase(path, timeout)
+        self._connection().executescript(self.SCHEMA)
+        logger.info(f"Using shared SQLite revocation store at {path}")
+
+    def _connection(self) -> sqlite3.Connection:
+        return self._db.connection()
+
+    def revoke(self, key: bytes, expires_at: float):
+        self._connection().execute(
+            'INSERT INTO revocations (key, expires_at) VALUES (?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET expires_at = MAX(expires_at, excluded.expires_at)',
+            (key, expires_at)
+        )
+
+    def contains(self, key: bytes, now: float) -> bool:
+        row = self._connection().execute(
+            'SELECT 1 FROM revocations WHERE key = ? AND expires_at > ?', (key, now)
+        ).fetchone()
+        return row is not None
+
+    def purge(self, now: float) -> int:
+        cursor = self._connection().execute('DELETE FROM revocations WHERE expires_at <= ?', (now,))
+        return cursor.rowcount
+
+    def keys(self) -> List[bytes]:
+        return [row[0] for row in self._connection().execute('SELECT key FROM revocations')]
+
+    def changes_since(self, cursor: int) -> Tuple[List[bytes], int]:
+        rows = self._connection().execute(
+            'SELECT id, key FROM revocations WHERE id > ? ORDER BY id', (cursor,)
+        ).fetchall()
+        return [row[1] for row in rows], (rows[-1][0] if rows else cursor)
+
+class RevocationList:
+    """Token revocation check with a Bloom filter in front of the store
+
+    The common not-revoked lookup is answered from the local Bloom filter
+    without any I/O; only filter hits consult the store. A background thread
+    adds revocations made by other processes to the filter every
+    sync_interval seconds, and every purge_interval seconds drops expired
+    entries and rebuilds the filter. The thread is started on first use, so
+    each forked worker runs its own.
+    """
+
+    def __init__(self, store: RevocationStore, bloom_capacity: int = 100000,
+                 false_positive_rate: float = 0.001, sync_interval: float = 1.0,
+                 purge_interval: float = 60.0):
+        self.store = store
+        self.bloom_capacity = bloom_capacity
+        self.false_positive_rate = false_positive_rate
+        self.sync_interval = sync_interval
+        self.purge_interval = purge_interval
+        self._write_lock = threading.Lock()
+        self._bloom = BloomFilter(bloom_capacity, false_positive_rate)
+        self._cursor = 0
+        self._next_purge = time.time() + purge_interval
+        self._syncer: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._rebuild(time.time())
+
+    def _rebuild(self, now: float):
+        """Replace the filter with one holding only live revocations"""
+        self.store.purge(now)
+        _, self._cursor = self.store.changes_since(self._cursor)
+        keys = self.store.keys()
+        bloom = BloomFilter(max(self.bloom_capacity, 2 * len(keys)), self.false_positive_rate)
+        for key in keys:
+            bloom.add(key)
+        self._bloom = bloom
+
+    def sync(self, now: Optional[float] = None):
+        """Add remote revocations to the filter, purging expired ones when due"""
+        now = now or time.time()
+        with self._write_lock:
+            if now >= self._next_purge:
+                self._rebuild(now)
+                self._next_purge = now + self.purge_interval
+            else:
+                keys, self._cursor = self.store.changes_since(self._cursor)
+                for key in keys:
+                    self._bloom.add(key)
+                if self._bloom.count > self._bloom.capacity:
+                    self._rebuild(now)
+
+    def _sync_loop(self):
+        while not self._stopped.wait(self.sync_interval):
+            try:
+                self.sync()
+            except Exception as e:
+                logger.error(f"Revocation sync error: {e}")
+
+    def _ensure_syncing(self):
+        # Not alive in a forked child either, where the parent's thread is gone
+        if self._syncer is None or not self._syncer.is_alive():
+            with self._write_lock:
+                if (self._syncer is None or not self._syncer.is_alive()) and not self._stopped.is_set():
+                    self._syncer = threading.Thread(target=self._sync_loop, name='revocation-sync', daemon=True)
+                    self._syncer.start()
+
+    def close(self):
+        """Stop the background sync"""
+        self._stopped.set()
+
+    def revoke(self, key: bytes, expires_at: float):
+        """Revoke key until expires_at (Unix time)"""
+        self.store.revoke(key, expires_at)
+        with self._write_lock:
+            self._bloom.add(key)
+
+    def is_revoked(self, key: bytes) -> bool:
+        """Whether key is currently revoked"""
+        self._ensure_syncing()
+        if key not in self._bloom:
+            return False
+        return self.store.contains(key, time.time())
+
+def create_revocation_list(backend: str = 'memory', path: Optional[str] = None, **options) -> RevocationList:
+    """Build the revocation list for the configured backend"""
+    if backend == 'memory':
+        return RevocationList(MemoryRevocationStore(), **options)
+    if backend == 'sqlite':
+        if not path:
+            raise ValueError("The sqlite revocation backend requires a database path")
+        return RevocationList(SQLiteRevocationStore(path), **options)
+    raise ValueError(f"Unknown revocation backend: {backend}")
@@ -1,11 +1,17 @@
 import os
 import jwt
+import time
 import hashlib
+import hmac
 import logging
+import threading
+import uuid
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 from cryptography.fernet import Fernet
 from .config import config
+from .revocation import RevocationList, create_revocation_list, revocation_key
 
 # Create logs directory if it doesn't exist
 if config.LOG_FILE:
@@ -31,39 +37,109 @@ if not logger.handlers:  # Only add handlers if none exist
     
     logger.setLevel(config.LOG_LEVEL)
 
+class TokenCache:
+    """Bounded LRU cache of verified token claims, keyed by a token digest
+
+    Entries live until the token's exp claim or ttl seconds, whichever comes
+    first, so a cached token never outlives its signature's validity.
+    """
+
+    def __init__(self, max_size: int = 100000, ttl: float = 300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: 'OrderedDict[bytes, Tuple[Dict[str, Any], float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """Cached claims for token, or None on a miss"""
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > time.time():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, token: str, payload: Dict[str, Any]):
+        """Cache verified claims until exp or ttl"""
+        expires_at = min(payload.get('exp', float('inf')), time.time() + self.ttl)
+        with self._lock:
+            self._entries[self._key(token)] = (payload, expires_at)
+            self._entries.move_to_end(self._key(token))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, token: str):
+        """Drop a token so its next use is verified from scratch"""
+        with self._lock:
+            self._entries.pop(self._key(token), None)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and current size"""
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
 class SecurityManager:
     def __init__(self):
         # Generate or load encryption key
         self._encryption_key = os.environ.get('MCP_ENCRYPTION_KEY', Fernet.generate_key())
         self.fernet = Fernet(self._encryption_key)
-        self._token_blacklist: Dict[str, datetime] = {}
+        self.revocations: RevocationList = self._create_revocations(config.REVOCATION_BACKEND, config.REVOCATION_PATH)
+        self.token_cache = TokenCache(config.TOKEN_CACHE_SIZE, config.TOKEN_CACHE_TTL)
         logger.info("Security manager initialized with encryption key")
 
-    def generate_token(self, agent_id: str, expires_in: int = 3600) -> str:
-        """Generate JWT token for agent authentication"""
+    @staticmethod
+    def _create_revocations(backend: str, path: Optional[str]) -> RevocationList:
+        return create_revocation_list(
+            backend, path,
+            bloom_capacity=config.REVOCATION_BLOOM_CAPACITY,
+            false_positive_rate=config.REVOCATION_BLOOM_FP_RATE,
+            sync_interval=config.REVOCATION_SYNC_INTERVAL
+        )
+
+    def configure_revocations(self, backend: str, path: Optional[str] = None):
+        """Swap the revocation store, e.g. to share it between gunicorn workers"""
+        previous = self.revocations
+        self.revocations = self._create_revocations(backend, path)
+        previous.close()
+
+    def generate_token(self, agent_id: str, expires_in: int = 3600, token_type: str = 'agent_auth') -> str:
+        """Generate JWT token for agent (or gateway) authentication"""
         payload = {
             'agent_id': agent_id,
             'exp': datetime.utcnow() + timedelta(seconds=expires_in),
             'iat': datetime.utcnow(),
-            'type': 'agent_auth'
+            'type': token_type,
+            'jti': uuid.uuid4().hex
         }
         token = jwt.encode(payload, config.JWT_SECRET_KEY, algorithm='HS256')
         logger.debug(f"Generated token for agent {agent_id}")
         return token
 
-    def validate_token(self, token: str) -> Optional[Dict[str, Any]]:
+    def validate_token(self, token: str, token_type: str = 'agent_auth') -> Optional[Dict[str, Any]]:
         """Validate JWT token and return payload if valid"""
         try:
-            if token in self._token_blacklist:
-                if datetime.utcnow() > self._token_blacklist[token]:
-                    del self._token_blacklist[token]
-                    logger.debug("Removed expired token from blacklist")
-                else:
-                    logger.warning("Attempt to use blacklisted token")
-                    return None
-
-            payload = jwt.decode(token, config.JWT_SECRET_KEY, algorithms=['HS256'])
-            if payload.get('type') != 'agent_auth':
+            payload = self.token_cache.get(token)
+            if payload is None:
+                payload = jwt.decode(token, config.JWT_SECRET_KEY, algorithms=['HS256'])
+                self.token_cache.put(token, payload)
+
+            # Revocations are keyed by jti, or by the token itself when it has none
+            jti = payload.get('jti')
+            if self.revocations.is_revoked(revocation_key(jti or token)):
+                logger.warning("Attempt to use blacklisted token")
+                return None
+
+            if payload.get('type') != token_type:
                 logger.warning("Invalid token type")
                 return None
             return payload
@@ -76,7 +152,16 @@ class SecurityManager:
 
     def blacklist_token(self, token: str, expires_in: int = 3600):
         """Add token to blacklist"""
-        self._token_blacklist[token] = datetime.utcnow() + timedelta(seconds=expires_in)
+        expires_at = time.time() + expires_in
+        try:
+            # Only used to key the revocation; the token may already be invalid
+            claims = jwt.decode(token, options={'verify_signature': False, 'verify_exp': False})
+        except jwt.InvalidTokenError:
+            claims = {}
+        if 'exp' in claims:
+            expires_at = min(expires_at, claims['exp'])  # Useless after exp anyway
+        self.revocations.revoke(revocation_key(claims.get('jti') or token), expires_at)
+        self.token_cache.invalidate(token)
         logger.info(f"Token blacklisted for {expires_in} seconds")
 
     def encrypt_message(self, message: str) -> bytes:
@@ -103,6 +188,16 @@ class SecurityManager:
         logger.info(f"Generated new API key for agent {agent_id}")
         return api_key
 
+    def validate_gateway_key(self, gateway_id: str, gateway_key: str) -> bool:
+        """Validate a gateway's shared key; gateways are disabled without one"""
+        if not config.GATEWAY_KEY:
+            logger.warning(f"Gateway {gateway_id} rejected: no gateway key configured")
+            return False
+        valid = hmac.compare_digest(gateway_key.encode(), config.GATEWAY_KEY.encode())
+        if not valid:
+            logger.warning(f"Invalid gateway key for gateway {gateway_id}")
+        return valid
+
     def validate_api_key(self, agent_id: str, api_key: str) -> bool:
         """Validate an agent's API key"""
         valid = len(api_key) == 64 and all(c in '0123456789abcdef' for c in api_key.lower())
@@ -1,19 +1,23 @@
 import time
+import json
 import threading
 import logging
 import os
-from typing import Dict, Any
-from dataclasses import dataclass
-from datetime import datetime
+from typing import Dict, Any, Optional, Tuple
 from functools import wraps
-from flask import Flask, request, jsonify, render_template_string, g
-from flask_jwt_extended import JWTManager, jwt_required, get_jwt_identity
+from flask import Flask, Response, request, jsonify, render_template_string, g
+from flask_jwt_extended import JWTManager
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-from marshmallow import Schema, fields, ValidationError
+from marshmallow import Schema, fields, validate, ValidationError
 from .config import config
 from .security import security_manager
 from .monitoring import monitoring
+from .exporter import render_metrics
+from .registry import AgentData, AgentRegistry, MemoryRegistry, create_registry, monotonic_to_iso
+from .snapshot import RegistrySnapshotter
+from .tasks import QueueFull, Task, TaskQueue
+from .load import HeartbeatLoad
 
 # Create logs directory if it doesn't exist
 if config.LOG_FILE:
@@ -61,32 +65,103 @@ limiter = Limiter(
     storage_uri="memory://"  # Explicitly set memory storage
 )
 
-@dataclass
-class AgentData:
-    last_seen: str
-    status: str
-    address: tuple
-    api_key: str
-
 # Validation schemas
 class RegisterSchema(Schema):
-    agent_id = fields.Str(required=True)
+    agent_id = fields.Str(required=True, validate=validate.Length(max=config.AGENT_ID_MAX_LENGTH))
     api_key = fields.Str(required=True)
 
 class HeartbeatSchema(Schema):
-    status = fields.Str(required=False)
+    status = fields.Str(required=False, validate=validate.Length(max=config.STATUS_MAX_LENGTH))
+
+class GatewayRegisterSchema(Schema):
+    gateway_id = fields.Str(required=True)
+    gateway_key = fields.Str(required=True)
+
+class BatchHeartbeatEntrySchema(Schema):
+    agent_id = fields.Str(required=True, validate=validate.Length(max=config.AGENT_ID_MAX_LENGTH))
+    status = fields.Str(required=False, validate=validate.Length(max=config.STATUS_MAX_LENGTH))
+
+class BatchHeartbeatSchema(Schema):
+    heartbeats = fields.List(fields.Dict(), required=True,
+                             validate=validate.Length(min=1, max=config.BATCH_HEARTBEAT_MAX))
+
+class TaskEntrySchema(Schema):
+    payload = fields.Raw(required=True, allow_none=True)
+    key = fields.Str(required=False)  # routes tasks with the same key to the same agent
+
+class TaskSubmitSchema(Schema):
+    tasks = fields.List(fields.Nested(TaskEntrySchema), required=True,
+                        validate=validate.Length(min=1, max=config.TASK_BATCH_MAX))
+
+class TaskPullSchema(Schema):
+    max_tasks = fields.Int(required=False, validate=validate.Range(min=1, max=config.TASK_BATCH_MAX))
+    visibility_timeout = fields.Float(required=False,
+                                      validate=validate.Range(min=1, max=config.TASK_MAX_VISIBILITY_TIMEOUT))
+
+class TaskAckSchema(Schema):
+    task_ids = fields.List(fields.Str(), required=True,
+                           validate=validate.Length(min=1, max=config.TASK_BATCH_MAX))
+
+# Agent storage (in-memory by default, see configure_registry)
+agents: AgentRegistry = create_registry(config.REGISTRY_BACKEND, config.REGISTRY_PATH, config.AGENT_TIMEOUT)
+
+snapshotter: Optional[RegistrySnapshotter] = None
+
+# Heartbeat rate of this process, advertised back to agents
+heartbeat_load = HeartbeatLoad(config.HEARTBEAT_TARGET_RATE, config.HEARTBEAT_INTERVAL,
+                               config.HEARTBEAT_MAX_INTERVAL)
+
+# Work routed to agents; per process, so only served with one worker and the memory registry (TASK_DISPATCH)
+task_queue = TaskQueue(config.TASK_QUEUE_SIZE, config.TASK_VISIBILITY_TIMEOUT,
+                       config.TASK_MAX_ATTEMPTS, config.TASK_HASH_REPLICAS)
 
-# In-memory storage
-agents_lock = threading.Lock()
-agents: Dict[str, AgentData] = {}
+def configure_registry(backend: str, path: Optional[str] = None):
+    """Swap the agent registry backend, e.g. before forking gunicorn workers"""
+    global agents
+    agents = create_registry(backend, path, config.AGENT_TIMEOUT)
 
-def rate_limited_jwt_required(limit_value):
-    """Combine rate limiting and JWT verification"""
+def start_snapshots(directory: Optional[str] = None) -> Optional[RegistrySnapshotter]:
+    """Restore the registry from directory and keep snapshotting it there
+
+    Runs in the serving process (the gunicorn worker after fork), so a
+    recycled worker picks up the agents its predecessor checkpointed on exit.
+    Snapshots cover the in-memory registry of a single serving process: only
+    one process at a time owns a snapshot directory, and the SQLite registry
+    is persistent already.
+    """
+    global agents, snapshotter
+    directory = directory or config.SNAPSHOT_DIR
+    if not directory:
+        return None
+    if not isinstance(agents, MemoryRegistry):
+        logger.warning("Registry snapshots only apply to the memory backend; not snapshotting")
+        return None
+    candidate = RegistrySnapshotter(directory, config.SNAPSHOT_FLUSH_INTERVAL, config.SNAPSHOT_INTERVAL)
+    if not candidate.acquire():
+        logger.warning(f"Registry snapshots in {directory} are owned by another process; not snapshotting")
+        return None
+    agents = candidate.restore_into(agents, config.MAX_AGENTS)
+    candidate.start()
+    snapshotter = candidate
+    return snapshotter
+
+def rate_limited_jwt_required(limit_value, token_type='agent_auth'):
+    """Combine rate limiting and JWT verification
+
+    Tokens are checked by the security manager, which serves repeat
+    presentations of a token from its verified-token cache. The claims are
+    available to the view as g.token_payload.
+    """
     def decorator(f):
         @wraps(f)
         @limiter.limit(limit_value)
-        @jwt_required
         def wrapped(*args, **kwargs):
+            auth_header = request.headers.get('Authorization', '')
+            token = auth_header[7:] if auth_header.startswith('Bearer ') else None
+            payload = security_manager.validate_token(token, token_type=token_type) if token else None
+            if payload is None:
+                return jsonify({'error': 'unauthorized'}), 401
+            g.token_payload = payload
             return f(*args, **kwargs)
         return wrapped
     return decorator
@@ -103,16 +178,16 @@ def after_request(response):
         # Record response time
         if hasattr(g, 'start_time'):
             response_time = (time.time() - g.start_time) * 1000  # Convert to ms
-            monitoring.record_metric('response_time', response_time)
+            monitoring.record_metric('response_time', response_time, labels=(
+                request.method,
+                request.endpoint or 'unmatched',
+                str(response.status_code)
+            ))
 
         # Record error rate
         if response.status_code >= 400:
             monitoring.record_metric('error_rate', 1)
 
-        # Update agent count
-        with agents_lock:
-            monitoring.record_metric('agent_count', len(agents))
-
         return response
     except Exception as e:
         logger.error(f"Error recording metrics: {e}")
@@ -121,17 +196,34 @@ def after_request(response):
 @app.route('/health')
 def health_check():
     """Get system health status"""
-    return jsonify(monitoring.get_system_health())
+    health = monitoring.get_system_health()
+    health['token_cache'] = security_manager.token_cache.stats()
+    health['tasks'] = task_queue.stats()
+    return jsonify(health)
+
+@app.route('/metrics')
+@limiter.exempt
+def prometheus_metrics():
+    """Prometheus text exposition of monitoring metrics"""
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
 
 @app.route('/metrics/<name>')
 @rate_limited_jwt_required("30/minute")
 def get_metric(name):
     """Get historical data for a specific metric"""
     window = request.args.get('window', 3600, type=int)
-    return jsonify(monitoring.get_metric_history(name, window))
+    step = request.args.get('step', None, type=int)
+    return jsonify(monitoring.get_metric_history(name, window, step))
+
+def gateway_request() -> bool:
+    """Whether the request carries a valid gateway token, which lifts the per-address registration limit"""
+    auth_header = request.headers.get('Authorization', '')
+    return auth_header.startswith('Bearer ') and \
+        security_manager.validate_token(auth_header[7:], token_type='gateway_auth') is not None
 
 @app.route('/register', methods=['POST'])
-@limiter.limit(config.REGISTER_RATE_LIMIT)
+@limiter.limit(config.REGISTER_RATE_LIMIT, exempt_when=gateway_request)
 def register_agent():
     """Register a new agent with API key"""
     try:
@@ -147,17 +239,16 @@ def register_agent():
             logger.warning(f"Invalid API key for agent: {agent_id}")
             return jsonify({'error': 'invalid api key'}), 401
         
-        with agents_lock:
-            if len(agents) >= config.MAX_AGENTS:
-                logger.warning(f"Max agent limit reached, rejecting {agent_id}")
-                return jsonify({'error': 'maximum agents limit reached'}), 503
-                
-            agents[agent_id] = AgentData(
-                last_seen=datetime.now().isoformat(),
-                status='active',
-                address=(request.remote_addr, request.environ.get('REMOTE_PORT')),
-                api_key=api_key
-            )
+        remote_port = request.environ.get('REMOTE_PORT')
+        agent = AgentData(
+            last_seen=time.monotonic(),
+            status='active',
+            host=request.remote_addr,
+            port=int(remote_port) if remote_port else None
+        )
+        if not agents.add(agent_id, agent, config.MAX_AGENTS):
+            logger.warning(f"Max agent limit reached, rejecting {agent_id}")
+            return jsonify({'error': 'maximum agents limit reached'}), 503
             
         # Generate JWT token for future authentication
         access_token = security_manager.generate_token(agent_id)
@@ -183,7 +274,7 @@ def heartbeat(agent_id):
     """Update agent heartbeat with authentication"""
     try:
         # Verify token matches agent_id
-        token_agent_id = get_jwt_identity()
+        token_agent_id = g.token_payload['agent_id']
         if token_agent_id != agent_id:
             logger.warning(f"Token mismatch: {token_agent_id} != {agent_id}")
             return jsonify({'error': 'unauthorized'}), 401
@@ -191,16 +282,12 @@ def heartbeat(agent_id):
         schema = HeartbeatSchema()
         data = schema.load(request.get_json() or {})
         
-        with agents_lock:
-            if agent_id not in agents:
-                logger.warning(f"Heartbeat from unknown agent: {agent_id}")
-                return jsonify({'error': 'agent not found'}), 404
-            
-            agents[agent_id].last_seen = datetime.now().isoformat()
-            if 'status' in data:
-                agents[agent_id].status = data['status']
-                
-        return jsonify({'status': 'ok'})
+        heartbeat_load.record()
+        if not agents.touch(agent_id, data.get('status')):
+            logger.warning(f"Heartbeat from unknown agent: {agent_id}")
+            return jsonify({'error': 'agent not found'}), 404
+
+        return jsonify({'status': 'ok'}), 200, heartbeat_load.headers()
         
     except ValidationError as err:
         logger.error(f"Heartbeat validation error: {err.messages}")
@@ -210,46 +297,260 @@ def heartbeat(agent_id):
         monitoring.record_metric('error_rate', 1)
         return jsonify({'error': 'internal server error'}), 500
 
+@app.route('/gateway/register', methods=['POST'])
+@limiter.limit(config.REGISTER_RATE_LIMIT)
+def register_gateway():
+    """Issue a gateway token that can send heartbeats on behalf of many agents"""
+    try:
+        data = GatewayRegisterSchema().load(request.get_json())
+        gateway_id = data['gateway_id']
+
+        if not security_manager.validate_gateway_key(gateway_id, data['gateway_key']):
+            return jsonify({'error': 'invalid gateway key'}), 401
+
+        access_token = security_manager.generate_token(gateway_id, token_type='gateway_auth')
+        logger.info(f"Gateway registered: {gateway_id} from {request.remote_addr}")
+
+        return jsonify({
+            'status': 'registered',
+            'gateway_id': gateway_id,
+            'access_token': access_token
+        })
+
+    except ValidationError as err:
+        logger.error(f"Gateway registration validation error: {err.messages}")
+        return jsonify({'error': err.messages}), 400
+    except Exception as e:
+        logger.error(f"Gateway registration error: {str(e)}")
+        monitoring.record_metric('error_rate', 1)
+        return jsonify({'error': 'internal server error'}), 500
+
+@app.route('/heartbeats', methods=['POST'])
+@rate_limited_jwt_required(config.BATCH_HEARTBEAT_RATE_LIMIT, token_type='gateway_auth')
+def batch_heartbeat():
+    """Apply a batch of agent heartbeats sent by a gateway"""
+    try:
+        entries = BatchHeartbeatSchema().load(request.get_json() or {})['heartbeats']
+
+        # One validation pass over the whole batch; invalid entries are reported, not fatal
+        errors = BatchHeartbeatEntrySchema(many=True).validate(entries)
+        valid = [i for i in range(len(entries)) if i not in errors]
+        heartbeat_load.record(len(valid))
+        applied = agents.touch_many([
+            (entries[i]['agent_id'], entries[i].get('status')) for i in valid
+        ])
+
+        results = [None] * len(entries)
+        for i, messages in errors.items():
+            results[i] = {'agent_id': entries[i].get('agent_id'), 'error': messages}
+        for i, ok in zip(valid, applied):
+            results[i] = {'agent_id': entries[i]['agent_id'], 'status': 'ok'} if ok \
+                else {'agent_id': entries[i]['agent_id'], 'error': 'agent not found'}
+
+        accepted = sum(applied)
+        logger.debug(f"Gateway {g.token_payload['agent_id']} applied {accepted}/{len(entries)} heartbeats")
+        return jsonify({'accepted': accepted, 'rejected': len(entries) - accepted, 'results': results}), \
+            200, heartbeat_load.headers()
+
+    except ValidationError as err:
+        logger.error(f"Batch heartbeat validation error: {err.messages}")
+        return jsonify({'error': err.messages}), 400
+    except Exception as e:
+        logger.error(f"Batch heartbeat error: {str(e)}")
+        monitoring.record_metric('error_rate', 1)
+        return jsonify({'error': 'internal server error'}), 500
+
+def submit_tasks(entries) -> Tuple[Dict[str, Any], int]:
+    """Queue validated task entries, returning the response body and status code"""
+    results = []
+    accepted = 0
+    for entry in entries:
+        try:
+            task = task_queue.submit(entry['payload'], entry.get('key'))
+            results.append({'task_id': task.task_id, 'agent_id': task.agent_id})
+            accepted += 1
+        except QueueFull as e:
+            results.append({'error': str(e)})
+    body = {'accepted': accepted, 'rejected': len(entries) - accepted, 'results': results}
+    # Nothing fit: tell producers to back off rather than retry immediately
+    return body, (200 if accepted else 503)
+
+DISPATCH_DISABLED = 'task dispatch is off; it is enabled with --task-dispatch on a single-worker server with the memory registry'
+
+def serialize_task(task: Task) -> Dict[str, Any]:
+    return {'task_id': task.task_id, 'payload': task.payload, 'attempts': task.attempts}
+
+@app.route('/tasks', methods=['POST'])
+@rate_limited_jwt_required(config.TASK_SUBMIT_RATE_LIMIT, token_type='gateway_auth')
+def submit_task_batch():
+    """Queue tasks for the least-loaded (or key-owning) agents"""
+    if not config.TASK_DISPATCH:
+        return jsonify({'error': DISPATCH_DISABLED}), 503
+    try:
+        entries = TaskSubmitSchema().load(request.get_json() or {})['tasks']
+        body, status = submit_tasks(entries)
+        response = jsonify(body)
+        response.status_code = status
+        if status == 503:
+            response.headers['Retry-After'] = '1'
+        return response
+    except ValidationError as err:
+        logger.error(f"Task submission validation error: {err.messages}")
+        return jsonify({'error': err.messages}), 400
+    except Exception as e:
+        logger.error(f"Task submission error: {str(e)}")
+        monitoring.record_metric('error_rate', 1)
+        return jsonify({'error': 'internal server error'}), 500
+
+@app.route('/tasks/<agent_id>/pull', methods=['POST'])
+@rate_limited_jwt_required(config.TASK_PULL_RATE_LIMIT)
+def pull_tasks(agent_id):
+    """Lease a batch of the agent's queued tasks"""
+    if not config.TASK_DISPATCH:
+        return jsonify({'error': DISPATCH_DISABLED}), 503
+    try:
+        if g.token_payload['agent_id'] != agent_id:
+            return jsonify({'error': 'unauthorized'}), 401
+        if agent_id not in agents:
+            return jsonify({'error': 'agent not found'}), 404
+
+        data = TaskPullSchema().load(request.get_json() or {})
+        visibility_timeout = data.get('visibility_timeout', config.TASK_VISIBILITY_TIMEOUT)
+        tasks = task_queue.pull(agent_id, data.get('max_tasks', 1), visibility_timeout)
+        return jsonify({'tasks': [serialize_task(task) for task in tasks], 'visibility_timeout': visibility_timeout})
+    except ValidationError as err:
+        logger.error(f"Task pull validation error: {err.messages}")
+        return jsonify({'error': err.messages}), 400
+    except Exception as e:
+        logger.error(f"Task pull error: {str(e)}")
+        monitoring.record_metric('error_rate', 1)
+        return jsonify({'error': 'internal server error'}), 500
+
+@app.route('/tasks/<agent_id>/ack', methods=['POST'])
+@rate_limited_jwt_required(config.TASK_PULL_RATE_LIMIT)
+def ack_tasks(agent_id):
+    """Acknowledge completed tasks so they are not redelivered"""
+    if not config.TASK_DISPATCH:
+        return jsonify({'error': DISPATCH_DISABLED}), 503
+    try:
+        if g.token_payload['agent_id'] != agent_id:
+            return jsonify({'error': 'unauthorized'}), 401
+
+        task_ids = TaskAckSchema().load(request.get_json() or {})['task_ids']
+        acked = task_queue.ack(agent_id, task_ids)
+        return jsonify({'acked': sum(acked), 'results': acked})
+    except ValidationError as err:
+        logger.error(f"Task ack validation error: {err.messages}")
+        return jsonify({'error': err.messages}), 400
+    except Exception as e:
+        logger.error(f"Task ack error: {str(e)}")
+        monitoring.record_metric('error_rate', 1)
+        return jsonify({'error': 'internal server error'}), 500
+
+STATUS_FIELDS = ('last_seen', 'status', 'address')
+
+class StatusQuerySchema(Schema):
+    cursor = fields.Str(required=False)
+    limit = fields.Int(required=False, validate=validate.Range(min=1, max=config.STATUS_MAX_PAGE_SIZE))
+    status = fields.Str(required=False)
+    max_age = fields.Float(required=False, validate=validate.Range(min=0))  # seconds since last heartbeat
+    min_age = fields.Float(required=False, validate=validate.Range(min=0))
+    projection = fields.Str(required=False, data_key='fields')  # comma separated subset of STATUS_FIELDS
+    format = fields.Str(required=False, validate=validate.OneOf(['json', 'ndjson']))
+
+def _serialize_agent(data: AgentData, selected: Tuple[str, ...], offset: float) -> Dict[str, Any]:
+    """Project an agent record onto the requested status fields"""
+    values = {}
+    for name in selected:
+        if name == 'last_seen':
+            values[name] = monotonic_to_iso(data.last_seen, offset)
+        elif name == 'status':
+            values[name] = data.status
+        else:
+            values[name] = data.address
+    return values
+
 @app.route('/status', methods=['GET'])
 @rate_limited_jwt_required("30/minute")
 def get_status():
-    """Get status of all registered agents"""
+    """Get a page of registered agents, optionally filtered, projected or streamed"""
     try:
-        with agents_lock:
-            agent_data = {
-                id: {
-                    'last_seen': data.last_seen,
-                    'status': data.status,
-                    'address': data.address
-                } for id, data in agents.items()
-            }
-            
-            return jsonify({
-                'agents': agent_data,
-                'total_agents': len(agents),
-                'system_health': monitoring.get_system_health()
-            })
+        query = StatusQuerySchema().load(request.args)
+        selected = tuple(query['projection'].split(',')) if 'projection' in query else STATUS_FIELDS
+        unknown = set(selected) - set(STATUS_FIELDS)
+        if unknown:
+            return jsonify({'error': {'fields': [f"Unknown fields: {', '.join(sorted(unknown))}"]}}), 400
+
+        now = time.monotonic()
+        filters = {
+            'status': query.get('status'),
+            'seen_after': now - query['max_age'] if 'max_age' in query else None,
+            'seen_before': now - query['min_age'] if 'min_age' in query else None
+        }
+        limit = query.get('limit', config.STATUS_PAGE_SIZE)
+        offset = time.time() - time.monotonic()
+
+        if query.get('format') == 'ndjson':
+            # Stream every matching agent, one bounded registry snapshot per chunk
+            def generate(after):
+                while True:
+                    page = agents.page(after, limit, **filters)
+                    for agent_id, data in page:
+                        yield json.dumps(dict(agent_id=agent_id, **_serialize_agent(data, selected, offset))) + '\n'
+                    if len(page) < limit:
+                        return
+                    after = page[-1][0]
+
+            return Response(generate(query.get('cursor')), mimetype='application/x-ndjson',
+                            headers={'X-Total-Agents': str(len(agents))})
+
+        page = agents.page(query.get('cursor'), limit, **filters)
+        return jsonify({
+            'agents': {agent_id: _serialize_agent(data, selected, offset) for agent_id, data in page},
+            'total_agents': len(agents),
+            'next_cursor': page[-1][0] if len(page) == limit else None,
+            'system_health': monitoring.get_system_health()
+        })
+    except ValidationError as err:
+        logger.error(f"Status query validation error: {err.messages}")
+        return jsonify({'error': err.messages}), 400
     except Exception as e:
         logger.error(f"Status retrieval error: {str(e)}")
         monitoring.record_metric('error_rate', 1)
         return jsonify({'error': 'internal server error'}), 500
 
+def evict_inactive_agents():
+    """One cleanup pass: evict overdue agents, requeue lapsed task leases and sample agent_count"""
+    # Only expired agents are touched, in batches so that registrations
+    # and heartbeats can interleave with a large eviction
+    while True:
+        expired = agents.expire(config.CLEANUP_BATCH_SIZE)
+        for agent_id in expired:
+            logger.info(f"Removing inactive agent: {agent_id}")
+        if expired:
+            task_queue.evict(expired)
+        if len(expired) < config.CLEANUP_BATCH_SIZE:
+            break
+    task_queue.requeue_expired()
+    # Sampled here rather than per request: len() is a query with the SQLite backend
+    monitoring.record_metric('agent_count', len(agents))
+
 def cleanup_inactive_agents():
     """Remove agents that haven't sent a heartbeat in AGENT_TIMEOUT seconds"""
     while True:
         try:
             time.sleep(config.CLEANUP_INTERVAL)
-            now = datetime.now()
-            with agents_lock:
-                for agent_id in list(agents.keys()):
-                    last_seen = datetime.fromisoformat(agents[agent_id].last_seen)
-                    if (now - last_seen).seconds > config.AGENT_TIMEOUT:
-                        logger.info(f"Removing inactive agent: {agent_id}")
-                        del agents[agent_id]
+            evict_inactive_agents()
         except Exception as e:
             logger.error(f"Cleanup error: {str(e)}")
             monitoring.record_metric('error_rate', 1)
 
+def start_cleanup_thread() -> threading.Thread:
+    """Start the background eviction of inactive agents"""
+    cleanup_thread = threading.Thread(target=cleanup_inactive_agents, daemon=True)
+    cleanup_thread.start()
+    return cleanup_thread
+
 def run_server(host=None, port=None):
     """Run the MCP server with configuration"""
     host = host or config.HOST
@@ -257,8 +558,8 @@ def run_server(host=None, port=None):
     
     logger.info(f"Starting MCP Server on {host}:{port}")
     
-    cleanup_thread = threading.Thread(target=cleanup_inactive_agents, daemon=True)
-    cleanup_thread.start()
+    start_snapshots()
+    start_cleanup_thread()
     
     app.run(
         host=host,
@@ -0,0 +1,331 @@
+import os
+import re
+import time
+import atexit
+import struct
+import logging
+import threading
+from collections import deque
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+from .registry import AgentData, AgentRegistry, monotonic_to_wall, wall_to_monotonic
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process ownership lock
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+OP_UPSERT = 1
+OP_TOUCH = 2
+OP_REMOVE = 3
+
+# op, last_seen (Unix time), port, then byte lengths of agent_id, status and host
+RECORD_HEADER = struct.Struct('<BdHHHH')
+NO_VALUE = 0xFFFF  # Length marking a missing status (touch without status) or host
+
+CHECKPOINT_MAGIC = b'MCPS'
+CHECKPOINT_VERSION = 1
+# magic, version, first log generation to replay, record count
+CHECKPOINT_HEADER = struct.Struct('<4sBQI')
+
+LOG_NAME = re.compile(r'^registry\.(\d+)\.log$')
+
+Record = Tuple[int, str, float, Optional[str], Optional[str], Optional[int]]
+
+def encode_record(op: int, agent_id: str, last_seen: float = 0.0, status: Optional[str] = None,
+                  host: Optional[str] = None, port: Optional[int] = None) -> bytes:
+    """Pack one registry mutation; last_seen is a Unix timestamp"""
+    agent_bytes = agent_id.encode()
+    status_bytes = status.encode() if status is not None else b''
+    host_bytes = host.encode() if host is not None else b''
+    if max(len(agent_bytes), len(status_bytes), len(host_bytes)) >= NO_VALUE:
+        raise ValueError(f'Registry field of agent {agent_id[:64]!r} too long to journal')
+    return RECORD_HEADER.pack(
+        op, last_seen, port or 0, len(agent_bytes),
+        len(status_bytes) if status is not None else NO_VALUE,
+        len(host_bytes) if host is not None else NO_VALUE
+    ) + agent_bytes + status_bytes + host_bytes
+
+def decode_records(data: bytes) -> Iterator[Record]:
+    """Unpack records, stopping quietly at a torn write at the end of a log"""
+    offset = 0
+    size = RECORD_HEADER.size
+    while offset + size <= len(data):
+        op, last_seen, port, id_len, status_len, host_len = RECORD_HEADER.unpack_from(data, offset)
+        offset += size
+        lengths = [id_len, 0 if status_len == NO_VALUE else status_len, 0 if host_len == NO_VALUE else host_len]
+        if offset + sum(lengths) > len(data):
+            return
+        fields = []
+        for length in lengths:
+            fields.append(data[offset:offset + length].decode())
+            offset += length
+        agent_id, status, host = fields
+        yield (op, agent_id, last_seen,
+               None if status_len == NO_VALUE else status,
+               None if host_len == NO_VALUE else host,
+               port or None)
+
+class SnapshottingRegistry(AgentRegistry):
+    """Registry wrapper that journals every successful mutation
+
+    Each mutation and its journal record happen under one lock, so the log
+    holds records in the order the registry applied them and replaying it
+    cannot, say, bring back an agent whose removal raced a re-registration.
+    """
+
+    def __init__(self, inner: AgentRegistry, snapshotter: 'RegistrySnapshotter'):
+        super().__init__(inner.agent_timeout)
+        self.inner = inner
+        self._journal = snapshotter.journal
+        self._lock = threading.Lock()
+
+    def add(self, agent_id: str, data: AgentData, max_agents: int) -> bool:
+        # Encode first: a field too long to journal must not reach the registry either
+        record = encode_record(OP_UPSERT, agent_id, monotonic_to_wall(data.last_seen),
+                               data.status, data.host, data.port)
+        with self._lock:
+            added = self.inner.add(agent_id, data, max_agents)
+            if added:
+                self._journal(record)
+        return added
+
+    def touch(self, agent_id: str, status: Optional[str] = None) -> bool:
+        return self.touch_many([(agent_id, status)])[0]
+
+    def touch_many(self, updates: List[Tuple[str, Optional[str]]]) -> List[bool]:
+        now = time.time()
+        records = [encode_record(OP_TOUCH, agent_id, now, status) for agent_id, status in updates]
+        with self._lock:
+            results = self.inner.touch_many(updates)
+            for record, ok in zip(records, results):
+                if ok:
+                    self._journal(record)
+        return results
+
+    def remove(self, agent_id: str) -> bool:
+        with self._lock:
+            removed = self.inner.remove(agent_id)
+            if removed:
+                self._journal(encode_record(OP_REMOVE, agent_id))
+        return removed
+
+    def expire(self, limit: int) -> List[str]:
+        with self._lock:
+            expired = self.inner.expire(limit)
+            for agent_id in expired:
+                self._journal(encode_record(OP_REMOVE, agent_id))
+        return expired
+
+    def items(self) -> List[Tuple[str, AgentData]]:
+        return self.inner.items()
+
+    def page(self, after: Optional[str], limit: int, status: Optional[str] = None,
+             seen_after: Optional[float] = None,
+             seen_before: Optional[float] = None) -> List[Tuple[str, AgentData]]:
+        return self.inner.page(after, limit, status, seen_after, seen_before)
+
+    def get(self, agent_id: str) -> Optional[AgentData]:
+        return self.inner.get(agent_id)
+
+    def __len__(self) -> int:
+        return len(self.inner)
+
+class RegistrySnapshotter:
+    """Append-only mutation log plus periodic compact checkpoints of a registry
+
+    Mutations are buffered in memory and appended to registry.<gen>.log every
+    flush_interval seconds (written, not fsynced, so they survive a process
+    restart). Every checkpoint_interval seconds the log rolls over to a new
+    generation, the registry is written to registry.ckpt via an atomic rename,
+    and older logs are deleted. Restoring loads the checkpoint and replays the
+    logs that follow it.
+    """
+
+    def __init__(self, directory: str, flush_interval: float = 1.0, checkpoint_interval: float = 60.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.checkpoint_interval = checkpoint_interval
+        self.registry: Optional[AgentRegistry] = None
+        self._buffer: Deque[bytes] = deque()
+        self._log_lock = threading.Lock()
+        self._log_file = None
+        self._generation = 0
+        self._lock_file = None
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def checkpoint_path(self) -> str:
+        return os.path.join(self.directory, 'registry.ckpt')
+
+    def _log_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f'registry.{generation}.log')
+
+    def _log_generations(self) -> List[int]:
+        generations = []
+        for name in os.listdir(self.directory):
+            match = LOG_NAME.match(name)
+            if match:
+                generations.append(int(match.group(1)))
+        return sorted(generations)
+
+    def acquire(self, timeout: float = 5.0) -> bool:
+        """Take exclusive ownership of the directory, waiting for a previous owner to exit"""
+        if fcntl is None:
+            return True
+        self._lock_file = open(os.path.join(self.directory, 'lock'), 'w')
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except OSError:
+                if time.monotonic() >= deadline:
+                    self._lock_file.close()
+                    self._lock_file = None
+                    return False
+                time.sleep(0.1)
+
+    def journal(self, record: bytes):
+        """Queue a mutation record for the log (deque.append is atomic)"""
+        self._buffer.append(record)
+
+    def flush(self):
+        """Append buffered records to the current log"""
+        with self._log_lock:
+            if self._log_file is None or not self._buffer:
+                return
+            chunks = []
+            while self._buffer:
+                chunks.append(self._buffer.popleft())
+            self._log_file.write(b''.join(chunks))
+            self._log_file.flush()
+
+    def _roll_log(self) -> int:
+        """Start a new log generation and return it"""
+        with self._log_lock:
+            if self._log_file is not None:
+                while self._buffer:
+                    self._log_file.write(self._buffer.popleft())
+                self._log_file.close()
+            self._generation += 1
+            self._log_file = open(self._log_path(self._generation), 'ab')
+            return self._generation
+
+    def checkpoint(self):
+        """Write a compact checkpoint and drop the logs it supersedes"""
+        started = time.monotonic()
+        generation = self._roll_log()
+        # Anything changing from here on lands in the new log and is replayed on top
+        items = self.registry.items()
+        offset = time.time() - time.monotonic()
+        body = b''.join(
+            encode_record(OP_UPSERT, agent_id, data.last_seen + offset, data.status, data.host, data.port)
+            for agent_id, data in items
+        )
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(CHECKPOINT_HEADER.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION, generation, len(items)))
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+        for old in self._log_generations():
+            if old < generation:
+                os.remove(self._log_path(old))
+        logger.info(f"Registry checkpoint: {len(items)} agents in {time.monotonic() - started:.3f}s")
+
+    def _load_state(self) -> Tuple[Dict[str, list], int]:
+        """Agent state from the checkpoint and subsequent logs, keyed by id"""
+        state: Dict[str, list] = {}
+        first_generation = 0
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, 'rb') as f:
+                data = f.read()
+            magic, version, first_generation, _ = CHECKPOINT_HEADER.unpack_from(data)
+            if magic != CHECKPOINT_MAGIC or version != CHECKPOINT_VERSION:
+                raise ValueError(f"Unrecognized registry checkpoint in {self.checkpoint_path}")
+            for _, agent_id, last_seen, status, host, port in decode_records(data[CHECKPOINT_HEADER.size:]):
+                state[agent_id] = [last_seen, status, host, port]
+
+        generations = self._log_generations()
+        for generation in generations:
+            if generation < first_generation:
+                continue
+            with open(self._log_path(generation), 'rb') as f:
+                data = f.read()
+            for op, agent_id, last_seen, status, host, port in decode_records(data):
+                if op == OP_UPSERT:
+                    state[agent_id] = [last_seen, status, host, port]
+                elif op == OP_TOUCH:
+                    agent = state.get(agent_id)
+                    if agent is not None:
+                        agent[0] = last_seen
+                        if status is not None:
+                            agent[1] = status
+                elif op == OP_REMOVE:
+                    state.pop(agent_id, None)
+        self._generation = max(generations + [first_generation])
+        return state, len(generations)
+
+    def restore_into(self, registry: AgentRegistry, max_agents: int) -> SnapshottingRegistry:
+        """Load saved agents, up to max_agents, into registry and return it wrapped for journaling"""
+        started = time.monotonic()
+        state, log_count = self._load_state()
+        cutoff = time.time() - registry.agent_timeout
+        restored = refused = 0
+        for agent_id, (last_seen, status, host, port) in state.items():
+            if last_seen <= cutoff:
+                continue  # Agents that timed out while we were down stay gone
+            if registry.add(agent_id, AgentData(wall_to_monotonic(last_seen), status, host, port), max_agents):
+                restored += 1
+            else:
+                refused += 1
+        if refused:
+            logger.warning(f"Not restoring {refused} agents beyond the limit of {max_agents}")
+        logger.info(f"Restored {restored} agents from {self.directory} "
+                    f"({log_count} logs) in {time.monotonic() - started:.3f}s")
+        self.registry = SnapshottingRegistry(registry, self)
+        return self.registry
+
+    def _run(self):
+        next_checkpoint = time.monotonic() + self.checkpoint_interval
+        while self._running:
+            time.sleep(self.flush_interval)
+            try:
+                if time.monotonic() >= next_checkpoint:
+                    self.checkpoint()
+                    next_checkpoint = time.monotonic() + self.checkpoint_interval
+                else:
+                    self.flush()
+            except Exception as e:
+                logger.error(f"Registry snapshot error: {e}")
+
+    def start(self):
+        """Compact what was restored and keep journaling in the background"""
+        self.checkpoint()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='registry-snapshots', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Write a final checkpoint so the next start replays nothing"""
+        if not self._running:
+            return
+        self._running = False
+        try:
+            self.checkpoint()
+            with self._log_lock:
+                if self._log_file is not None:
+                    self._log_file.close()
+                    self._log_file = None
+        except Exception as e:
+            logger.error(f"Final registry checkpoint failed: {e}")
+        finally:
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
@@ -0,0 +1,27 @@
+import os
+import sqlite3
+import threading
+
+class SQLiteDatabase:
+    """Per-thread connections to one SQLite file, shared between processes
+
+    The database runs in WAL mode so readers never block the writer. Each
+    thread gets its own autocommit connection, reopened after a fork so
+    gunicorn workers never share a handle with the master.
+    """
+
+    def __init__(self, path: str, timeout: float = 5.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def connection(self) -> sqlite3.Connection:
+        """Connection for the calling thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
@@ -0,0 +1,250 @@
+import time
+import uuid
+import heapq
+import bisect
+import hashlib
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
+from .monitoring import monitoring
+
+logger = logging.getLogger(__name__)
+
+monitoring.register_metric('task_queue_depth', 'Tasks waiting to be pulled')
+monitoring.register_metric('task_inflight', 'Tasks pulled but not yet acknowledged')
+monitoring.register_metric('task_wait_time', 'Time from submission to pull in ms', kind='histogram')
+monitoring.register_metric('task_latency', 'Time from submission to acknowledgement in ms', kind='histogram')
+
+class QueueFull(Exception):
+    """No agent can take another task right now"""
+
+@dataclass
+class Task:
+    """A unit of work; created and deadline are time.monotonic() values"""
+    __slots__ = ('task_id', 'payload', 'key', 'created', 'agent_id', 'attempts', 'deadline')
+    task_id: str
+    payload: Any
+    key: Optional[str]
+    created: float
+    agent_id: Optional[str]
+    attempts: int
+    deadline: float
+
+def _ring_hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+class TaskQueue:
+    """Per-agent bounded task queues with leases
+
+    Agents become consumers the first time they pull. A submitted task goes
+    to the least-loaded consumer (pending plus in-flight tasks, tracked in a
+    lazy-deletion min-heap like the registry's expiry heap) or, when it has a
+    routing key, to the key's owner on a consistent-hash ring with replicas
+    virtual nodes per consumer. Submissions are refused with QueueFull once
+    the chosen queue holds max_pending tasks, which is the back-pressure
+    signal for producers.
+
+    Pulled tasks are leased for a visibility timeout. Tasks that are not
+    acknowledged in time, and all tasks of an evicted agent, are redelivered
+    to another consumer until max_attempts deliveries have been made.
+    """
+
+    def __init__(self, max_pending: int = 1000, visibility_timeout: float = 60.0,
+                 max_attempts: int = 5, replicas: int = 16):
+        self.max_pending = max_pending
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.replicas = replicas
+        self._lock = threading.Lock()
+        self._queues: Dict[str, Deque[Task]] = {}
+        self._load: Dict[str, int] = {}
+        self._inflight: Dict[str, Task] = {}
+        self._leases: List[Tuple[float, str]] = []
+        self._load_heap: List[Tuple[int, int, str]] = []
+        self._sequence = 0
+        self._ring: List[int] = []
+        self._ring_ids: List[str] = []
+        self._consumer_version = 0
+        self._ring_version = 0
+        self.pending = 0
+        self.dropped = 0
+
+    def _push_load(self, agent_id: str):
+        self._sequence += 1
+        heapq.heappush(self._load_heap, (self._load[agent_id], self._sequence, agent_id))
+        if len(self._load_heap) > 4 * len(self._load) + 1024:
+            self._load_heap = [(load, 0, agent_id) for agent_id, load in self._load.items()]
+            heapq.heapify(self._load_heap)
+
+    def _least_loaded(self) -> Optional[str]:
+        while self._load_heap:
+            load, _, agent_id = self._load_heap[0]
+            if self._load.get(agent_id) == load:
+                return agent_id
+            heapq.heappop(self._load_heap)  # Stale: load changed or agent evicted
+        return None
+
+    def _ring_owner(self, key: str) -> Optional[str]:
+        if self._ring_version != self._consumer_version:
+            points = sorted(
+                (_ring_hash(f"{agent_id}#{replica}"), agent_id)
+                for agent_id in self._load for replica in range(self.replicas)
+            )
+            self._ring = [point for point, _ in points]
+            self._ring_ids = [agent_id for _, agent_id in points]
+            self._ring_version = self._consumer_version
+        if not self._ring:
+            return None
+        index = bisect.bisect(self._ring, _ring_hash(key)) % len(self._ring)
+        return self._ring_ids[index]
+
+    def _add_consumer(self, agent_id: str):
+        if agent_id not in self._load:
+            self._queues[agent_id] = deque()
+            self._load[agent_id] = 0
+            self._consumer_version += 1
+            self._push_load(agent_id)
+
+    def _place(self, task: Task, bounded: bool) -> bool:
+        """Queue task on its target agent; callers hold the lock"""
+        agent_id = self._ring_owner(task.key) if task.key is not None else self._least_loaded()
+        if agent_id is None:
+            return False
+        queue = self._queues[agent_id]
+        if bounded and len(queue) >= self.max_pending:
+            return False
+        task.agent_id = agent_id
+        if bounded:
+            queue.append(task)
+        else:
+            queue.appendleft(task)  # Redeliveries go first and may exceed the bound
+        self._load[agent_id] += 1
+        self._push_load(agent_id)
+        self.pending += 1
+        return True
+
+    def submit(self, payload: Any, key: Optional[str] = None) -> Task:
+        """Queue a task, raising QueueFull when its target agent's queue is full"""
+        task = Task(uuid.uuid4().hex, payload, key, time.monotonic(), None, 0, 0.0)
+        with self._lock:
+            if not self._place(task, bounded=True):
+                raise QueueFull('no consumers' if not self._load else 'agent queue full')
+            depth = self.pending
+        monitoring.record_metric('task_queue_depth', depth)
+        return task
+
+    def _redeliver(self, task: Task):
+        """Send a task back out after a lost lease; callers hold the lock"""
+        if task.attempts >= self.max_attempts:
+            reason = f"after {task.attempts} deliveries"
+        elif not self._place(task, bounded=False):
+            reason = "with no consumers left"
+        else:
+            return
+        self.dropped += 1
+        logger.warning(f"Dropping task {task.task_id} {reason}")
+
+    def _release(self, task: Task):
+        """Remove a leased task from its agent's load; callers hold the lock"""
+        del self._inflight[task.task_id]
+        if task.agent_id in self._load:
+            self._load[task.agent_id] -= 1
+            self._push_load(task.agent_id)
+
+    def requeue_expired(self) -> int:
+        """Redeliver tasks whose lease ran out, returning how many there were"""
+        now = time.monotonic()
+        expired = 0
+        with self._lock:
+            while self._leases and self._leases[0][0] <= now:
+                deadline, task_id = heapq.heappop(self._leases)
+                task = self._inflight.get(task_id)
+                if task is None or task.deadline != deadline:
+                    continue  # Acknowledged, or leased again since
+                self._release(task)
+                self._redeliver(task)
+                expired += 1
+        return expired
+
+    def pull(self, agent_id: str, max_tasks: int, visibility_timeout: Optional[float] = None) -> List[Task]:
+        """Lease up to max_tasks of the agent's queued tasks"""
+        self.requeue_expired()
+        now = time.monotonic()
+        deadline = now + (visibility_timeout or self.visibility_timeout)
+        with self._lock:
+            self._add_consumer(agent_id)
+            queue = self._queues[agent_id]
+            leased = []
+            while queue and len(leased) < max_tasks:
+                task = queue.popleft()
+                task.attempts += 1
+                task.deadline = deadline
+                self._inflight[task.task_id] = task
+                heapq.heappush(self._leases, (deadline, task.task_id))
+                leased.append(task)
+            self.pending -= len(leased)
+            depth, inflight = self.pending, len(self._inflight)
+        for task in leased:
+            monitoring.record_metric('task_wait_time', (now - task.created) * 1000)
+        monitoring.record_metric('task_queue_depth', depth)
+        monitoring.record_metric('task_inflight', inflight)
+        return leased
+
+    def ack(self, agent_id: str, task_ids: Iterable[str]) -> List[bool]:
+        """Complete leased tasks; False for ids not currently leased to agent_id"""
+        now = time.monotonic()
+        results = []
+        latencies = []
+        with self._lock:
+            for task_id in task_ids:
+                task = self._inflight.get(task_id)
+                if task is None or task.agent_id != agent_id:
+                    results.append(False)
+                    continue
+                self._release(task)
+                latencies.append((now - task.created) * 1000)
+                results.append(True)
+            inflight = len(self._inflight)
+        for latency in latencies:
+            monitoring.record_metric('task_latency', latency)
+        monitoring.record_metric('task_inflight', inflight)
+        return results
+
+    def evict(self, agent_ids: Iterable[str]) -> int:
+        """Forget agents and redeliver their queued and leased tasks"""
+        evicted: Set[str] = set(agent_ids)
+        if not evicted:
+            return 0
+        orphans = []
+        leased = 0
+        with self._lock:
+            for agent_id in evicted:
+                load = self._load.pop(agent_id, None)
+                if load is None:
+                    continue
+                queue = self._queues.pop(agent_id)
+                self.pending -= len(queue)
+                leased += load - len(queue)
+                orphans.extend(queue)
+                self._consumer_version += 1
+            if leased:  # Only scan the leases when an evicted agent holds some
+                for task in list(self._inflight.values()):
+                    if task.agent_id in evicted:
+                        del self._inflight[task.task_id]
+                        orphans.append(task)
+            for task in orphans:
+                self._redeliver(task)
+        if orphans:
+            logger.info(f"Redelivering {len(orphans)} tasks of {len(evicted)} evicted agents")
+        return len(orphans)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'consumers': len(self._load),
+                'pending': self.pending,
+                'inflight': len(self._inflight),
+                'dropped': self.dropped
+            }
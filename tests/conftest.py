@@ -0,0 +1,45 @@
+import secrets
+
+import pytest
+
+from a2a_mcp.mcp.config import config
+
+# Keep test runs out of the server's log file; set before the server modules add their handlers
+config.LOG_FILE = None
+
+
+@pytest.fixture
+def mcp(monkeypatch):
+    """The Flask server module with an empty registry and task queue, and rate limits off"""
+    from a2a_mcp.mcp import server
+    from a2a_mcp.mcp.registry import MemoryRegistry
+    from a2a_mcp.mcp.tasks import TaskQueue
+
+    monkeypatch.setattr(server.config, 'JWT_SECRET_KEY', 'test-jwt-secret-of-at-least-32-bytes')
+    monkeypatch.setattr(server, 'agents', MemoryRegistry(server.config.AGENT_TIMEOUT))
+    monkeypatch.setattr(server, 'task_queue', TaskQueue())
+    monkeypatch.setattr(server.limiter, 'enabled', False)
+    return server
+
+
+@pytest.fixture
+def client(mcp):
+    return mcp.app.test_client()
+
+
+@pytest.fixture
+def register(client):
+    """Register an agent and return Authorization headers for it"""
+    def register(agent_id: str) -> dict:
+        response = client.post('/register', json={'agent_id': agent_id, 'api_key': secrets.token_hex(32)})
+        assert response.status_code == 200, response.get_json()
+        return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+    return register
+
+
+@pytest.fixture
+def gateway_headers(client, monkeypatch):
+    monkeypatch.setattr(config, 'GATEWAY_KEY', 'test-gateway-key')
+    response = client.post('/gateway/register', json={'gateway_id': 'gw', 'gateway_key': 'test-gateway-key'})
+    assert response.status_code == 200, response.get_json()
+    return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
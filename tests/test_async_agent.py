@@ -0,0 +1,131 @@
+import asyncio
+import secrets
+import time
+
+import pytest
+
+pytest.importorskip('aiohttp')
+
+from aiohttp.test_utils import TestClient, TestServer  # noqa: E402
+from limits.storage import MemoryStorage  # noqa: E402
+from limits.strategies import FixedWindowRateLimiter  # noqa: E402
+
+from a2a_mcp.agents.async_agent import AsyncAgentPool, AsyncMCPAgent  # noqa: E402
+from a2a_mcp.mcp import async_server  # noqa: E402
+from a2a_mcp.mcp.config import config  # noqa: E402
+
+
+@pytest.fixture
+def run_pool(mcp, monkeypatch):
+    """Run a coroutine function with a pool against the async app, per-address limits on"""
+    monkeypatch.setattr(async_server, 'rate_limiter', FixedWindowRateLimiter(MemoryStorage()))
+    monkeypatch.setattr(config, 'GATEWAY_KEY', 'test-gateway-key')
+
+    def run_pool(scenario, **options):
+        async def main():
+            async with TestClient(TestServer(async_server.create_app())) as client:
+                pool = AsyncAgentPool(str(client.make_url('')), **options)
+                try:
+                    return await scenario(pool)
+                finally:
+                    await pool.stop()
+        return asyncio.run(main())
+    return run_pool
+
+
+def test_gateway_registrations_skip_the_address_limit(client, mcp, gateway_headers, monkeypatch):
+    monkeypatch.setattr(mcp.limiter, 'enabled', True)
+    mcp.limiter.reset()
+
+    def register(agent_id, headers=None):
+        return client.post('/register', headers=headers,
+                           json={'agent_id': agent_id, 'api_key': secrets.token_hex(32)}).status_code
+    assert [register(f"gw-{i}", gateway_headers) for i in range(10)] == [200] * 10
+    assert [register(f"direct-{i}") for i in range(6)] == [200] * 5 + [429]
+    assert register('forged', {'Authorization': 'Bearer not-a-token'}) == 429
+
+
+def test_gateway_pool_registers_and_heartbeats_in_batches(run_pool, mcp):
+    async def scenario(pool):
+        for i in range(20):
+            pool.add_agent(f"agent-{i}")
+        await pool.start()
+        assert len(mcp.agents) == 20  # Far beyond 5 registrations a minute
+        assert await pool.send_batch_heartbeats() == 20
+        mcp.agents.remove('agent-3')
+        assert await pool.send_batch_heartbeats() == 19
+        assert 'agent-3' in mcp.agents  # Registered again
+        assert await pool.send_batch_heartbeats() == 20
+        return pool.check_health()
+
+    assert run_pool(scenario, gateway_key='test-gateway-key', batch_size=8) == \
+        {'agents': 20, 'healthy': 20, 'degraded': 0}
+    assert mcp.agents.get('agent-0').status == 'healthy'
+
+
+def test_pool_without_gateway_paces_registrations(run_pool, mcp, monkeypatch):
+    registered = []
+    original = AsyncMCPAgent.register
+
+    async def register(agent):
+        registered.append(time.monotonic())
+        return await original(agent)
+    monkeypatch.setattr(AsyncMCPAgent, 'register', register)
+
+    async def scenario(pool):
+        for i in range(4):
+            pool.add_agent(f"agent-{i}")
+        await pool.start()
+        while len(registered) < 4:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+
+    run_pool(scenario, register_rate=20)
+    gaps = [later - earlier for earlier, later in zip(registered, registered[1:])]
+    assert all(gap >= 0.04 for gap in gaps)
+    assert len(mcp.agents) == 4
+
+
+def test_failed_heartbeats_back_off_through_the_scheduler(monkeypatch):
+    attempts = []
+
+    async def heartbeat_once(agent):
+        attempts.append(agent.agent_id)
+        if len(attempts) < 3:
+            raise asyncio.TimeoutError()
+        agent.pool.running = False
+        return True
+    monkeypatch.setattr(AsyncMCPAgent, 'heartbeat_once', heartbeat_once)
+
+    async def register(agent):
+        return True
+    monkeypatch.setattr(AsyncMCPAgent, 'register', register)
+
+    pool = AsyncAgentPool('http://127.0.0.1:1')
+    agent = pool.add_agent('a')
+    backoffs = []
+    monkeypatch.setattr(agent.scheduler, 'failure', lambda: backoffs.append('a') or 0.0)
+    pool.running = True
+    asyncio.run(asyncio.wait_for(pool._heartbeat_loop(agent, 0, 0), 5))
+    assert attempts == ['a', 'a', 'a']  # One request per attempt, no retries in place
+    assert backoffs == ['a', 'a']
+
+
+def test_failed_batches_back_off_through_the_scheduler(monkeypatch):
+    pool = AsyncAgentPool('http://127.0.0.1:1', gateway_key='key')
+    attempts = []
+
+    async def send_batch_heartbeats():
+        attempts.append(len(attempts))
+        if len(attempts) < 3:
+            raise asyncio.TimeoutError()
+        pool.running = False
+        return 0
+    monkeypatch.setattr(pool, 'send_batch_heartbeats', send_batch_heartbeats)
+    backoffs = []
+    monkeypatch.setattr(pool.scheduler, 'first_delay', lambda: 0.0)
+    monkeypatch.setattr(pool.scheduler, 'failure', lambda: backoffs.append(1) or 0.0)
+    pool.running = True
+    asyncio.run(asyncio.wait_for(pool._batch_heartbeat_loop(), 5))
+    assert attempts == [0, 1, 2]
+    assert backoffs == [1, 1]
@@ -0,0 +1,181 @@
+import asyncio
+import secrets
+import threading
+
+import pytest
+
+pytest.importorskip('aiohttp')
+
+from aiohttp import web  # noqa: E402
+from aiohttp.test_utils import TestClient, TestServer  # noqa: E402
+
+from a2a_mcp.agents.mcp_agent import AgentSession, MCPAgent  # noqa: E402
+from a2a_mcp.mcp import async_server  # noqa: E402
+from a2a_mcp.mcp.registry import MemoryRegistry, SQLiteRegistry  # noqa: E402
+from a2a_mcp.mcp.revocation import RevocationList, SQLiteRevocationStore  # noqa: E402
+from a2a_mcp.mcp.security import security_manager  # noqa: E402
+from a2a_mcp.mcp.snapshot import RegistrySnapshotter  # noqa: E402
+
+
+@pytest.fixture
+def serve(mcp, monkeypatch):
+    """Run a coroutine function against a test client of the async app"""
+    monkeypatch.setattr(async_server.rate_limiter, 'hit', lambda *args: True)
+
+    def serve(scenario):
+        async def main():
+            async with TestClient(TestServer(async_server.create_app())) as client:
+                return await scenario(client)
+        return asyncio.run(main())
+    return serve
+
+
+async def register(client, agent_id):
+    response = await client.post('/register', json={'agent_id': agent_id, 'api_key': secrets.token_hex(32)})
+    assert response.status == 200
+    return {'Authorization': f"Bearer {(await response.json())['access_token']}"}
+
+
+def record_threads(monkeypatch, target, name, calls):
+    """Wrap target.name to record the threads it runs on"""
+    original = getattr(target, name)
+
+    def wrapper(*args, **kwargs):
+        calls.append(threading.current_thread())
+        return original(*args, **kwargs)
+    monkeypatch.setattr(target, name, wrapper)
+
+
+def test_does_io_sees_through_wrapped_registries(tmp_path):
+    sqlite = SQLiteRegistry(str(tmp_path / 'registry.db'), 60)
+    wrapped = RegistrySnapshotter(str(tmp_path / 'snapshots')).restore_into(sqlite, 100)
+    assert async_server.does_io(sqlite)
+    assert async_server.does_io(wrapped)
+    assert not async_server.does_io(MemoryRegistry(60))
+
+
+def test_registry_calls_leave_the_loop_for_wrapped_sqlite(mcp, tmp_path, monkeypatch):
+    sqlite = SQLiteRegistry(str(tmp_path / 'registry.db'), 60)
+    monkeypatch.setattr(mcp, 'agents', RegistrySnapshotter(str(tmp_path / 'snapshots')).restore_into(sqlite, 100))
+    calls = []
+    record_threads(monkeypatch, sqlite, 'get', calls)
+
+    async def main():
+        await async_server.call_registry(mcp.agents.get, 'a')
+        return threading.current_thread()
+    loop_thread = asyncio.run(main())
+    assert calls and calls[0] is not loop_thread
+
+
+def test_routes_keep_blocking_work_off_the_loop(serve, monkeypatch, tmp_path):
+    revocations = RevocationList(SQLiteRevocationStore(str(tmp_path / 'revocations.db')))
+    monkeypatch.setattr(security_manager, 'revocations', revocations)
+    calls = []
+    record_threads(monkeypatch, security_manager, 'validate_token', calls)
+    record_threads(monkeypatch, async_server.monitoring, 'get_system_health', calls)
+    record_threads(monkeypatch, async_server.monitoring, 'get_metric_history', calls)
+
+    def render_metrics():
+        calls.append(threading.current_thread())
+        return b'', 'text/plain'
+    monkeypatch.setattr(async_server, 'render_metrics', render_metrics)
+
+    async def scenario(client):
+        headers = await register(client, 'a')
+        assert (await client.post('/heartbeat/a', headers=headers, json={})).status == 200
+        for path in ('/status', '/health', '/metrics', '/metrics/response_time'):
+            assert (await client.get(path, headers=headers)).status == 200, path
+        return threading.current_thread()
+
+    loop_thread = serve(scenario)
+    revocations.close()
+    assert len(calls) >= 7
+    assert all(thread is not loop_thread for thread in calls)
+
+
+def test_async_routes_match_flask_behaviour(serve, mcp):
+    async def scenario(client):
+        headers = await register(client, 'a')
+        await register(client, 'b')
+        response = await client.post('/heartbeat/a', headers=headers, json={'status': 'busy'})
+        assert response.status == 200
+        assert 'X-Heartbeat-Interval' in response.headers
+        assert (await client.post('/heartbeat/b', headers=headers, json={})).status == 401
+        assert (await client.post('/heartbeat/a', json={})).status == 401
+
+        body = await (await client.get('/status?limit=1&fields=status', headers=headers)).json()
+        assert body['agents'] == {'a': {'status': 'busy'}}
+        assert (body['total_agents'], body['next_cursor']) == (2, 'a')
+        response = await client.get('/status?format=ndjson', headers=headers)
+        assert len((await response.text()).splitlines()) == 2
+
+    serve(scenario)
+    assert mcp.agents.get('a').status == 'busy'
+
+
+def test_session_status_frames_and_disconnect(serve, mcp):
+    async def scenario(client):
+        headers = await register(client, 'a')
+        ws = await client.ws_connect('/session/a', headers=headers)
+        await ws.send_json({'type': 'status', 'status': 'working'})
+        await ws.send_str('not json')  # Ignored, the session stays open
+        await ws.send_json({'type': 'status', 'status': 'idle'})
+        assert await async_server.session_hub.send('a', 'reload', force=True)
+        command = await ws.receive_json()
+        assert command == {'type': 'command', 'command': 'reload', 'params': {'force': True}}
+        assert 'a' in async_server.session_hub
+        assert mcp.agents.get('a').status == 'idle'
+        await ws.close()
+        for _ in range(100):
+            if 'a' not in async_server.session_hub:
+                break
+            await asyncio.sleep(0.01)
+
+    serve(scenario)
+    assert 'a' not in async_server.session_hub
+    assert mcp.agents.get('a').status == 'disconnected'
+
+
+def test_newer_session_replaces_older(serve):
+    async def scenario(client):
+        headers = await register(client, 'a')
+        first = await client.ws_connect('/session/a', headers=headers)
+        await first.send_json({'type': 'status', 'status': 'active'})
+        second = await client.ws_connect('/session/a', headers=headers)
+        await first.receive()
+        assert first.close_code == async_server.CLOSE_REPLACED
+        assert await async_server.session_hub.broadcast('ping') == 1
+        assert (await second.receive_json())['command'] == 'ping'
+        await second.close()
+
+    serve(scenario)
+
+
+def test_session_for_unknown_agent_is_closed(serve, mcp):
+    async def scenario(client):
+        headers = await register(client, 'a')
+        mcp.agents.remove('a')
+        ws = await client.ws_connect('/session/a', headers=headers)
+        await ws.receive()
+        return ws.close_code
+
+    assert serve(scenario) == async_server.CLOSE_UNKNOWN_AGENT
+
+
+def test_agent_session_gives_up_on_servers_without_sessions():
+    attempts = []
+
+    @web.middleware
+    async def count(request, handler):
+        attempts.append(request.path)
+        return await handler(request)
+
+    async def main():
+        async with TestServer(web.Application(middlewares=[count])) as wsgi_like:
+            session = AgentSession(MCPAgent('a', str(wsgi_like.make_url(''))), min_backoff=0.01)
+            session._loop = asyncio.get_running_loop()
+            await asyncio.wait_for(session._run(), 5)  # Returns instead of retrying
+            return session
+
+    assert not asyncio.run(main()).connected
+    assert attempts == ['/session/a']
@@ -0,0 +1,28 @@
+import hashlib
+
+from a2a_mcp.bloom import BloomFilter
+
+
+def key(value):
+    return hashlib.sha256(value.encode()).digest()[:16]
+
+
+def test_bloom_filter_has_no_false_negatives_and_few_false_positives():
+    bloom = BloomFilter(capacity=1000, false_positive_rate=0.01)
+    keys = [key(f"jti-{i}") for i in range(1000)]
+    for k in keys:
+        bloom.add(k)
+    assert all(k in bloom for k in keys)
+    false_positives = sum(key(f"other-{i}") in bloom for i in range(10000))
+    assert false_positives < 300  # ~1% expected
+
+
+def test_precomputed_indexes_match_key_lookups():
+    a, b = BloomFilter(1000, 0.01), BloomFilter(1000, 0.01)
+    indexes = a.indexes(key('x'))
+    assert indexes == b.indexes(key('x'))
+    b.add_indexes(indexes)
+    assert key('x') in b and b.contains_indexes(indexes)
+    assert not a.contains_indexes(indexes)
+    assert b.count == 1
+    assert a.memory_bytes == (a.size + 7) // 8
@@ -0,0 +1,24 @@
+import os
+import subprocess
+import sys
+
+from click.testing import CliRunner
+
+import a2a_mcp
+from a2a_mcp.cli import cli
+
+
+def test_help_lists_every_command():
+    result = CliRunner().invoke(cli, ['--help'])
+    assert result.exit_code == 0, result.output
+    for command in ('run-mcp-server', 'run-mcp-agent', 'run-mcp-agents', 'run-a2a-agent'):
+        assert command in result.output
+
+
+def test_cli_runs_as_a_script(tmp_path):
+    # As in the README: `python cli.py ...`, with the package directory first on sys.path
+    script = os.path.join(os.path.dirname(a2a_mcp.__file__), 'cli.py')
+    result = subprocess.run([sys.executable, script, '--help'], cwd=tmp_path,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert 'Error importing modules' not in result.stderr
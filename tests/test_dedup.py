@@ -0,0 +1,89 @@
+from a2a_mcp.agents.dedup import ID_SIZE, MessageFilter, MessageIds, id_bytes
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_message_ids_are_unique_and_compact():
+    ids = MessageIds('agent-1')
+    issued = [ids.next() for _ in range(1000)]
+    assert len(set(issued)) == 1000
+    assert all(len(message_id) == ID_SIZE for message_id in issued)
+    assert len({message_id[:8] for message_id in issued}) == 1
+    # A restarted agent with the same ID draws a new random part
+    restarted = MessageIds('agent-1').next()
+    assert restarted[:4] == issued[0][:4]
+    assert restarted[:8] != issued[0][:8]
+
+
+def test_id_bytes_accepts_wire_and_legacy_forms():
+    message_id = MessageIds('a').next()
+    assert id_bytes(message_id) is message_id
+    assert id_bytes(message_id.hex()) == message_id
+    legacy = id_bytes('a2a-agent-1234-42')
+    assert len(legacy) == ID_SIZE
+    assert legacy == id_bytes('a2a-agent-1234-42')
+    assert id_bytes('z' * 32) != id_bytes('y' * 32)  # 32 characters, but not hex
+
+
+def test_sequential_ids_stay_within_the_error_rate():
+    seen = MessageFilter(capacity=10000, error_rate=0.01)
+    ids = MessageIds('a')
+    keys = [ids.next() for _ in range(10000)]
+    for key in keys:
+        seen.add(key)
+    assert all(key in seen for key in keys)
+    false_positives = sum(ids.next() in seen for _ in range(20000))
+    assert false_positives < 400  # ~1% expected
+
+
+def test_duplicates_are_rejected():
+    seen = MessageFilter(capacity=1000)
+    assert seen.check_and_add('m1')
+    assert not seen.check_and_add('m1')
+    assert not seen.check_and_add(id_bytes('m1'))
+    assert 'm1' in seen
+    assert 'm2' not in seen
+
+
+def test_ids_survive_one_rotation_and_expire_after_ttl():
+    clock = FakeClock()
+    seen = MessageFilter(capacity=1000, ttl=10.0, clock=clock)
+    seen.add('old')
+    clock.now += 5  # ttl / 2: the next call rotates 'old' into the previous generation
+    assert not seen.check_and_add('old')  # Still remembered, and refreshed into the current one
+    seen.add('unrefreshed')
+    clock.now += 5
+    seen.add('tick')  # Rotates again
+    clock.now += 5
+    seen.add('tick2')
+    assert seen.rotations == 3
+    assert 'old' not in seen  # Refreshed once, but not seen again since
+    assert 'unrefreshed' not in seen
+    assert 'tick2' in seen and 'tick' in seen
+
+
+def test_capacity_forces_rotation_and_keeps_memory_fixed():
+    clock = FakeClock()
+    seen = MessageFilter(capacity=100, error_rate=1e-6, ttl=3600.0, clock=clock)
+    size = seen.memory_bytes
+    for i in range(1000):
+        assert seen.check_and_add(f"m{i}")
+    assert seen.rotations >= 9
+    assert seen.memory_bytes == size
+    assert 'm999' in seen and 'm950' in seen  # The last capacity IDs are remembered
+    assert 'm0' not in seen
+
+
+def test_default_filter_size_and_false_positive_rate():
+    seen = MessageFilter()
+    assert seen.memory_bytes < 400 * 1024
+    for i in range(seen.capacity):
+        seen.add(f"m{i}")
+    false_positives = sum(not seen.check_and_add(f"new-{i}") for i in range(20000))
+    assert false_positives < 20000 * 0.004  # At most ~0.2% expected
@@ -0,0 +1,138 @@
+import random
+from collections import deque
+
+import pytest
+
+from a2a_mcp.agents import framing
+from a2a_mcp.agents.a2a_agent import A2AAgent
+from a2a_mcp.agents.connections import parse_address
+from a2a_mcp.agents.dissemination import Flood, Gossip, RecentMessages, create_strategy
+
+PEERS = [('127.0.0.1', port) for port in range(4000, 4010)]
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class Network:
+    """In-memory links between agents; messages are delivered in order by run()"""
+
+    def __init__(self):
+        self.agents = {}
+        self.queue = deque()
+        self.sent = 0
+
+    def join(self, agent):
+        self.agents[agent.address] = agent
+        agent.connections = Link(self)
+
+    def run(self):
+        while self.queue:
+            address, message = self.queue.popleft()
+            self.agents[address].handle_message(message)
+
+
+class Link:
+    def __init__(self, network):
+        self.network = network
+
+    def send(self, address, message):
+        self.send_frame(parse_address(address), framing.encode(message))
+
+    def send_frame(self, address, frame):
+        self.network.sent += 1
+        self.network.queue.append((parse_address(address), framing.decode(frame)))
+
+    def close(self, address):
+        pass
+
+
+class MeshAgent(A2AAgent):
+    def __init__(self, port, **options):
+        super().__init__(f"agent-{port}", '127.0.0.1', port, probe_interval=60, **options)
+        self.delivered = []
+
+    def deliver(self, message):
+        self.delivered.append(message['id'])
+
+
+def mesh(count, edges=None, **options):
+    network = Network()
+    agents = [MeshAgent(5000 + i, **options) for i in range(count)]
+    for agent in agents:
+        network.join(agent)
+    for a, b in edges if edges is not None else [(a, b) for a in range(count) for b in range(count) if a != b]:
+        agents[a].add_peer(agents[b].address)
+    return network, agents
+
+
+def test_flood_selects_every_peer_but_the_excluded():
+    assert Flood().select(PEERS, exclude=[PEERS[0], ('10.0.0.1', 1)]) == PEERS[1:]
+
+
+def test_gossip_selects_fanout_random_peers():
+    gossip = Gossip(fanout=3, rng=random.Random(1))
+    chosen = [tuple(gossip.select(PEERS, exclude=[PEERS[0]])) for _ in range(100)]
+    assert all(len(set(targets)) == 3 and PEERS[0] not in targets for targets in chosen)
+    assert len(set(chosen)) > 10
+    assert gossip.select(PEERS[:3], exclude=[PEERS[0]]) == PEERS[1:3]
+
+
+def test_create_strategy():
+    assert isinstance(create_strategy('flood'), Flood) and create_strategy('flood').max_hops is None
+    gossip = create_strategy('gossip', fanout=2)
+    assert (gossip.fanout, gossip.max_hops, gossip.pull) == (2, 8, True)
+    assert create_strategy('gossip', max_hops=3).max_hops == 3
+    with pytest.raises(ValueError):
+        create_strategy('carrier-pigeon')
+
+
+def test_recent_messages_are_bounded_and_expire():
+    clock = FakeClock()
+    recent = RecentMessages(capacity=3, ttl=10.0, clock=clock)
+    for i in range(5):
+        recent.add(f"m{i}", {'id': f"m{i}"})
+        clock.now += 1
+    assert recent.digest() == ['m4', 'm3', 'm2']
+    assert recent.digest(limit=2) == ['m4', 'm3']
+    assert recent.get(['m0', 'm3']) == [{'id': 'm3'}]
+    clock.now += 7  # m2 is now 10 seconds old
+    assert recent.digest() == ['m4', 'm3']
+    assert len(recent) == 2
+
+
+def test_flood_stops_at_the_hop_limit():
+    network, agents = mesh(5, edges=[(0, 1), (1, 2), (2, 3), (3, 4)], max_hops=2)
+    agents[0].broadcast_message('hello')
+    network.run()
+    assert [len(agent.delivered) for agent in agents] == [1, 1, 1, 0, 0]
+
+
+def test_flood_delivers_once_everywhere():
+    network, agents = mesh(6)
+    agents[0].broadcast_message('hello')
+    network.run()
+    assert all(len(agent.delivered) == 1 for agent in agents)
+
+
+def test_gossip_pull_repairs_what_push_missed():
+    network, agents = mesh(8, dissemination='gossip', fanout=1, max_hops=1)
+    for agent in agents:
+        agent.dissemination.random.seed(2)
+    agents[0].broadcast_message('hello')
+    network.run()
+    assert sum(len(agent.delivered) for agent in agents) == 2  # Origin plus one push
+    pushed = network.sent
+
+    for _ in range(2):  # Anti-entropy rounds: IHAVE, IWANT, then the message itself
+        for agent in agents:
+            for peer in list(agent.peers):
+                agent.anti_entropy(peer)
+        network.run()
+    assert all(agent.delivered == agents[0].delivered for agent in agents)
+    assert network.sent > pushed
@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+pytest.importorskip('prometheus_client')
+
+from prometheus_client.parser import text_string_to_metric_families  # noqa: E402
+
+from a2a_mcp.mcp.exporter import prepare_multiprocess_dir, render_metrics  # noqa: E402
+from a2a_mcp.mcp.monitoring import monitoring  # noqa: E402
+
+
+def scrape():
+    body, content_type = render_metrics()
+    assert content_type.startswith('text/plain')
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for family in text_string_to_metric_families(body.decode())
+        for sample in family.samples
+    }
+
+
+def test_samples_are_exported_on_scrape(monkeypatch):
+    monkeypatch.delenv('PROMETHEUS_MULTIPROC_DIR', raising=False)
+    before = scrape()
+    requests_key = ('mcp_http_requests_total', (('endpoint', 'heartbeat'), ('method', 'POST'), ('status', '200')))
+    errors_key = ('mcp_errors_total', ())
+
+    monitoring.record_metric('agent_count', 42)
+    monitoring.record_metric('response_time', 12.5, labels=('POST', 'heartbeat', '200'))
+    monitoring.record_metric('response_time', 30.0, labels=('POST', 'heartbeat', '200'))
+    monitoring.record_metric('error_rate', 1)
+    after = scrape()  # Flushes the buffered samples first
+
+    assert after[('mcp_agents', ())] == 42
+    assert after[requests_key] - before.get(requests_key, 0) == 2
+    assert after[errors_key] - before.get(errors_key, 0) == 1
+    bucket = ('mcp_response_time_milliseconds_bucket', (('le', '25.0'),))
+    assert after[bucket] - before.get(bucket, 0) == 1
+
+
+def test_configured_multiprocess_dir_is_wiped(tmp_path, monkeypatch):
+    (tmp_path / 'counter_123.db').write_bytes(b'stale')
+    (tmp_path / 'README').write_text('kept')
+    monkeypatch.setenv('PROMETHEUS_MULTIPROC_DIR', str(tmp_path))
+    assert prepare_multiprocess_dir() is None
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['README']
+
+
+def test_temporary_multiprocess_dir_is_returned_for_cleanup(monkeypatch):
+    monkeypatch.delenv('PROMETHEUS_MULTIPROC_DIR', raising=False)
+    directory = prepare_multiprocess_dir()
+    try:
+        assert os.path.isdir(directory)
+        assert os.environ['PROMETHEUS_MULTIPROC_DIR'] == directory
+    finally:
+        os.rmdir(directory)
+        monkeypatch.delenv('PROMETHEUS_MULTIPROC_DIR')
@@ -0,0 +1,153 @@
+import random
+import threading
+
+from a2a_mcp.agents.failure_detector import FailureDetector
+from a2a_mcp.agents.membership import ALIVE, DEAD, SUSPECT, Membership
+
+ME = ('10.0.0.1', 4000)
+PEERS = [('10.0.0.%d' % i, 4000) for i in range(2, 7)]
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakeAgent:
+    """Records what the detector sends; `respond` may answer a message synchronously"""
+
+    agent_id = 'agent'
+
+    def __init__(self, clock, respond=None):
+        self.membership = Membership(ME, clock=clock, dead_ttl=30.0)
+        for peer in PEERS:
+            self.membership.add(peer)
+        self.stop_event = threading.Event()
+        self.sent = []
+        self.changes = []
+        self.respond = respond
+        self.detector = None
+
+    def _send_message(self, target, message_type, payload=None):
+        self.sent.append((tuple(target), message_type, payload))
+        if self.respond is not None:
+            self.respond(self, tuple(target), message_type, payload)
+        return True
+
+    def member_changed(self, address, status):
+        self.changes.append((address, status))
+
+
+def make_detector(respond=None, **options):
+    clock = FakeClock()
+    agent = FakeAgent(clock, respond)
+    options = {'protocol_period': 0.05, 'probe_timeout': 0.01, 'suspicion_mult': 4, **options}
+    agent.detector = FailureDetector(agent, rng=random.Random(1), clock=clock, **options)
+    return agent, agent.detector, clock
+
+
+def ack_directly(agent, target, message_type, payload):
+    if message_type == 'PROBE':
+        agent.detector.handle_ack({'payload': {'seq': payload['seq']}})
+
+
+def test_acknowledged_probe_keeps_the_member_alive():
+    agent, detector, _ = make_detector(ack_directly)
+    assert detector.probe(PEERS[0])
+    assert [message_type for _, message_type, _ in agent.sent] == ['PROBE']
+    assert agent.changes == []
+
+
+def test_missed_probe_asks_others_then_suspects():
+    agent, detector, _ = make_detector(indirect_probes=3)
+    assert not detector.probe(PEERS[0])
+    requests = [(target, payload) for target, message_type, payload in agent.sent if message_type == 'PROBE_REQ']
+    assert len(requests) == 3
+    assert all(target != PEERS[0] and payload['target'] == list(PEERS[0]) for target, payload in requests)
+    assert agent.changes == [(PEERS[0], SUSPECT)]
+    assert agent.membership.status(PEERS[0]) == (0, SUSPECT)
+
+
+def test_indirect_ack_prevents_suspicion():
+    def relay_ack(agent, target, message_type, payload):
+        if message_type == 'PROBE_REQ':  # The helper reached the target and relays its ack
+            agent.detector.handle_ack({'payload': {'seq': payload['seq']}})
+
+    agent, detector, _ = make_detector(relay_ack)
+    assert detector.probe(PEERS[0])
+    assert agent.changes == []
+    assert detector.indirect == 3
+
+
+def test_helper_relays_the_targets_ack_to_the_requester():
+    agent, detector, _ = make_detector()
+    requester = PEERS[1]
+    detector.handle_probe_req({'sender_address': list(requester), 'payload': {'seq': 77, 'target': list(PEERS[0])}})
+    [(target, message_type, payload)] = agent.sent
+    assert (target, message_type) == (PEERS[0], 'PROBE')
+    detector.handle_ack({'payload': {'seq': payload['seq']}})
+    assert agent.sent[-1] == (requester, 'PROBE_ACK', {'seq': 77})
+    detector.handle_ack({'payload': {'seq': payload['seq']}})  # A duplicate ack is not relayed twice
+    assert len(agent.sent) == 2
+
+    detector.handle_probe({'sender_address': list(requester), 'payload': {'seq': 5}})
+    assert agent.sent[-1] == (requester, 'PROBE_ACK', {'seq': 5})
+
+
+def test_stale_relays_are_forgotten():
+    agent, detector, clock = make_detector()
+    detector.handle_probe_req({'sender_address': list(PEERS[1]), 'payload': {'seq': 1, 'target': list(PEERS[0])}})
+    stale_seq = agent.sent[-1][2]['seq']
+    clock.now += 1
+    detector.handle_probe_req({'sender_address': list(PEERS[2]), 'payload': {'seq': 2, 'target': list(PEERS[0])}})
+    detector.handle_ack({'payload': {'seq': stale_seq}})
+    assert [message_type for _, message_type, _ in agent.sent] == ['PROBE', 'PROBE']
+
+
+def test_unrefuted_suspicion_becomes_death():
+    agent, detector, clock = make_detector()
+    agent.membership.set_status(PEERS[0], SUSPECT)
+    detector.expire_suspicions()  # Starts the suspicion timer
+    timeout = detector.suspicion_timeout
+    assert timeout == 4 * 0.05
+    clock.now += timeout - 0.01
+    detector.expire_suspicions()
+    assert agent.membership.status(PEERS[0]) == (0, SUSPECT)
+    clock.now += 0.01
+    detector.expire_suspicions()
+    assert agent.membership.status(PEERS[0]) == (0, DEAD)
+    assert agent.changes == [(PEERS[0], DEAD)]
+    assert PEERS[0] not in agent.membership.live()
+
+
+def test_refuted_suspicion_is_dropped():
+    agent, detector, clock = make_detector()
+    agent.membership.set_status(PEERS[0], SUSPECT)
+    detector.expire_suspicions()
+    agent.membership.merge([[*PEERS[0], 1, ALIVE]])  # The suspect gossiped a higher incarnation
+    clock.now += detector.suspicion_timeout
+    detector.expire_suspicions()
+    assert agent.membership.status(PEERS[0]) == (1, ALIVE)
+    assert agent.changes == []
+    # Suspected again at the new incarnation: the timer starts over
+    agent.membership.set_status(PEERS[0], SUSPECT)
+    detector.expire_suspicions()
+    clock.now += detector.suspicion_timeout / 2
+    detector.expire_suspicions()
+    assert agent.membership.status(PEERS[0]) == (1, SUSPECT)
+
+
+def test_ticks_probe_every_member_once_per_pass_and_expire_tombstones():
+    agent, detector, clock = make_detector(ack_directly)
+    for _ in range(len(PEERS)):
+        detector.tick()
+    assert sorted(target for target, _, _ in agent.sent) == sorted(PEERS)
+    agent.membership.set_status(PEERS[0], DEAD)
+    clock.now += 30
+    agent.sent.clear()
+    detector.tick()
+    assert agent.membership.status(PEERS[0]) is None  # Tombstone expired
+    assert agent.sent[0][0] != PEERS[0]
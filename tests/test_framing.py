@@ -0,0 +1,99 @@
+import random
+
+import pytest
+
+from a2a_mcp.agents import framing
+from a2a_mcp.agents.framing import FrameDecoder, FrameError
+
+CODECS = ['json'] + (['msgpack'] if framing.msgpack is not None else [])
+
+MESSAGE = {'type': 'STATUS_UPDATE', 'id': 'abc', 'content': 'é' * 10, 'hops': 3, 'members': [['10.0.0.1', 4000]]}
+
+
+@pytest.mark.parametrize('codec', CODECS)
+def test_frames_round_trip(codec):
+    frame = framing.encode(MESSAGE, codec)
+    length, version, codec_id = framing.HEADER.unpack_from(frame)
+    assert (length, version, codec_id) == (len(frame) - framing.HEADER.size, framing.VERSION, framing.CODECS[codec])
+    assert framing.decode(frame) == MESSAGE
+
+
+def test_decoder_reassembles_frames_split_anywhere():
+    rng = random.Random(3)
+    messages = [{'id': str(i), 'content': 'x' * rng.choice([0, 5, 3000, 70000])} for i in range(50)]
+    stream = b''.join(framing.encode(message, rng.choice(CODECS)) for message in messages)
+    decoder = FrameDecoder()
+    decoded = []
+    offset = 0
+    while offset < len(stream):
+        size = rng.choice([1, 2, 5, 6, 7, 100, 9000])
+        decoded.extend(decoder.feed(stream[offset:offset + size]))
+        offset += size
+    assert decoded == messages
+    assert decoder.pending == 0
+
+
+def test_partial_header_stays_buffered():
+    frame = framing.encode({'a': 1})
+    decoder = FrameDecoder()
+    assert decoder.feed(frame[:3]) == []
+    assert decoder.pending == 3
+    assert decoder.feed(frame[3:] + frame) == [{'a': 1}, {'a': 1}]
+    assert decoder.pending == 0
+
+
+def test_oversized_frames_are_refused():
+    with pytest.raises(FrameError):
+        FrameDecoder(max_frame=10).feed(framing.encode({'content': 'x' * 100}))
+    with pytest.raises(FrameError):
+        framing.encode({'content': 'x' * (framing.MAX_FRAME + 1)})
+
+
+def test_unknown_versions_and_codecs_are_refused():
+    body = b'{}'
+    with pytest.raises(FrameError, match='version'):
+        framing.decode(framing.HEADER.pack(len(body), 9, framing.CODEC_JSON) + body)
+    with pytest.raises(FrameError, match='codec'):
+        framing.decode(framing.HEADER.pack(len(body), framing.VERSION, 7) + body)
+    # A bare length-prefixed JSON body is not a frame
+    with pytest.raises(FrameError):
+        FrameDecoder().feed(len(body).to_bytes(4, 'big') + body + b'    ')
+
+
+def test_decode_wants_exactly_one_frame():
+    with pytest.raises(FrameError):
+        framing.decode(framing.encode({'a': 1}) * 2)
+    with pytest.raises(FrameError):
+        framing.decode(framing.encode({'a': 1})[:-1])
+
+
+def test_msgpack_bodies_are_smaller_and_carry_bytes():
+    msgpack = pytest.importorskip('msgpack')
+    assert msgpack is framing.msgpack
+    message = {'id': bytes(range(16)), 'hops': 2, 'members': [['10.0.0.1', 4000, 7, 'alive']] * 20}
+    assert framing.decode(framing.encode(message, 'msgpack')) == message
+    with pytest.raises(TypeError):
+        framing.encode(message, 'json')
+    del message['id']
+    assert len(framing.encode(message, 'msgpack')) < len(framing.encode(message, 'json'))
+
+
+def test_msgpack_frames_need_msgpack(monkeypatch):
+    pytest.importorskip('msgpack')
+    frame = framing.encode({'a': 1}, 'msgpack')
+    monkeypatch.setattr(framing, 'msgpack', None)
+    with pytest.raises(FrameError, match='msgpack'):
+        framing.encode({'a': 1}, 'msgpack')
+    with pytest.raises(FrameError, match='msgpack'):
+        framing.decode(frame)
+    assert framing.decode(framing.encode({'a': 1})) == {'a': 1}  # JSON works without it
+
+
+def test_agents_validate_their_wire_codec(monkeypatch):
+    from a2a_mcp.agents.a2a_agent import A2AAgent
+
+    with pytest.raises(ValueError, match='codec'):
+        A2AAgent('a', '127.0.0.1', 4000, wire_codec='xml')
+    monkeypatch.setattr(framing, 'msgpack', None)
+    with pytest.raises(ValueError, match='msgpack'):
+        A2AAgent('a', '127.0.0.1', 4000, wire_codec='msgpack')
@@ -0,0 +1,92 @@
+import random
+
+from a2a_mcp.agents.heartbeat import HeartbeatScheduler
+from a2a_mcp.mcp.load import HeartbeatLoad
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def scheduler(**options):
+    return HeartbeatScheduler(rng=random.Random(7), **options)
+
+
+def test_first_delays_spread_over_the_interval():
+    rng = random.Random(1)
+    delays = [HeartbeatScheduler(30.0, rng=rng).first_delay() for _ in range(1000)]
+    assert all(0 <= delay < 30 for delay in delays)
+    assert sum(delay < 10 for delay in delays) > 250  # Roughly uniform, not bunched at one end
+    assert sum(delay >= 20 for delay in delays) > 250
+
+
+def test_success_delays_jitter_around_the_interval():
+    heartbeats = scheduler(interval=30.0, jitter=0.1)
+    delays = [heartbeats.success() for _ in range(200)]
+    assert all(27 <= delay <= 33 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_server_advice_is_adopted_within_bounds():
+    heartbeats = scheduler(interval=30.0, min_interval=5.0, max_interval=45.0, jitter=0.0)
+    heartbeats.advise({'X-Heartbeat-Interval': '40.0', 'X-Server-Load': '1.33'})
+    assert (heartbeats.success(), heartbeats.server_load) == (40.0, 1.33)
+    heartbeats.advise({'X-Heartbeat-Interval': '600'})
+    assert heartbeats.success() == 45.0
+    heartbeats.advise({'X-Heartbeat-Interval': '0.1'})
+    assert heartbeats.success() == 5.0
+    heartbeats.advise({'X-Heartbeat-Interval': 'soon'})  # Malformed advice is ignored
+    assert heartbeats.success() == 5.0
+
+
+def test_failures_back_off_with_decorrelated_jitter_and_reset_on_success():
+    heartbeats = scheduler(base_backoff=1.0, max_backoff=30.0)
+    delays = [heartbeats.failure() for _ in range(50)]
+    assert all(1.0 <= delay <= 30.0 for delay in delays)
+    assert max(delays) > 10  # Grows towards the cap
+    previous = 1.0
+    for delay in delays:
+        assert delay <= min(30.0, previous * 3)
+        previous = delay
+    heartbeats.success()
+    assert heartbeats.failure() <= 3.0  # Starts over from the base
+
+
+def test_load_counts_the_last_complete_window():
+    clock = FakeClock()
+    load = HeartbeatLoad(target_rate=10, interval=30, max_interval=45, window=10, clock=clock)
+    for _ in range(10):
+        load.record(50)
+        clock.now += 1
+    assert load.rate() == 50.0
+    load.record(1000)  # The current second is not complete yet
+    assert load.rate() == 50.0
+    clock.now += 20
+    assert load.rate() == 0.0
+
+
+def test_advised_interval_stretches_with_load_up_to_the_cap():
+    clock = FakeClock()
+    load = HeartbeatLoad(target_rate=100, interval=30, max_interval=45, window=10, clock=clock)
+    assert load.headers() == {'X-Server-Load': '0.00', 'X-Heartbeat-Interval': '30.0'}
+    for rate, interval in ((50, '30.0'), (120, '36.0'), (1000, '45.0')):
+        clock.now += 10
+        for _ in range(10):
+            load.record(rate)
+            clock.now += 1
+        assert load.headers()['X-Heartbeat-Interval'] == interval
+
+
+def test_advice_is_cached_within_a_second():
+    clock = FakeClock()
+    load = HeartbeatLoad(target_rate=1, interval=30, max_interval=45, window=1, clock=clock)
+    first = load.headers()
+    load.record(100)
+    clock.now += 0.5
+    assert load.headers() is first
+    clock.now += 1
+    assert load.headers()['X-Server-Load'] == '100.00'
@@ -0,0 +1,154 @@
+import random
+
+from a2a_mcp.agents.membership import ALIVE, BUCKETS, DEAD, SUSPECT, Membership
+
+ME = ('10.0.0.1', 4000)
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def member(i):
+    return ('10.0.1.%d' % (i % 250), 5000 + i)
+
+
+def entry(i, incarnation=0, status=ALIVE):
+    return [*member(i), incarnation, status]
+
+
+def view(membership):
+    return sorted(map(tuple, membership.entries()))
+
+
+def test_newer_entries_win():
+    members = Membership(ME)
+    assert members.merge([entry(1)]) == [(member(1), ALIVE)]
+    assert members.merge([entry(1)]) == []  # Nothing new
+    assert members.merge([entry(1, 0, SUSPECT)]) == [(member(1), SUSPECT)]
+    assert members.merge([entry(1, 0, ALIVE)]) == []  # Lower state at the same incarnation
+    assert members.merge([entry(1, 1, ALIVE)]) == [(member(1), ALIVE)]  # Refuted
+    assert members.status(member(1)) == (1, ALIVE)
+    assert members.merge([[*member(2), '3']]) == [(member(2), ALIVE)]  # Status defaults to alive
+    assert members.live() == [member(1), member(2)]
+
+
+def test_malformed_entries_are_skipped():
+    members = Membership(ME)
+    bad = [entry(1, 0, 7), entry(2, -1), [*member(3)], ['10.0.1.4', 'port', 0], [None, 5000, 0],
+           ['10.0.1.5', 70000, 0], {'host': '10.0.1.6'}, 'junk', 42]
+    assert members.merge(bad + [entry(9)]) == [(member(9), ALIVE)]
+    assert members.live() == [member(9)]
+
+
+def test_merge_is_order_independent():
+    rng = random.Random(0)
+    updates = [entry(rng.randrange(20), rng.randrange(3), rng.choice([ALIVE, SUSPECT, DEAD])) for _ in range(200)]
+    expected = None
+    for seed in range(5):
+        shuffled = updates[:]
+        random.Random(seed).shuffle(shuffled)
+        members = Membership(ME)
+        members.merge([entry(i) for i in range(20)])  # Known first, so tombstones are not ignored
+        for update in shuffled:
+            members.merge([update])
+        if expected is None:
+            expected = (view(members), members.digest)
+        assert (view(members), members.digest) == expected
+
+
+def test_a_member_refutes_suspicion_of_itself():
+    members = Membership(ME, incarnation=5)
+    assert members.merge([[*ME, 5, SUSPECT]]) == []
+    assert members.status(ME) == (6, ALIVE)
+    assert [*ME, 6, ALIVE] in members.piggyback()
+    assert members.merge([[*ME, 3, DEAD]]) == []  # Stale: already superseded
+    assert members.incarnation == 6
+
+
+def test_tombstones_block_resurrection_until_they_expire():
+    clock = FakeClock()
+    members = Membership(ME, dead_ttl=60.0, clock=clock)
+    assert members.merge([entry(9, 0, DEAD)]) == []  # Unknown dead members are ignored
+    assert members.status(member(9)) is None
+    members.merge([entry(1)])
+    members.set_status(member(1), DEAD)
+    assert not members.add(member(1))  # Old news at the same incarnation
+    assert members.live() == []
+    clock.now += 59
+    assert members.expire_dead() == []
+    clock.now += 1
+    assert members.expire_dead() == [member(1)]
+    assert members.status(member(1)) is None
+    assert members.add(member(1), incarnation=1)
+
+
+def test_deltas_only_carry_changes_since_the_last_round():
+    members = Membership(ME, max_updates=3)
+    members.merge([entry(i) for i in range(5)])
+    peer = member(100)
+    assert members.deltas(peer) == []  # Unknown peer: left to the digest and bucket sync
+    members.merge([entry(1, 1)])
+    members.set_status(member(2), SUSPECT)
+    assert members.deltas(peer) == [entry(2, 0, SUSPECT), entry(1, 1)]
+    assert members.deltas(peer) == []
+    members.merge([entry(i, 2) for i in range(5)])
+    assert len(members.deltas(peer)) == 3  # Capped; the rest is repaired by a bucket sync
+
+
+def test_updates_from_an_up_to_date_peer_are_not_echoed():
+    members = Membership(ME)
+    peer = member(100)
+    members.deltas(peer)
+    members.merge([entry(1)], source=peer)
+    assert members.deltas(peer) == []
+    other = member(101)
+    members.deltas(other)
+    members.merge([entry(2)], source=peer)
+    assert members.deltas(other) == [entry(2)]  # Only the sender is known to have it
+
+
+def test_equal_views_have_equal_digests():
+    a, b = Membership(ME), Membership(member(0))
+    a.merge([entry(i) for i in range(1, 50)] + [[*member(0), 0, ALIVE]])
+    b.merge([[*ME, 0, ALIVE]] + [entry(i) for i in reversed(range(1, 50))])
+    assert a.digest == b.digest
+    assert a.bucket_digests() == b.bucket_digests()
+    b.merge([entry(7, 1)])
+    assert a.digest != b.digest
+    a.remove(member(3))
+    b.remove(member(3))
+    a.merge([entry(7, 1)])
+    assert a.digest == b.digest
+
+
+def test_bucket_sync_repairs_differing_views():
+    a, b = Membership(ME), Membership(ME)
+    a.merge([entry(i) for i in range(100)])
+    b.merge([entry(i) for i in range(50, 150)] + [entry(60, 3, SUSPECT)])
+    buckets = a.differing_buckets(b.bucket_digests())
+    assert 0 < len(buckets) <= BUCKETS
+    a_side, b_side = a.entries(buckets), b.entries(buckets)
+    b.merge(a_side)
+    a.merge(b_side)
+    assert a.digest == b.digest
+    assert view(a) == view(b)
+    assert a.status(member(60)) == (3, SUSPECT)
+    assert len(a) == 151
+
+
+def test_failure_detector_changes_are_piggybacked_a_limited_number_of_times():
+    members = Membership(ME, retransmit_mult=2)
+    members.piggyback(limit=10)
+    members.piggyback(limit=10)  # Our own entry has been sent twice now
+    members.merge([entry(1)])
+    assert members.piggyback() == []  # Plain joins travel with deltas only
+    members.set_status(member(1), SUSPECT)
+    sent = 0
+    while members.piggyback():
+        sent += 1
+    assert sent == 2  # retransmit_mult * ceil(log10(members + 1)) with two members
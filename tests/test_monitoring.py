@@ -0,0 +1,234 @@
+import os
+import threading
+
+import pytest
+
+from a2a_mcp.mcp.monitoring import (
+    HistogramMetric, LogHistogram, Metric, MetricRollups, MonitoringSystem, TimeSeriesBuffer, window_label
+)
+
+
+def test_buffer_keeps_samples_in_order():
+    buffer = TimeSeriesBuffer(4)
+    for i in range(3):
+        buffer.append(float(i), i * 10.0)
+    assert len(buffer) == 3
+    assert list(buffer.items_since(float('-inf'))) == [(0.0, 0.0), (1.0, 10.0), (2.0, 20.0)]
+
+
+def test_buffer_overwrites_oldest_when_full():
+    buffer = TimeSeriesBuffer(3)
+    for i in range(5):
+        buffer.append(float(i), float(i))
+    assert len(buffer) == 3
+    assert [t for t, _ in buffer.items_since(float('-inf'))] == [2.0, 3.0, 4.0]
+    # The wrapped buffer is returned as two contiguous slices
+    assert [list(chunk) for chunk in buffer.values_since(float('-inf'))] == [[2.0], [3.0, 4.0]]
+
+
+def test_buffer_clamps_out_of_order_timestamps():
+    buffer = TimeSeriesBuffer(4)
+    buffer.append(5.0, 1.0)
+    buffer.append(3.0, 2.0)
+    assert list(buffer.items_since(float('-inf'))) == [(5.0, 1.0), (5.0, 2.0)]
+
+
+def test_buffer_window_and_eviction():
+    buffer = TimeSeriesBuffer(8)
+    for i in range(6):
+        buffer.append(float(i), float(i))
+    assert [t for t, _ in buffer.items_since(2.0)] == [3.0, 4.0, 5.0]
+    buffer.evict_until(3.0)
+    assert len(buffer) == 2
+    assert [t for t, _ in buffer.items_since(float('-inf'))] == [4.0, 5.0]
+    buffer.evict_until(10.0)
+    assert len(buffer) == 0
+    assert buffer.values_since(float('-inf')) == []
+
+
+def test_buffer_rejects_zero_capacity():
+    with pytest.raises(ValueError):
+        TimeSeriesBuffer(0)
+
+
+def test_metric_drops_points_past_retention():
+    metric = Metric('latency', 'test', retention_period=10, capacity=16)
+    for t in (100.0, 105.0, 112.0, 115.0):
+        metric.add_point(1.0, t)
+    assert [point.timestamp for point in metric.points] == [112.0, 115.0]
+
+
+def test_metric_average_outside_rollup_windows(monkeypatch):
+    metric = Metric('latency', 'test', capacity=16, rollup_windows=(60,))
+    monkeypatch.setattr('a2a_mcp.mcp.monitoring.time.time', lambda: 1000.0)
+    metric.add_point(10.0, 900.0)
+    metric.add_point(20.0, 990.0)
+    metric.add_point(30.0, 995.0)
+    assert metric.get_average(30) == 25.0
+    assert metric.get_average(200) == 20.0
+    assert metric.get_average(1) is None
+
+
+def test_rollup_window_slides():
+    rollups = MetricRollups((10,))
+    rollups.add(100.2, 5.0)
+    rollups.add(100.7, 1.0)
+    rollups.add(104.0, 9.0)
+    assert rollups.summary(10, now=105.0) == {'count': 3, 'average': 5.0, 'min': 1.0, 'max': 9.0}
+    # Second 100 slides out; min and max come from what is left
+    assert rollups.summary(10, now=110.5) == {'count': 1, 'average': 9.0, 'min': 9.0, 'max': 9.0}
+    assert rollups.summary(10, now=200.0) is None
+
+
+def test_rollup_windows_are_independent():
+    rollups = MetricRollups((5, 60))
+    for second in range(100, 120):
+        rollups.add(float(second), float(second))
+    assert rollups.summary(5, now=119.5)['count'] == 5
+    assert rollups.summary(5, now=119.5)['min'] == 115.0
+    assert rollups.summary(60, now=119.5)['count'] == 20
+    assert rollups.summary(60, now=119.5)['average'] == 109.5
+
+
+def test_rollup_min_max_memory_is_per_bucket():
+    rollups = MetricRollups((10,))
+    for i in range(10000):  # A rising series, 1000 samples a second
+        rollups.add(100 + i / 1000, float(i))
+    window = rollups.windows[10]
+    assert len(window._mins) <= 10 and len(window._maxs) <= 10
+    assert rollups.summary(10, now=109.9) == {'count': 10000, 'average': 4999.5, 'min': 0.0, 'max': 9999.0}
+    assert rollups.summary(10, now=110.0)['min'] == 1000.0
+
+
+def test_metric_average_uses_rollup(monkeypatch):
+    metric = Metric('agent_count', 'test', capacity=16, rollup_windows=(60,))
+    monkeypatch.setattr('a2a_mcp.mcp.monitoring.time.time', lambda: 1000.0)
+    metric.add_point(4.0, 930.0)  # Outside the minute
+    metric.add_point(2.0, 990.0)
+    metric.add_point(6.0, 999.0)
+    assert metric.get_average(60) == 4.0
+    assert metric.window_summary(60)['max'] == 6.0
+
+
+@pytest.mark.parametrize('seconds, label', [(60, '1m'), (300, '5m'), (3600, '1h'), (90, '90s')])
+def test_window_label(seconds, label):
+    assert window_label(seconds) == label
+
+
+def test_histogram_quantiles_within_relative_accuracy():
+    sketch = LogHistogram(relative_accuracy=0.01)
+    values = [float(v) for v in range(1, 10001)]
+    for value in values:
+        sketch.add(value)
+    for q, estimate in zip((0.5, 0.9, 0.99), sketch.quantiles((0.5, 0.9, 0.99))):
+        exact = values[int(q * (len(values) - 1))]
+        assert abs(estimate - exact) <= 0.01 * exact
+    assert sketch.count == 10000
+    assert sketch.total == sum(values)
+
+
+def test_histogram_small_values_count_as_zero():
+    sketch = LogHistogram(min_value=1.0)
+    sketch.add(0.5, count=3)
+    sketch.add(100.0)
+    assert sketch.zero_count == 3
+    assert sketch.quantiles((0.5,)) == [0.0]
+    assert LogHistogram().quantiles((0.5, 0.99)) == [None, None]
+
+
+def test_histogram_merge_and_subtract_round_trip():
+    a, b = LogHistogram(), LogHistogram()
+    for value in (1.0, 10.0, 100.0):
+        a.add(value)
+    for value in (10.0, 1000.0):
+        b.add(value)
+    merged = LogHistogram()
+    merged.merge(a)
+    merged.merge(b)
+    assert merged.count == 5
+    merged.subtract(b)
+    assert merged.counts == a.counts
+    assert merged.count == 3
+
+
+def test_histogram_metric_window_summary():
+    metric = HistogramMetric('response_time', 'test', rollup_windows=(60,))
+    for i in range(100):
+        metric.add_point(float(i + 1), 1000.0 + i * 0.1)
+    summary = metric.window_summary(60, now=1010.0)
+    assert summary['count'] == 100
+    assert summary['min'] == 1.0 and summary['max'] == 100.0
+    assert abs(summary['p50'] - 50.0) <= 1.0
+    assert summary['p999'] <= summary['max']
+    assert metric.points == []
+    # A minute later the per-second sketches have slid out of the window
+    assert metric.window_summary(60, now=1100.0) is None
+
+
+def test_histogram_metric_history_downsamples():
+    metric = HistogramMetric('response_time', 'test', rollup_windows=(60,))
+    for second in range(120):
+        metric.add_point(5.0, 1200.0 + second)
+    history = metric.history(0, step=60)
+    assert [slot['timestamp'] for slot in history] == [1200, 1260]
+    assert [slot['count'] for slot in history] == [60, 60]
+
+
+def test_flush_merges_every_thread_buffer():
+    system = MonitoringSystem(flush_interval=3600)
+    batches = []
+    system.add_flush_listener(batches.append)
+    system.record_metric('agent_count', 1)
+    worker = threading.Thread(target=system.record_metric, args=('agent_count', 3))
+    worker.start()
+    worker.join()
+    system.flush()
+    assert sorted(p.value for p in system.metrics['agent_count'].points) == [1, 3]
+    assert len(batches) == 1 and len(batches[0]) == 2
+    system.flush()  # Nothing new: listeners are not called again
+    assert len(batches) == 1
+
+
+@pytest.mark.parametrize('name', ['agent_count', 'response_time'])
+def test_non_finite_samples_are_dropped(name):
+    system = MonitoringSystem(flush_interval=3600)
+    for value in (1.0, float('nan'), float('inf'), float('-inf'), 3.0):
+        system.record_metric(name, value)
+    system.flush()
+    assert system.metrics[name].get_average(60) == 2.0
+
+
+def test_flush_keeps_batch_when_one_sample_fails():
+    system = MonitoringSystem(flush_interval=3600)
+    batches = []
+    system.add_flush_listener(batches.append)
+    system.record_metric('agent_count', 1)
+    system.record_metric('agent_count', 'not a number')
+    system.record_metric('agent_count', 2)
+    system.record_metric('no_such_metric', 5)
+    system.flush()
+    assert [p.value for p in system.metrics['agent_count'].points] == [1, 2]
+    assert system._pending == []
+    assert [value for _, _, value, _ in batches[0]] == [1, 2]  # Listeners only see accepted samples
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs os.fork')
+@pytest.mark.filterwarnings('ignore::DeprecationWarning')
+def test_forked_child_gets_fresh_buffers_and_flusher():
+    system = MonitoringSystem(flush_interval=0.01)
+    system.record_metric('agent_count', 1)  # Left in the parent's buffer
+    pid = os.fork()
+    if pid == 0:
+        ok = False
+        try:
+            assert system._buffers == [] and system._flusher is None
+            system.record_metric('agent_count', 7)
+            assert system._flusher is not None and system._flusher.is_alive()
+            system.flush()
+            ok = [p.value for p in system.metrics['agent_count'].points] == [7]
+        finally:
+            os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    system.flush()
+    assert [p.value for p in system.metrics['agent_count'].points] == [1]
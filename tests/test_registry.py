@@ -0,0 +1,164 @@
+import sys
+import time
+from datetime import datetime
+
+import pytest
+
+from a2a_mcp.mcp.registry import (
+    AgentData, MemoryRegistry, SQLiteRegistry, create_registry, monotonic_to_iso, monotonic_to_wall,
+    wall_to_monotonic
+)
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def registry(request, tmp_path):
+    return create_registry(request.param, str(tmp_path / 'registry.db'), agent_timeout=60)
+
+
+def agent(status='active', age=0.0, host='10.0.0.1', port=4000):
+    return AgentData(time.monotonic() - age, status, host, port)
+
+
+def test_add_get_remove(registry):
+    assert registry.add('a', agent(), max_agents=10)
+    assert 'a' in registry and 'b' not in registry
+    data = registry.get('a')
+    assert (data.status, data.address) == ('active', ('10.0.0.1', 4000))
+    assert len(registry) == 1
+    assert registry.remove('a')
+    assert not registry.remove('a')
+    assert registry.get('a') is None
+    assert len(registry) == 0
+
+
+def test_add_respects_max_agents(registry):
+    assert registry.add('a', agent(), max_agents=2)
+    assert registry.add('b', agent(), max_agents=2)
+    assert not registry.add('c', agent(), max_agents=2)
+    assert len(registry) == 2
+
+
+def test_touch_updates_last_seen_and_status(registry):
+    registry.add('a', agent(age=30), max_agents=10)
+    before = registry.get('a').last_seen
+    assert registry.touch('a', 'busy')
+    data = registry.get('a')
+    assert data.status == 'busy' and data.last_seen > before
+    assert registry.touch('a')  # No status keeps the current one
+    assert registry.get('a').status == 'busy'
+    assert not registry.touch('missing')
+
+
+def test_items_are_copies(registry):
+    registry.add('a', agent(), max_agents=10)
+    (agent_id, data), = registry.items()
+    data.status = 'changed'
+    assert registry.get('a').status == 'active'
+
+
+def test_sqlite_registry_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / 'registry.db')
+    first = SQLiteRegistry(path, agent_timeout=60)
+    second = SQLiteRegistry(path, agent_timeout=60)
+    assert first.add('a', agent(), max_agents=1)
+    assert 'a' in second
+    assert not second.add('b', agent(), max_agents=1)  # The limit counts every process's agents
+    assert second.touch('a', 'busy')
+    assert first.get('a').status == 'busy'
+    assert second.remove('a')
+    assert len(first) == 0
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        create_registry('redis')
+    with pytest.raises(ValueError):
+        create_registry('sqlite', None)
+    assert isinstance(create_registry('memory'), MemoryRegistry)
+
+
+def test_expire_removes_only_overdue_agents(registry):
+    registry.add('old', agent(age=120), max_agents=10)
+    registry.add('older', agent(age=300), max_agents=10)
+    registry.add('fresh', agent(age=5), max_agents=10)
+    assert sorted(registry.expire(limit=100)) == ['old', 'older']
+    assert [agent_id for agent_id, _ in registry.items()] == ['fresh']
+    assert registry.expire(limit=100) == []
+
+
+def test_expire_in_batches_oldest_first(registry):
+    for i in range(5):
+        registry.add(f"agent-{i}", agent(age=100 + i), max_agents=10)
+    assert registry.expire(limit=2) == ['agent-4', 'agent-3']
+    assert len(registry.expire(limit=10)) == 3
+    assert len(registry) == 0
+
+
+def test_heartbeat_postpones_expiry(registry):
+    registry.add('a', agent(age=120), max_agents=10)
+    assert registry.touch('a')
+    assert registry.expire(limit=10) == []
+    assert 'a' in registry
+
+
+def test_memory_expiry_heap_stays_bounded():
+    registry = MemoryRegistry(agent_timeout=60)
+    registry.add('a', agent(), max_agents=10)
+    for _ in range(5000):
+        registry.touch('a')
+    # Stale deadlines are compacted away instead of piling up
+    assert len(registry._expiry_heap) <= 2 * len(registry) + 1024
+
+
+def test_server_starts_the_cleanup_thread(monkeypatch):
+    from a2a_mcp.mcp import server
+
+    monkeypatch.setattr(server, 'agents', MemoryRegistry(agent_timeout=60))
+    thread = server.start_cleanup_thread()
+    assert thread.daemon and thread.is_alive()
+
+
+def test_agent_data_is_slotted_and_interns_status():
+    data = AgentData(time.monotonic(), ''.join(['act', 'ive']), None, None)
+    assert not hasattr(data, '__dict__')
+    assert data.status is sys.intern('active')  # One shared string per distinct status
+    with pytest.raises(AttributeError):
+        data.extra = 1
+
+
+def test_monotonic_wall_conversions_round_trip():
+    now = time.monotonic()
+    assert abs(wall_to_monotonic(monotonic_to_wall(now - 30)) - (now - 30)) < 0.01
+    assert monotonic_to_iso(now, offset=0.0) == datetime.fromtimestamp(now).isoformat()
+
+
+def test_sqlite_keeps_monotonic_api(tmp_path):
+    registry = SQLiteRegistry(str(tmp_path / 'registry.db'), agent_timeout=60)
+    last_seen = time.monotonic() - 12
+    registry.add('a', AgentData(last_seen, 'active', None, None), max_agents=10)
+    # Stored as Unix time, handed back on the monotonic clock
+    assert abs(registry.get('a').last_seen - last_seen) < 0.01
+
+
+def test_page_walks_ids_in_order(registry):
+    for i in (3, 1, 4, 0, 2):
+        registry.add(f"agent-{i}", agent(), max_agents=10)
+    first = registry.page(None, 2)
+    assert [agent_id for agent_id, _ in first] == ['agent-0', 'agent-1']
+    second = registry.page(first[-1][0], 2)
+    assert [agent_id for agent_id, _ in second] == ['agent-2', 'agent-3']
+    assert [agent_id for agent_id, _ in registry.page('agent-3', 2)] == ['agent-4']
+    # Registrations after the cursor show up on later pages
+    registry.add('agent-5', agent(), max_agents=10)
+    assert [agent_id for agent_id, _ in registry.page('agent-4', 2)] == ['agent-5']
+
+
+def test_page_filters(registry):
+    registry.add('idle', agent(status='idle', age=50), max_agents=10)
+    registry.add('busy-old', agent(status='busy', age=40), max_agents=10)
+    registry.add('busy-new', agent(status='busy', age=1), max_agents=10)
+    now = time.monotonic()
+    assert [a for a, _ in registry.page(None, 10, status='busy')] == ['busy-new', 'busy-old']
+    assert [a for a, _ in registry.page(None, 10, seen_after=now - 10)] == ['busy-new']
+    assert [a for a, _ in registry.page(None, 10, seen_before=now - 10)] == ['busy-old', 'idle']
+    assert [a for a, _ in registry.page(None, 10, status='busy', seen_before=now - 10)] == ['busy-old']
@@ -0,0 +1,90 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from a2a_mcp.mcp.revocation import MemoryRevocationStore, RevocationList, SQLiteRevocationStore, revocation_key
+
+
+class CountingStore(MemoryRevocationStore):
+    def __init__(self):
+        super().__init__()
+        self.lookups = 0
+
+    def contains(self, key, now):
+        self.lookups += 1
+        return super().contains(key, now)
+
+
+@pytest.fixture
+def revocations():
+    revocations = RevocationList(CountingStore(), bloom_capacity=1000, sync_interval=3600)
+    yield revocations
+    revocations.close()
+
+
+def test_unrevoked_lookups_are_answered_by_the_filter(revocations):
+    revocations.revoke(revocation_key('revoked'), time.time() + 60)
+    for i in range(1000):
+        assert not revocations.is_revoked(revocation_key(f"live-{i}"))
+    # At p = 0.001 a handful of Bloom false positives may fall through to the store
+    assert revocations.store.lookups <= 10
+    assert revocations.is_revoked(revocation_key('revoked'))
+
+
+def test_revocations_expire(revocations):
+    now = time.time()
+    key = revocation_key('short-lived')
+    revocations.revoke(key, now + 0.05)
+    assert revocations.is_revoked(key)
+    time.sleep(0.1)
+    assert not revocations.is_revoked(key)  # The store checks expiry on a filter hit
+    revocations.sync(now + revocations.purge_interval + 1)  # A purge rebuilds the filter
+    lookups = revocations.store.lookups
+    assert not revocations.is_revoked(key)
+    assert revocations.store.lookups == lookups
+    assert revocations.store.keys() == []
+
+
+def test_memory_store_keeps_the_latest_expiry():
+    store = MemoryRevocationStore()
+    key = revocation_key('jti')
+    store.revoke(key, 200.0)
+    store.revoke(key, 100.0)
+    assert store.purge(150.0) == 0
+    assert store.contains(key, 150.0)
+    assert store.purge(250.0) == 1
+
+
+def test_sqlite_revocations_reach_other_lists_on_sync(tmp_path):
+    path = str(tmp_path / 'revocations.db')
+    first = RevocationList(SQLiteRevocationStore(path), sync_interval=3600)
+    second = RevocationList(SQLiteRevocationStore(path), sync_interval=3600)
+    key = revocation_key('jti')
+    first.revoke(key, time.time() + 60)
+    assert not second.is_revoked(key)  # Not in its filter until the next sync
+    second.sync()
+    assert second.is_revoked(key)
+    first.close()
+    second.close()
+
+
+def test_revocation_by_another_process_is_seen_within_sync_interval(tmp_path):
+    path = str(tmp_path / 'revocations.db')
+    revocations = RevocationList(SQLiteRevocationStore(path), sync_interval=0.05)
+    key = revocation_key('jti')
+    assert not revocations.is_revoked(key)  # Also starts the background sync
+    script = (
+        "import sys, time\n"
+        "from a2a_mcp.mcp.revocation import SQLiteRevocationStore, revocation_key\n"
+        "SQLiteRevocationStore(sys.argv[1]).revoke(revocation_key('jti'), time.time() + 60)\n"
+    )
+    src = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+    subprocess.run([sys.executable, '-c', script, path], check=True, env=dict(os.environ, PYTHONPATH=src))
+    deadline = time.monotonic() + 5
+    while not revocations.is_revoked(key) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert revocations.is_revoked(key)
+    revocations.close()
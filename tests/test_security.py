@@ -0,0 +1,58 @@
+import time
+
+import jwt
+import pytest
+
+from a2a_mcp.mcp.config import config
+from a2a_mcp.mcp.security import SecurityManager, TokenCache
+
+
+@pytest.fixture
+def security(monkeypatch):
+    monkeypatch.setattr(config, 'JWT_SECRET_KEY', 'test-jwt-secret-of-at-least-32-bytes')
+    return SecurityManager()
+
+
+def test_token_cache_hits_and_lru_eviction():
+    cache = TokenCache(max_size=2, ttl=60)
+    cache.put('a', {'agent_id': 'a'})
+    cache.put('b', {'agent_id': 'b'})
+    assert cache.get('a') == {'agent_id': 'a'}  # 'a' is now the most recent
+    cache.put('c', {'agent_id': 'c'})
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    assert cache.stats() == {'hits': 3, 'misses': 1, 'size': 2}
+
+
+def test_token_cache_entries_end_at_exp():
+    cache = TokenCache(ttl=300)
+    cache.put('expired', {'exp': time.time() - 1})
+    assert cache.get('expired') is None
+    cache.put('short', {'exp': time.time() + 300})
+    cache.ttl = 0
+    cache.put('ttl', {'exp': time.time() + 300})
+    assert cache.get('short') is not None
+    assert cache.get('ttl') is None
+
+
+def test_validate_token_is_served_from_cache(security, monkeypatch):
+    token = security.generate_token('agent-1')
+    assert security.validate_token(token)['agent_id'] == 'agent-1'
+    decodes = []
+    monkeypatch.setattr(jwt, 'decode', lambda *args, **kwargs: decodes.append(args))
+    assert security.validate_token(token)['agent_id'] == 'agent-1'
+    assert decodes == []
+    assert security.token_cache.stats()['hits'] == 1
+
+
+def test_cached_token_still_checks_type_and_revocation(security):
+    token = security.generate_token('agent-1')
+    assert security.validate_token(token) is not None
+    assert security.validate_token(token, token_type='gateway_auth') is None
+    security.blacklist_token(token)
+    assert security.validate_token(token) is None
+
+
+def test_invalid_tokens_are_not_cached(security):
+    assert security.validate_token('not-a-token') is None
+    assert security.token_cache.stats()['size'] == 0
@@ -0,0 +1,87 @@
+import json
+
+
+def test_batch_heartbeat_reports_each_entry(client, mcp, register, gateway_headers):
+    register('a')
+    register('b')
+    before = mcp.agents.get('a').last_seen
+    response = client.post('/heartbeats', headers=gateway_headers, json={'heartbeats': [
+        {'agent_id': 'a', 'status': 'busy'},
+        {'agent_id': 'missing'},
+        {'status': 'no id'},
+        {'agent_id': 'b'},
+    ]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body['accepted'], body['rejected']) == (2, 2)
+    results = body['results']
+    assert results[0] == {'agent_id': 'a', 'status': 'ok'}
+    assert results[1] == {'agent_id': 'missing', 'error': 'agent not found'}
+    assert 'agent_id' in results[2]['error']
+    assert results[3] == {'agent_id': 'b', 'status': 'ok'}
+    assert mcp.agents.get('a').status == 'busy'
+    assert mcp.agents.get('a').last_seen > before
+    assert 'X-Heartbeat-Interval' in response.headers
+
+
+def test_batch_heartbeat_needs_a_gateway_token(client, register):
+    agent_headers = register('a')
+    response = client.post('/heartbeats', headers=agent_headers, json={'heartbeats': [{'agent_id': 'a'}]})
+    assert response.status_code == 401
+    assert client.post('/heartbeats', json={'heartbeats': [{'agent_id': 'a'}]}).status_code == 401
+
+
+def test_batch_heartbeat_validates_batch_size(client, gateway_headers):
+    assert client.post('/heartbeats', headers=gateway_headers, json={'heartbeats': []}).status_code == 400
+
+
+def test_gateway_register_requires_configured_key(client, monkeypatch):
+    from a2a_mcp.mcp.config import config
+
+    monkeypatch.setattr(config, 'GATEWAY_KEY', None)
+    response = client.post('/gateway/register', json={'gateway_id': 'gw', 'gateway_key': 'anything'})
+    assert response.status_code == 401
+
+
+def test_status_pages_with_cursor(client, register):
+    headers = register('agent-0')
+    for i in range(1, 5):
+        register(f"agent-{i}")
+    first = client.get('/status?limit=3', headers=headers).get_json()
+    assert list(first['agents']) == ['agent-0', 'agent-1', 'agent-2']
+    assert first['total_agents'] == 5
+    assert first['next_cursor'] == 'agent-2'
+    second = client.get(f"/status?limit=3&cursor={first['next_cursor']}", headers=headers).get_json()
+    assert list(second['agents']) == ['agent-3', 'agent-4']
+    assert second['next_cursor'] is None
+
+
+def test_status_filters_and_projects(client, register, mcp):
+    headers = register('a')
+    register('b')
+    mcp.agents.touch('b', 'busy')
+    body = client.get('/status?status=busy&fields=status', headers=headers).get_json()
+    assert body['agents'] == {'b': {'status': 'busy'}}
+    response = client.get('/status?fields=status,secret', headers=headers)
+    assert response.status_code == 400
+    assert client.get('/status?limit=0', headers=headers).status_code == 400
+
+
+def test_status_streams_ndjson(client, register):
+    headers = register('agent-0')
+    for i in range(1, 5):
+        register(f"agent-{i}")
+    response = client.get('/status?format=ndjson&limit=2&fields=status', headers=headers)
+    assert response.mimetype == 'application/x-ndjson'
+    assert response.headers['X-Total-Agents'] == '5'
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [line['agent_id'] for line in lines] == [f"agent-{i}" for i in range(5)]
+    assert lines[0] == {'agent_id': 'agent-0', 'status': 'active'}
+
+
+def test_cleanup_pass_samples_agent_count(client, mcp, register):
+    register('a')
+    register('b')
+    mcp.evict_inactive_agents()
+    mcp.monitoring.flush()
+    assert mcp.monitoring.metrics['agent_count'].points[-1].value == 2
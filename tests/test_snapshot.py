@@ -0,0 +1,158 @@
+import os
+import threading
+import time
+
+import pytest
+
+from a2a_mcp.mcp.registry import AgentData, MemoryRegistry
+from a2a_mcp.mcp.snapshot import (
+    OP_REMOVE, OP_TOUCH, OP_UPSERT, RegistrySnapshotter, decode_records, encode_record
+)
+
+
+def agent(status='active', age=0.0, host='10.0.0.1', port=4000):
+    return AgentData(time.monotonic() - age, status, host, port)
+
+
+def snapshot(directory, max_agents=100):
+    """Open a snapshot directory, returning (snapshotter, journaling registry)"""
+    snapshotter = RegistrySnapshotter(str(directory))
+    registry = snapshotter.restore_into(MemoryRegistry(agent_timeout=60), max_agents)
+    snapshotter.checkpoint()  # Opens the log, as start() does
+    return snapshotter, registry
+
+
+def state(registry):
+    return {agent_id: (data.status, data.host, data.port) for agent_id, data in registry.items()}
+
+
+def test_records_round_trip():
+    records = [
+        encode_record(OP_UPSERT, 'a', 1700000000.5, 'active', '10.0.0.1', 4000),
+        encode_record(OP_TOUCH, 'a', 1700000001.0),
+        encode_record(OP_TOUCH, 'a', 1700000002.0, ''),
+        encode_record(OP_REMOVE, 'agent-é'),
+    ]
+    assert list(decode_records(b''.join(records))) == [
+        (OP_UPSERT, 'a', 1700000000.5, 'active', '10.0.0.1', 4000),
+        (OP_TOUCH, 'a', 1700000001.0, None, None, None),
+        (OP_TOUCH, 'a', 1700000002.0, '', None, None),
+        (OP_REMOVE, 'agent-é', 0.0, None, None, None),
+    ]
+
+
+def test_decode_stops_at_torn_record():
+    data = encode_record(OP_UPSERT, 'a', 1.0, 'active') + encode_record(OP_UPSERT, 'b', 2.0, 'active')
+    for cut in range(len(data) // 2, len(data)):
+        assert [record[1] for record in decode_records(data[:cut])] == ['a']
+
+
+
+def test_oversized_fields_are_rejected_before_mutating(tmp_path):
+    snapshotter, registry = snapshot(tmp_path)
+    registry.add('a', agent(), 100)
+    with pytest.raises(ValueError):
+        registry.touch('a', 'x' * 70000)
+    with pytest.raises(ValueError):
+        registry.add('b', agent(status='x' * 70000), 100)
+    assert state(registry) == {'a': ('active', '10.0.0.1', 4000)}
+    snapshotter.flush()
+    _, restored = snapshot(tmp_path)
+    assert state(restored) == state(registry)
+
+
+def test_checkpoint_and_log_replay(tmp_path):
+    snapshotter, registry = snapshot(tmp_path)
+    registry.add('a', agent(), 100)
+    registry.add('b', agent(), 100)
+    registry.add('c', agent(), 100)
+    snapshotter.checkpoint()
+    # After the checkpoint: only in the log
+    registry.touch('a', 'busy')
+    registry.remove('b')
+    registry.add('d', agent(host=None, port=None), 100)
+    snapshotter.flush()
+
+    _, restored = snapshot(tmp_path)
+    assert state(restored) == {
+        'a': ('busy', '10.0.0.1', 4000),
+        'c': ('active', '10.0.0.1', 4000),
+        'd': ('active', None, None),
+    }
+    assert abs(restored.get('a').last_seen - registry.get('a').last_seen) < 0.01
+
+
+def test_replay_survives_torn_tail(tmp_path):
+    snapshotter, registry = snapshot(tmp_path)
+    registry.add('a', agent(), 100)
+    registry.remove('a')
+    registry.add('b', agent(), 100)
+    snapshotter.flush()
+    log = max(name for name in os.listdir(tmp_path) if name.endswith('.log'))
+    with open(tmp_path / log, 'ab') as f:
+        f.write(encode_record(OP_UPSERT, 'torn', time.time(), 'active')[:-3])
+
+    _, restored = snapshot(tmp_path)
+    assert set(state(restored)) == {'b'}
+
+
+def test_restore_skips_timed_out_agents_and_respects_limit(tmp_path):
+    snapshotter, registry = snapshot(tmp_path)
+    registry.add('stale', agent(age=120), 100)
+    for i in range(5):
+        registry.add(f"agent-{i}", agent(), 100)
+    snapshotter.checkpoint()
+
+    _, restored = snapshot(tmp_path, max_agents=3)
+    assert len(restored) == 3
+    assert 'stale' not in restored
+
+
+def test_rejects_foreign_checkpoint(tmp_path):
+    (tmp_path / 'registry.ckpt').write_bytes(b'XXXX' + bytes(20))
+    with pytest.raises(ValueError):
+        RegistrySnapshotter(str(tmp_path)).restore_into(MemoryRegistry(agent_timeout=60), 100)
+
+
+def test_log_order_matches_concurrent_mutations(tmp_path):
+    removed = threading.Event()
+
+    class SlowRemoveRegistry(MemoryRegistry):
+        def remove(self, agent_id):
+            result = super().remove(agent_id)
+            removed.set()
+            time.sleep(0.1)  # A re-registration lands here, before the removal is journaled
+            return result
+
+    snapshotter = RegistrySnapshotter(str(tmp_path))
+    registry = snapshotter.restore_into(SlowRemoveRegistry(agent_timeout=60), 100)
+    snapshotter.checkpoint()
+    registry.add('a', agent(), 100)
+    remover = threading.Thread(target=registry.remove, args=('a',))
+    remover.start()
+    removed.wait()
+    registry.add('a', agent(status='back'), 100)
+    remover.join()
+    snapshotter.flush()
+
+    assert state(registry) == {'a': ('back', '10.0.0.1', 4000)}
+    _, restored = snapshot(tmp_path)
+    assert state(restored) == state(registry)
+
+
+def test_server_only_snapshots_the_memory_registry(mcp, tmp_path, monkeypatch):
+    from a2a_mcp.mcp.registry import SQLiteRegistry
+
+    monkeypatch.setattr(mcp, 'agents', SQLiteRegistry(str(tmp_path / 'registry.db'), 60))
+    assert mcp.start_snapshots(str(tmp_path / 'snapshots')) is None
+    assert isinstance(mcp.agents, SQLiteRegistry)
+
+
+def test_server_rejects_oversized_status(client, register, mcp, tmp_path, monkeypatch):
+    monkeypatch.setattr(mcp, 'agents', snapshot(tmp_path)[1])
+    headers = register('a')
+    response = client.post('/heartbeat/a', headers=headers, json={'status': 'x' * 70000})
+    assert response.status_code == 400
+    assert mcp.agents.get('a').status == 'active'
+    long_id = {'agent_id': 'x' * 70000, 'api_key': 'k' * 64}
+    assert client.post('/register', json=long_id).status_code == 400
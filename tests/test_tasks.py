@@ -0,0 +1,168 @@
+import logging
+import time
+from collections import Counter
+
+import pytest
+import requests
+
+from a2a_mcp.agents.mcp_agent import MCPAgent
+from a2a_mcp.mcp.config import ServerConfig
+from a2a_mcp.mcp.tasks import QueueFull, TaskQueue
+
+
+@pytest.fixture
+def dispatch(mcp, monkeypatch):
+    """Turn on task dispatch, which is opt-in"""
+    monkeypatch.setattr(mcp.config, 'TASK_DISPATCH', True)
+
+
+def consumers(queue, *agent_ids):
+    for agent_id in agent_ids:
+        assert queue.pull(agent_id, 1) == []  # The first pull makes an agent a consumer
+    return queue
+
+
+def test_submit_needs_a_consumer():
+    with pytest.raises(QueueFull):
+        TaskQueue().submit('work')
+
+
+def test_unkeyed_tasks_go_to_the_least_loaded_agent():
+    queue = consumers(TaskQueue(), 'a', 'b', 'c')
+    placed = Counter(queue.submit(i).agent_id for i in range(30))
+    assert placed == {'a': 10, 'b': 10, 'c': 10}
+    leased = queue.pull('a', 10)
+    # Leased tasks still count as load, or both would go to the agent with an empty queue
+    assert len({queue.submit(i).agent_id for i in range(2)}) == 2
+    queue.ack('a', [task.task_id for task in leased])
+    assert queue.submit('next').agent_id == 'a'
+
+def test_keyed_tasks_stick_to_their_agent():
+    queue = consumers(TaskQueue(), 'a', 'b', 'c')
+    owners = {f"key-{i}": queue.submit(i, key=f"key-{i}").agent_id for i in range(50)}
+    assert set(owners.values()) == {'a', 'b', 'c'}
+    assert all(queue.submit('again', key=key).agent_id == owner for key, owner in owners.items())
+    # Removing an agent only moves the keys it owned
+    queue.evict(['c'])
+    for key, owner in owners.items():
+        if owner != 'c':
+            assert queue.submit('after', key=key).agent_id == owner
+
+
+def test_full_queue_refuses_submissions():
+    queue = consumers(TaskQueue(max_pending=2), 'a')
+    queue.submit(1)
+    queue.submit(2)
+    with pytest.raises(QueueFull):
+        queue.submit(3)
+    assert queue.stats()['pending'] == 2
+    queue.pull('a', 1)
+    queue.submit(3)
+
+
+def test_expired_lease_is_redelivered():
+    queue = consumers(TaskQueue(), 'a', 'b')
+    task = queue.submit('work', key='k')
+    [leased] = queue.pull(task.agent_id, 1, visibility_timeout=0.01)
+    assert queue.ack(task.agent_id, ['unknown']) == [False]
+    time.sleep(0.02)
+    assert queue.requeue_expired() == 1
+    [again] = queue.pull(task.agent_id, 1)  # Still the key's owner
+    assert again.task_id == leased.task_id
+    assert again.attempts == 2
+    assert queue.ack(task.agent_id, [again.task_id]) == [True]
+    assert queue.stats() == {'consumers': 2, 'pending': 0, 'inflight': 0, 'dropped': 0}
+
+
+def test_task_is_dropped_after_max_attempts():
+    queue = consumers(TaskQueue(max_attempts=2), 'a')
+    queue.submit('poison')
+    for _ in range(2):
+        assert len(queue.pull('a', 1, visibility_timeout=0.01)) == 1
+        time.sleep(0.02)
+        queue.requeue_expired()
+    assert queue.pull('a', 1) == []
+    assert queue.stats()['dropped'] == 1
+
+
+def test_evicted_agents_tasks_are_redelivered():
+    queue = consumers(TaskQueue(max_pending=1), 'a', 'b')
+    leased = queue.submit(1)
+    queued = queue.submit(2)
+    evicted, survivor = leased.agent_id, queued.agent_id
+    queue.pull(evicted, 1)
+    assert queue.evict([]) == 0
+    assert queue.evict(['never-pulled']) == 0
+    assert queue.evict([evicted]) == 1
+    # Redeliveries go to the front and may exceed the bound
+    assert [task.payload for task in queue.pull(survivor, 10)] == [1, 2]
+    assert queue.ack(evicted, [leased.task_id]) == [False]  # Its lease is gone
+    assert queue.ack(survivor, [leased.task_id, queued.task_id]) == [True, True]
+
+
+def test_tasks_of_the_last_agent_are_dropped():
+    queue = consumers(TaskQueue(), 'a')
+    queue.submit(1)
+    queue.submit(2)
+    queue.pull('a', 1)
+    assert queue.evict(['a']) == 2
+    assert queue.stats() == {'consumers': 0, 'pending': 0, 'inflight': 0, 'dropped': 2}
+
+def test_pull_and_ack_routes(dispatch, client, register, gateway_headers):
+    headers = register('a')
+    register('b')
+    assert client.post('/tasks/a/pull', headers=headers, json={}).get_json()['tasks'] == []
+    response = client.post('/tasks', headers=gateway_headers, json={'tasks': [{'payload': {'n': 1}}, {'payload': 2}]})
+    assert response.get_json()['accepted'] == 2
+
+    body = client.post('/tasks/a/pull', headers=headers, json={'max_tasks': 5, 'visibility_timeout': 30}).get_json()
+    assert [task['payload'] for task in body['tasks']] == [{'n': 1}, 2]
+    assert body['visibility_timeout'] == 30
+    task_ids = [task['task_id'] for task in body['tasks']]
+    assert client.post('/tasks/b/pull', headers=headers, json={}).status_code == 401
+    assert client.post('/tasks/b/ack', headers=headers, json={'task_ids': task_ids}).status_code == 401
+    body = client.post('/tasks/a/ack', headers=headers, json={'task_ids': task_ids + ['unknown']}).get_json()
+    assert body == {'acked': 2, 'results': [True, True, False]}
+
+
+def test_full_queues_return_retry_after(dispatch, client, register, gateway_headers, mcp, monkeypatch):
+    monkeypatch.setattr(mcp, 'task_queue', TaskQueue(max_pending=1))
+    headers = register('a')
+    client.post('/tasks/a/pull', headers=headers, json={})
+    response = client.post('/tasks', headers=gateway_headers, json={'tasks': [{'payload': 1}, {'payload': 2}]})
+    assert response.get_json()['rejected'] == 1
+    response = client.post('/tasks', headers=gateway_headers, json={'tasks': [{'payload': 3}]})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+
+
+def test_dispatch_is_opt_in(client, register, gateway_headers):
+    assert not ServerConfig().TASK_DISPATCH  # Unless MCP_TASK_DISPATCH is set
+    headers = register('a')
+    assert client.post('/tasks/a/pull', headers=headers, json={}).status_code == 503
+    assert client.post('/tasks/a/ack', headers=headers, json={'task_ids': ['x']}).status_code == 503
+    assert client.post('/tasks', headers=gateway_headers, json={'tasks': [{'payload': 1}]}).status_code == 503
+
+
+def test_agent_backs_off_quietly_while_dispatch_is_off(monkeypatch, caplog):
+    agent = MCPAgent('a', 'http://mcp.invalid', use_session=False)
+    off = requests.Response()
+    off.status_code = 503
+    pulls = []
+
+    def pull_tasks(max_tasks):
+        pulls.append(max_tasks)
+        raise requests.HTTPError(response=off)
+    waits = []
+
+    def wait(timeout):
+        waits.append(timeout)
+        agent.running = len(waits) < 3
+        return not agent.running
+    agent.pull_tasks = pull_tasks
+    monkeypatch.setattr(agent._stopped, 'wait', wait)
+    agent.running = True
+    with caplog.at_level(logging.INFO, logger='a2a_mcp.agents.mcp_agent'):
+        agent.task_loop()
+    assert (len(pulls), waits) == (3, [60, 60, 60])
+    assert [record.levelname for record in caplog.records] == ['INFO']  # Logged once, not as an error
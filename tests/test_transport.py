@@ -0,0 +1,186 @@
+import json
+import os
+import socket
+import time
+
+import pytest
+
+from a2a_mcp.agents import framing
+from a2a_mcp.agents.a2a_agent import A2AAgent
+from a2a_mcp.agents.async_transport import AsyncTransport
+from a2a_mcp.agents.connections import PeerConnectionManager
+
+TRANSPORTS = ['threads', 'asyncio']
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+class RecordingAgent(A2AAgent):
+    """An agent that records what it handles and delivers"""
+
+    def __init__(self, transport):
+        super().__init__(None, '127.0.0.1', free_port(), transport=transport, probe_interval=60)
+        self.handled = []
+        self.delivered = []
+
+    def handle_message(self, message):
+        self.handled.append(message)
+        super().handle_message(message)
+
+    def deliver(self, message):
+        self.delivered.append(message)
+
+
+@pytest.fixture
+def agents():
+    started = []
+
+    def start(transport):
+        agent = RecordingAgent(transport)
+        agent.start()
+        started.append(agent)
+        return agent
+    yield start
+    for agent in started:
+        agent.stop()
+
+
+@pytest.mark.parametrize('transport', TRANSPORTS)
+def test_transports_handle_messages_alike(transport, agents):
+    receiver = agents(transport)
+    third = agents(transport)
+    sender = A2AAgent('sender', '127.0.0.1', free_port())  # Only sends, never listens
+    broadcast = {'id': 'b1', 'sender_id': 'sender', 'sender_address': f"127.0.0.1:{sender.port}",
+                 'content': 'hello'}
+    try:
+        sender._send_message(receiver.address, 'PING')
+        sender._send_message(receiver.address, 'GOSSIP_PEERS', {'peers': [f"127.0.0.1:{third.port}"]})
+        sender._send_message(receiver.address, 'STATUS_UPDATE', {'status': 'fine'})
+        sender.connections.send(receiver.address, broadcast)
+        sender.connections.send(receiver.address, broadcast)  # A duplicate is not delivered again
+        wait_for(lambda: len(receiver.handled) == 5 and third.delivered)
+    finally:
+        sender.connections.close_all()
+
+    assert [message.get('type') for message in receiver.handled] == \
+        ['PING', 'GOSSIP_PEERS', 'STATUS_UPDATE', None, None]
+    assert receiver.peers == {sender.address, third.address}
+    assert [message['content'] for message in receiver.delivered] == ['hello']
+    [forwarded] = third.delivered  # Flooded on, but not back to the sender
+    assert (forwarded['hops'], forwarded['relay']) == (1, f"127.0.0.1:{receiver.port}")
+
+
+@pytest.mark.parametrize('transport', TRANSPORTS)
+def test_transports_accept_unframed_json(transport, agents):
+    receiver = agents(transport)
+    with socket.create_connection(receiver.address) as sock:
+        sock.sendall(json.dumps({'type': 'PING', 'sender_address': ['127.0.0.1', 9]}).encode())
+    wait_for(lambda: receiver.handled)
+    assert receiver.handled[0]['type'] == 'PING'
+    assert ('127.0.0.1', 9) in receiver.peers
+
+
+@pytest.mark.parametrize('transport', TRANSPORTS)
+def test_unframed_messages_are_bounded(transport, agents, monkeypatch):
+    monkeypatch.setattr(framing, 'MAX_FRAME', 1024)
+    receiver = agents(transport)
+    with socket.create_connection(receiver.address) as sock:
+        sock.sendall(json.dumps({'type': 'PING', 'padding': 'x' * 4096}).encode())
+        sock.shutdown(socket.SHUT_WR)
+        sock.settimeout(5)
+        assert sock.recv(1) == b''  # Closed without the message being handled
+    assert receiver.handled == []
+
+
+@pytest.mark.parametrize('transport', TRANSPORTS)
+def test_a_bad_message_does_not_drop_the_connection(transport, agents):
+    receiver = agents(transport)
+    with socket.create_connection(receiver.address) as sock:
+        sock.sendall(framing.encode(['not', 'a', 'message']))
+        sock.sendall(framing.encode({'type': 'PING', 'sender_address': ['127.0.0.1', 9]}))
+        wait_for(lambda: len(receiver.handled) == 2)
+    assert ('127.0.0.1', 9) in receiver.peers
+
+
+@pytest.mark.parametrize('transport', TRANSPORTS)
+def test_agents_with_different_codecs_understand_each_other(transport, agents):
+    pytest.importorskip('msgpack')
+    receiver = agents(transport)  # Configured for JSON
+    sender = A2AAgent('sender', '127.0.0.1', free_port(), transport=transport, wire_codec='msgpack')
+    try:
+        if transport == 'asyncio':
+            sender.connections.start()
+        sender._send_message(receiver.address, 'STATUS_UPDATE', {'status': 'fine'})
+        wait_for(lambda: receiver.handled)
+    finally:
+        if transport == 'asyncio':
+            sender.connections.stop()
+        else:
+            sender.connections.close_all()
+    assert receiver.handled[0]['payload'] == {'status': 'fine'}
+
+
+class Sink:
+    agent_id = 'sink'
+    host = '127.0.0.1'
+
+    def __init__(self):
+        self.port = free_port()
+        self.messages = []
+
+    def handle_message(self, message):
+        self.messages.append(message)
+
+
+def test_idle_inbound_connections_make_room_for_new_ones():
+    sink = Sink()
+    transport = AsyncTransport(sink, max_inbound=2)
+    transport.start()
+    try:
+        idle = [socket.create_connection((sink.host, sink.port)) for _ in range(2)]
+        idle[1].sendall(framing.encode({'n': 1}))  # Now more recently active than idle[0]
+        wait_for(lambda: sink.messages == [{'n': 1}])
+        with socket.create_connection((sink.host, sink.port)) as new:
+            new.sendall(framing.encode({'n': 2}))
+            wait_for(lambda: len(sink.messages) == 2)
+            idle[0].settimeout(5)
+            assert idle[0].recv(1) == b''  # The least recently active was closed
+            idle[1].sendall(framing.encode({'n': 3}))
+            wait_for(lambda: len(sink.messages) == 3)
+            assert transport.stats()['reading'] == 2
+        for sock in idle:
+            sock.close()
+    finally:
+        transport.stop()
+
+
+def test_connections_closed_by_the_peer_are_detected():
+    ours, theirs = socket.socketpair()
+    with ours:
+        assert not PeerConnectionManager._closed_by_peer(ours)
+        theirs.close()
+        assert PeerConnectionManager._closed_by_peer(ours)
+
+
+def test_closed_by_peer_handles_descriptors_beyond_fd_setsize():
+    resource = pytest.importorskip('resource')
+    if resource.getrlimit(resource.RLIMIT_NOFILE)[0] <= 1100:
+        pytest.skip('open file limit too low')
+    ours, theirs = socket.socketpair()
+    high = socket.socket(fileno=os.dup2(ours.fileno(), 1100))
+    ours.close()
+    with high:
+        assert not PeerConnectionManager._closed_by_peer(high)
+        theirs.close()
+        assert PeerConnectionManager._closed_by_peer(high)